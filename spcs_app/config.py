@@ -6,32 +6,139 @@ across different deployment environments.
 
 Environment Variables:
     SNOWFLAKE_DATABASE: Target database name (default: FLUX_DB)
+    SNOWFLAKE_WAREHOUSE: Warehouse name (default: FLUX_WH)
+
+The database can be overridden for the current thread / asyncio task with
+set_database(); the helpers below honour the override.
 """
 
+import functools
 import os
-
-# Primary database - configurable via environment variable
-DB = os.getenv("SNOWFLAKE_DATABASE", "FLUX_DB")
-
-# Warehouse - configurable via environment variable
-WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE", "FLUX_WH")
+import sys
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
 
 # Schema names
 SCHEMA_PRODUCTION = "PRODUCTION"
 SCHEMA_APPLICATIONS = "APPLICATIONS"
 SCHEMA_DEV = "DEV"
 
+# Tables referenced by the app; their default-database paths are precomputed
+PRODUCTION_TABLES = (
+    "AMI_BRONZE_RAW",
+    "AMI_INTERVAL_READINGS",
+    "AMI_METADATA_SEARCH",
+    "AMI_STREAMING_DATA",
+    "METER_INFRASTRUCTURE",
+    "STREAMING_JOBS",
+)
+APPLICATIONS_TABLES = (
+    "FLUX_GENERATION_HISTORY",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class _Config:
+    """Immutable snapshot of environment-derived settings."""
+    db: str
+    warehouse: str
+    prod_prefix: str
+    apps_prefix: str
+    known_tables: Mapping  # read-only (schema, table) -> fully qualified path
+
+
+@functools.lru_cache(maxsize=1)
+def get_config() -> _Config:
+    """Read environment variables once and return the shared config snapshot."""
+    db = os.getenv("SNOWFLAKE_DATABASE", "FLUX_DB")
+    known_tables = {}
+    for schema, tables in ((SCHEMA_PRODUCTION, PRODUCTION_TABLES), (SCHEMA_APPLICATIONS, APPLICATIONS_TABLES)):
+        for table in tables:
+            known_tables[(schema, table)] = sys.intern(f"{db}.{schema}.{table}")
+    return _Config(
+        db=db,
+        warehouse=os.getenv("SNOWFLAKE_WAREHOUSE", "FLUX_WH"),
+        prod_prefix=f"{db}.{SCHEMA_PRODUCTION}.",
+        apps_prefix=f"{db}.{SCHEMA_APPLICATIONS}.",
+        known_tables=MappingProxyType(known_tables),
+    )
+
+
+# Primary database - configurable via environment variable
+DB = get_config().db
+
+# Warehouse - configurable via environment variable
+WAREHOUSE = get_config().warehouse
+
+
+# Per-context database override (None = use SNOWFLAKE_DATABASE)
+_DB_VAR: ContextVar[Optional[str]] = ContextVar("snowflake_database", default=None)
+
+
+def get_database() -> str:
+    """Get the database for the current context."""
+    return _DB_VAR.get() or get_config().db
+
+
+def set_database(name: str) -> Token:
+    """Override the database for the current context; pass the token to reset_database()."""
+    return _DB_VAR.set(name)
+
+
+def reset_database(token: Token) -> None:
+    """Undo a set_database() override."""
+    _DB_VAR.reset(token)
+
+
+# Paths are memoized per (database, schema, table): the set used by the app is
+# small. Returned paths are interned so the bounded set of table names is
+# shared and compares by identity when used as dict keys.
+
+
+@functools.lru_cache(maxsize=512)
+def _qualify(db: str, schema: str, table: str) -> str:
+    return sys.intern(".".join((db, schema, table)))
+
 
 def get_table_path(schema: str, table: str) -> str:
     """Get fully qualified table path."""
-    return f"{DB}.{schema}.{table}"
+    db = _DB_VAR.get()
+    if db is None:
+        cfg = get_config()
+        return cfg.known_tables.get((schema, table)) or _qualify(cfg.db, schema, table)
+    return _qualify(db, schema, table)
 
 
 def get_production_table(table: str) -> str:
     """Get path to a PRODUCTION schema table."""
-    return get_table_path(SCHEMA_PRODUCTION, table)
+    db = _DB_VAR.get()
+    if db is None:
+        cfg = get_config()
+        return cfg.known_tables.get((SCHEMA_PRODUCTION, table)) or sys.intern(cfg.prod_prefix + table)
+    return _qualify(db, SCHEMA_PRODUCTION, table)
+
+
+def qualify_production_object(name: str) -> str:
+    """Get path to a PRODUCTION schema task, stage or file format, or a request-supplied name.
+
+    Unlike get_production_table() the result is neither memoized nor interned,
+    so arbitrary input does not accumulate in the caches.
+    """
+    return f"{get_database()}.{SCHEMA_PRODUCTION}.{name}"
 
 
 def get_applications_table(table: str) -> str:
     """Get path to an APPLICATIONS schema table."""
-    return get_table_path(SCHEMA_APPLICATIONS, table)
+    db = _DB_VAR.get()
+    if db is None:
+        cfg = get_config()
+        return cfg.known_tables.get((SCHEMA_APPLICATIONS, table)) or sys.intern(cfg.apps_prefix + table)
+    return _qualify(db, SCHEMA_APPLICATIONS, table)
+
+
+def invalidate_table_path_cache() -> None:
+    """Re-read the environment and clear memoized table paths (e.g. in tests)."""
+    get_config.cache_clear()
+    _qualify.cache_clear()
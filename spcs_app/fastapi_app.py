@@ -7,57 +7,322 @@ Enhanced with full Snowpipe Streaming SDK volume configuration.
 """
 
 import os
+import importlib.util
 import logging
-from datetime import datetime, date, timedelta
+import functools
+import operator
+import re
+import asyncio
+from datetime import datetime, date, timedelta, timezone
 from typing import Optional
+from dataclasses import dataclass
+from types import MappingProxyType
 from contextlib import asynccontextmanager
 import json
+import orjson
 import io
+import gzip
+from pathlib import Path
 
 # Import centralized configuration
-from config import DB, SCHEMA_PRODUCTION, SCHEMA_APPLICATIONS, get_table_path
+from config import (
+    DB, SCHEMA_PRODUCTION, SCHEMA_APPLICATIONS, SCHEMA_DEV,
+    get_table_path, get_production_table, get_applications_table, qualify_production_object,
+)
 
 from fastapi import FastAPI, Request, Form, HTTPException, Response
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-import base64
+from starlette.concurrency import run_in_threadpool
+import hashlib
 import uvicorn
 
 import snowflake.connector
 from snowflake.snowpark import Session
 import threading
 import time
-import random
 import uuid
-
-# AWS S3 for raw JSON streaming
-try:
-    import boto3
-    from botocore.exceptions import ClientError
-    BOTO3_AVAILABLE = True
-except ImportError:
-    BOTO3_AVAILABLE = False
+import numpy as np
+import pandas as pd
+from snowflake.connector.pandas_tools import write_pandas
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+
+# AWS S3 for raw JSON streaming - boto3 pulls in a large module graph, so it is
+# only imported once an S3 path actually needs a client
+BOTO3_AVAILABLE = importlib.util.find_spec("boto3") is not None
+if not BOTO3_AVAILABLE:
     logger = logging.getLogger(__name__)
     logger.warning("boto3 not available - Raw JSON S3 streaming disabled")
 
+_boto_session = None
+_boto_client_config = None
+_boto_session_lock = threading.Lock()  # boto3 sessions are not thread-safe for creating clients
+
+
+def _boto_client(service_name: str, **kwargs):
+    """
+    Create a boto3 client with pooled, keep-alive connections.
+    Clients come from one dedicated Session, created (and boto3 imported) on
+    first use. This blocks on the import and endpoint data loading, so async
+    handlers must call it through run_in_threadpool.
+    """
+    global _boto_session, _boto_client_config
+    with _boto_session_lock:
+        if _boto_session is None:
+            import boto3
+            from botocore.config import Config
+            _boto_client_config = Config(
+                max_pool_connections=64,
+                tcp_keepalive=True,
+                retries={'mode': 'adaptive', 'max_attempts': 5},
+            )
+            _boto_session = boto3.session.Session()
+        return _boto_session.client(service_name, config=_boto_client_config, **kwargs)
+
+
+# Shared S3 clients so jobs reuse pooled connections instead of paying an STS
+# round-trip and TLS handshakes per job. Keys hold a digest of the secret, never
+# the secret itself; entries are (client, expiration), expiration None for
+# non-expiring credentials. Each key has its own build lock so one slow
+# AssumeRole does not hold up workers using other credentials.
+S3_CREDENTIAL_REFRESH_MARGIN = timedelta(minutes=5)
+S3_CLIENT_CACHE_MAX = 32
+_s3_clients = {}
+_s3_client_locks = {}
+_s3_clients_lock = threading.Lock()  # guards the two dicts above, never held across AWS calls
+
+
+def _s3_client_key(region: str, access_key: str, secret_key: str, role_arn: str) -> tuple:
+    secret_digest = hashlib.sha256(secret_key.encode()).hexdigest()[:16] if secret_key else ''
+    return (access_key, secret_digest, role_arn, region)
+
+
+def _cached_s3_client(key: tuple):
+    """Return the cached client for key if it is not due a credential refresh (caller holds _s3_clients_lock)"""
+    cached = _s3_clients.get(key)
+    if cached and (cached[1] is None or datetime.now(timezone.utc) < cached[1] - S3_CREDENTIAL_REFRESH_MARGIN):
+        return cached[0]
+    return None
+
+
+def _store_s3_client(key: tuple, s3_client, expiration):
+    """Insert a client, dropping expired entries and the oldest ones beyond S3_CLIENT_CACHE_MAX (caller holds _s3_clients_lock)"""
+    now = datetime.now(timezone.utc)
+    for stale in [k for k, (_, expires) in _s3_clients.items() if expires is not None and expires <= now]:
+        del _s3_clients[stale]
+    _s3_clients.pop(key, None)
+    _s3_clients[key] = (s3_client, expiration)
+    while len(_s3_clients) > S3_CLIENT_CACHE_MAX:
+        del _s3_clients[next(iter(_s3_clients))]
+    for orphan in [k for k in _s3_client_locks if k not in _s3_clients and not _s3_client_locks[k].locked()]:
+        del _s3_client_locks[orphan]
+
+
+def get_s3_client(region: str, access_key: str = '', secret_key: str = '', role_arn: str = ''):
+    """
+    Return a shared S3 client, assuming role_arn when given.
+    Assumed-role clients are rebuilt shortly before their STS credentials expire,
+    so long-running workers should call this per batch rather than holding a client.
+    """
+    key = _s3_client_key(region, access_key, secret_key, role_arn)
+    with _s3_clients_lock:
+        s3_client = _cached_s3_client(key)
+        if s3_client is not None:
+            return s3_client
+        build_lock = _s3_client_locks.setdefault(key, threading.Lock())
+    
+    with build_lock:
+        # Another worker may have built it while we waited for the key's lock
+        with _s3_clients_lock:
+            s3_client = _cached_s3_client(key)
+            if s3_client is not None:
+                return s3_client
+        
+        expiration = None
+        if access_key and secret_key and role_arn:
+            # Assume role to get temporary credentials
+            sts_client = _boto_client(
+                'sts',
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=region
+            )
+            creds = sts_client.assume_role(
+                RoleArn=role_arn,
+                RoleSessionName='flux-data-forge-s3'
+            )['Credentials']
+            s3_client = _boto_client(
+                's3',
+                aws_access_key_id=creds['AccessKeyId'],
+                aws_secret_access_key=creds['SecretAccessKey'],
+                aws_session_token=creds['SessionToken'],
+                region_name=region
+            )
+            expiration = creds['Expiration']
+            logger.info(f"Assumed role {role_arn} for S3 access (expires {expiration.isoformat()})")
+        elif access_key and secret_key:
+            s3_client = _boto_client(
+                's3',
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=region
+            )
+        else:
+            # Default credential chain (IAM role, instance profile, env vars)
+            s3_client = _boto_client('s3', region_name=region)
+        
+        with _s3_clients_lock:
+            _store_s3_client(key, s3_client, expiration)
+        return s3_client
+
+
+# Gzipped NDJSON bodies at or above this size are sent as a parallel multipart
+# upload; smaller ones stay a single put_object request
+S3_MULTIPART_THRESHOLD_BYTES = 5 * 1024 * 1024
+_s3_transfer_config = None
+
+
+def upload_json_gz(s3_client, bucket: str, key: str, body: bytes):
+    """Upload a gzipped JSON body to S3, switching to multipart for large bodies"""
+    global _s3_transfer_config
+    extra_args = {'ContentType': 'application/json', 'ContentEncoding': 'gzip'}
+    if len(body) < S3_MULTIPART_THRESHOLD_BYTES:
+        s3_client.put_object(Bucket=bucket, Key=key, Body=body, **extra_args)
+        return
+    if _s3_transfer_config is None:
+        from boto3.s3.transfer import TransferConfig
+        _s3_transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD_BYTES,
+            multipart_chunksize=S3_MULTIPART_THRESHOLD_BYTES,
+            max_concurrency=8,
+        )
+    s3_client.upload_fileobj(io.BytesIO(body), bucket, key, ExtraArgs=extra_args, Config=_s3_transfer_config)
+
+
+def gzip_and_upload(s3_client, bucket: str, key: str, ndjson):
+    """Gzip an NDJSON body (level 1, which Snowpipe detects automatically) and upload it"""
+    upload_json_gz(s3_client, bucket, key, gzip.compress(ndjson, compresslevel=1, mtime=0))
+
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 snowflake_session: Optional[Session] = None
 
 # Active streaming jobs (for Snowpipe Streaming)
-active_streaming_jobs = {}  # job_id -> {thread, status, config, stats}
-streaming_lock = threading.Lock()
+# Each job's stats dict is written only by its own worker thread, which updates
+# it without locking; readers take a dict() snapshot, which is atomic under the GIL.
+active_streaming_jobs = {}  # job_id -> {thread, stop_event, status, config, stats}
+streaming_lock = threading.Lock()  # Guards adding jobs to / iterating active_streaming_jobs
+
+
+def _set_thread_sched_policy(policy_name: str):
+    """
+    Move the calling thread to a background CPU scheduling policy
+    (SCHED_BATCH / SCHED_IDLE) so generator loops yield to request handling.
+    No-op where the policy isn't available (non-Linux dev machines).
+    """
+    policy = getattr(os, policy_name, None)
+    if policy is None or not hasattr(os, 'sched_setscheduler'):
+        return
+    try:
+        # pid 0 is the calling thread on Linux
+        os.sched_setscheduler(0, policy, os.sched_param(0))
+    except OSError as e:
+        logger.debug(f"Could not set {policy_name} for {threading.current_thread().name}: {e}")
+
+
+# Each streaming job runs on its own daemon thread under SCHED_BATCH, to keep
+# HTTP latency steady under load. A job's stop_event is set by stop requests
+# and at shutdown so a worker sleeping between batches wakes straight away.
+STREAMING_SHUTDOWN_TIMEOUT_SECONDS = 20
+
+# Per-job status and stats updates take a sharded lock so workers and stop
+# requests for different jobs never wait on each other or on status polling
+_JOB_LOCK_SHARDS = 16
+_job_locks = [threading.Lock() for _ in range(_JOB_LOCK_SHARDS)]
+
+
+def _job_lock(job_id: str) -> threading.Lock:
+    """Return the lock guarding updates to one job's entry in active_streaming_jobs."""
+    return _job_locks[hash(job_id) % _JOB_LOCK_SHARDS]
+
+
+def _run_streaming_worker(worker_func, job_id: str, streaming_config: dict):
+    _set_thread_sched_policy('SCHED_BATCH')
+    worker_func(job_id, streaming_config)
+
+
+def _start_streaming_job(job_id: str, worker_func, streaming_config: dict, stats: dict):
+    """Register a streaming job and start its worker thread"""
+    thread = threading.Thread(
+        target=_run_streaming_worker,
+        args=(worker_func, job_id, streaming_config),
+        name=f"flux-stream-{job_id}",
+        daemon=True,
+    )
+    with streaming_lock:
+        active_streaming_jobs[job_id] = {
+            'thread': thread,
+            'stop_event': threading.Event(),
+            'status': 'STARTING',
+            'config': streaming_config,
+            'stats': stats,
+        }
+    thread.start()
+
+
+def _request_job_stop(job: dict):
+    """Ask a job's worker to stop and wake it if it is waiting (caller holds the job's lock)"""
+    job['status'] = 'STOPPING'
+    job['stop_event'].set()
+
+
+def _job_stop_event(job_id: str) -> threading.Event:
+    """The event a job's worker waits on between batches; already set if the job is gone"""
+    job = active_streaming_jobs.get(job_id)
+    if job is None:
+        stopped = threading.Event()
+        stopped.set()
+        return stopped
+    return job['stop_event']
+
 
 # PATTERN: Dependency cache for background preloading
 # Loads tables, pipes, stages on app startup to improve UX
-dependency_cache = {
+# The cache is an immutable snapshot: writers publish a new mapping by rebinding
+# the module global, so readers take one reference and never lock.
+dependency_cache = MappingProxyType({
     'tables': None,       # Cached bronze tables
     'pipes': None,        # Cached Snowpipes from all schemas  
     'stages': None,       # Cached stages (internal + external)
     'databases': None,    # Cached database list
     'last_refresh': None, # Timestamp of last cache refresh
-    'lock': threading.Lock()
-}
+})
+_dependency_publish_lock = threading.Lock()  # serializes snapshot rebinds
+_dependency_refresh_lock = threading.Lock()  # at most one preload at a time
+
+# Refresh-ahead: the preload re-runs in the background every interval so the
+# list endpoints keep answering from a warm cache, but only while something is
+# reading it. Reads are counted by the async list handlers on the event loop.
+DEPENDENCY_REFRESH_SECONDS = 600
+DEPENDENCY_REFRESH_MIN_READS = 1
+_dependency_reads = 0
+
+
+def _publish_dependencies(**updates):
+    """Publish a new dependency_cache snapshot with the given keys replaced"""
+    global dependency_cache
+    with _dependency_publish_lock:
+        dependency_cache = MappingProxyType({**dependency_cache, **updates})
+
+
+def read_dependency(key: str):
+    """Read one entry of the current dependency_cache snapshot, counting it towards refresh-ahead"""
+    global _dependency_reads
+    _dependency_reads += 1
+    return dependency_cache[key]
+
 
 USE_CASE_TEMPLATES = {
     'Quick Demo': {'meters': 100, 'days': 7, 'interval_minutes': 15, 'estimated_rows': '67K',
@@ -78,40 +343,59 @@ FLEET_PRESETS = {
 }
 
 # Production table sources for real meter data
-PRODUCTION_DATA_SOURCES = {
-    'METER_INFRASTRUCTURE': {
-        'name': 'Meter Infrastructure',
-        'table': f'{DB}.{SCHEMA_PRODUCTION}.METER_INFRASTRUCTURE',
-        'meter_col': 'METER_ID',
-        'transformer_col': 'TRANSFORMER_ID',
-        'circuit_col': 'CIRCUIT_ID',
-        'segment_col': 'CUSTOMER_SEGMENT_ID',
-        'lat_col': 'METER_LATITUDE',
-        'lon_col': 'METER_LONGITUDE',
-        'substation_col': 'SUBSTATION_ID',
-        'desc': '596K meters - Real CenterPoint infrastructure',
-        'count': 596906,
-    },
-    'AMI_METADATA_SEARCH': {
-        'name': 'AMI Metadata',
-        'table': f'{DB}.{SCHEMA_PRODUCTION}.AMI_METADATA_SEARCH',
-        'meter_col': 'METER_ID',
-        'transformer_col': 'TRANSFORMER_ID',
-        'circuit_col': 'CIRCUIT_ID',
-        'segment_col': 'CUSTOMER_SEGMENT',
-        'lat_col': 'LATITUDE',
-        'lon_col': 'LONGITUDE',
-        'substation_col': 'SUBSTATION_ID',
-        'desc': '596K meters - Searchable AMI metadata',
-        'count': 596906,
-    },
-    'SYNTHETIC': {
-        'name': 'Synthetic (No Production Data)',
-        'table': None,
-        'desc': 'Generate synthetic meter IDs (for demos without production data)',
-        'count': 0,
-    },
-}
+@dataclass(frozen=True, slots=True)
+class ProductionDataSource:
+    """Table (and its column names) that streaming jobs draw real meter IDs from"""
+    name: str
+    desc: str
+    count: int = 0
+    table: Optional[str] = None
+    meter_col: Optional[str] = None
+    transformer_col: Optional[str] = None
+    circuit_col: Optional[str] = None
+    segment_col: Optional[str] = None
+    lat_col: Optional[str] = None
+    lon_col: Optional[str] = None
+    substation_col: Optional[str] = None
+
+
+# Schemas scanned for pipes and tasks
+PIPE_SCHEMAS = (f"{DB}.{SCHEMA_PRODUCTION}", f"{DB}.{SCHEMA_DEV}")
+
+PRODUCTION_DATA_SOURCES = MappingProxyType({
+    'METER_INFRASTRUCTURE': ProductionDataSource(
+        name='Meter Infrastructure',
+        table=get_production_table('METER_INFRASTRUCTURE'),
+        meter_col='METER_ID',
+        transformer_col='TRANSFORMER_ID',
+        circuit_col='CIRCUIT_ID',
+        segment_col='CUSTOMER_SEGMENT_ID',
+        lat_col='METER_LATITUDE',
+        lon_col='METER_LONGITUDE',
+        substation_col='SUBSTATION_ID',
+        desc='596K meters - Real CenterPoint infrastructure',
+        count=596906,
+    ),
+    'AMI_METADATA_SEARCH': ProductionDataSource(
+        name='AMI Metadata',
+        table=get_production_table('AMI_METADATA_SEARCH'),
+        meter_col='METER_ID',
+        transformer_col='TRANSFORMER_ID',
+        circuit_col='CIRCUIT_ID',
+        segment_col='CUSTOMER_SEGMENT',
+        lat_col='LATITUDE',
+        lon_col='LONGITUDE',
+        substation_col='SUBSTATION_ID',
+        desc='596K meters - Searchable AMI metadata',
+        count=596906,
+    ),
+    'SYNTHETIC': ProductionDataSource(
+        name='Synthetic (No Production Data)',
+        table=None,
+        desc='Generate synthetic meter IDs (for demos without production data)',
+        count=0,
+    ),
+})
 
 # Realistic emission patterns - based on real AMI infrastructure behavior
 EMISSION_PATTERNS = {
@@ -264,6 +548,16 @@ UTILITY_PROFILES = {
     },
 }
 
+
+def _segment_sampler(segment_dist: dict) -> tuple:
+    """Turn a segment_dist into (labels, normalized probabilities) for rng.choice"""
+    weights = np.array(list(segment_dist.values()), dtype=np.float64)
+    return np.array(list(segment_dist)), weights / weights.sum()
+
+
+# Built once so fleets draw all segment codes in a single rng.choice call
+SEGMENT_SAMPLERS = {area_id: _segment_sampler(profile['segment_dist']) for area_id, profile in UTILITY_PROFILES.items()}
+
 SNOWPIPE_SDK_LIMITS = {
     'max_throughput_gb_s': 10,
     'max_batch_size_mb': 16,
@@ -273,8 +567,6 @@ SNOWPIPE_SDK_LIMITS = {
     'channel_inactive_days': 30,
 }
 
-FLUX_LOGO_BASE64 = "iVBORw0KGgoAAAANSUhEUgAAAFAAAABQCAYAAACOEfKtAAA8wUlEQVR42u28d1hUV9c+fO9zpgFD7x0pAgMoCAICOqhYKIptsMXee4mJMUZHNEVjNDEaEzWJGjvYS4wVsIsCogKiFGnSe51yzv7+ABPT8/5+7/N8z/t+374urrmYOXNmn7XXXuXe617Af94gXa/MhnCnKUMN4QcA9Jf3///xV4NSJQOA7Jsk25a3IZheWxZY/c4QJ3dKQZQA85823/+0CRGWXc8DELp52M9MvVvJd7MxNgvt7epOCKhXguL/s1pIkpRyQYJCwf7VNQoF2AQFWABkZR+bTXVf9afnZsrS5bYmdkolmAQF2L/aykolmCSlXKBU/udp6n+fJMmfvU9+eaWUAJBkftSfPzKj50IAeJqgEP2yzf9z7CHzb3IIklsfDpl5fkXYUEp/JwDSKRQq+qSfjR+lVAxCqI1EYi4SS4iRoUgEgHjHJao3RTu7jXTWsyAE9I17/3y/OT0NnXK/jpmzY7Sn179L0P9SASYp5SwA5HwzerlubdUeC8Jf/Pot3xmEgL7ezpQqCQAcnhV4JC7SPv2GMvz+0iEe1oKOjha1Wg2tluMA0H1zgj4fEWya847C68lHcQHetGvLdgqSwgQwmBjT60pDRvE3Yb3tL+1aqTD8d3jvf6kAw8PDAQBaiK15sSEaGho4QK0DAFmyKgKAMMx6HoCRl4flsFvXS+FgadozYqCPZTFQr+G0lAU0ANDL2zYyJ6uVNRBJLIJkxqEEoOGQM13bnuobgmEIDJpVHRqBvoGp1MiMIQQU9H+wvVMCDKUgYRZi5xPzA28//3QI7SOCx+vPAKBLE4Xr+ttvq94aQo++5X4z2M5Ox9/fX5ixcQh/Zp7fuxQg83pYbKz8YihNnt+zYpyrod+bYQ3ttJk4McP9XsGWvnRVf4dZ+EVD/zNHgkLBUprAJiT8pWfttHGdDoJNix9W+u3YXpcBMF3xHuSAoEsAoY9WBdP3g60ud33P58nGSPpZtMvGrv+t0lbKub2jvL7vMg8CAFAALAgQYaE3MPeTCO3HoVYfAQD9m3lRgNAEBdt1H/Jv38JxiYkcIXFcXFwi9zd2htJvZgkZhnDF1W23/WV2gwBYMux6Xg4Itsz2J4RlqaUAGp6jsDbWLQZgtszH/JKHpyXv6WKzKEjEDieEVFBO3WFkIG548/fmK+UEFJg1JiiIMbBgj92u2EypklkXl0j/xrtREpfI9Y9P0XbK898kQKrs1JwvxvUeWXRw+smf3hs4lgD09ft/NNYd3k15npILyU+SDHU4Os1ROgI8xQ2GaAN2p2nA8w7WAsYDPEcNpYIXUoDMnhJivWzFWWprZqT70RJ5AM/zhGeIkGV4IXnjgcPXJXMAiKkexj/Lf/UwE2gA1iEe4P9M8wBgWDc9y+dfjdub8enIL/wBs673yb9UgEqAYdav5911YNOnp93JK6dSB9mb6R19t59zJImP5xWdQfAfeBPwAKini+VtFccRlZazpQB0eOr3zWiPb89PlxUN9DDeLxCLSN6rlj4tQHVjc0urn68NKxFwePqiypEQois1kAiaOzSmv7p3YhwDgELD1xiJBV3aGUf+VPEoBQDB0nF9zpQ9LpiKpqYlH6+LWtalBOy/VIDxAOX5tUy3dtR2cFyyvZOhlDLgi/Mq9ZVKJVOV+McrGA45QwC4uFmOauJYeris/YNRTgZjzy0KTA/yNJuRX9WefD2n7rMbj6vqxkZ7DQkUs/3X7bn1zogYDzwrqbq29PTT+MPT/PcLRBJyLKkwCQTYmZ1CASA5q4oAQBvFKUNjfTkBhAxznPsTbaKdzkXJl5bV69q4mKFRpUG7mn8IAIle2fTfkOx3Tiymu9Rs/0z/nfnbRtDtCp/hnY5FJvqjiVNKGQC4FR919+CM3loJMOH4dN/Ce+8ENzgBk15f58pidNI7ofyPi0PUlsCizM3DtR8Pk21Y5Ge1u/LLGDqrh+XuNzx3566QQwAAb7kaTSz8PJau6Wc/rPOa3+0GogQYmiQXAGDT44dkZmwYnPbBYJcR+D/cvv93GVlX6rVvgu/Bgi9GN3cHRrwhMEKpkqEJClaOzgeMMBIsyY4fyC/pZXbFiSWfZK8Np8v9TBMBgCbJBQoZRAAw1AhTyr8ZQ0db6t/M3DKCfy/M+dtT84Lbj87wfwZAr8tjv/mwDCEEhkC3u6vlTXsUnoXo8uwKBVhKlQzDkF+lkIfmDUh4+cUYagx4AcA/iCT++Rb+E4/aKRBKSdfq0379qIDSBHbF4UdbaxvapRtnBp6c6W87JmZ2jC4hhBISz5O4RC6ZKnkA0BWzTXoChqhUTNLoXta8RMgiNbc+Q6EAG9A/hSAbnBJgdClu1jS0ciIBrAkrQmNDx2gBiFCgK84mhLQiOZz9jdekPM+TRqBQV0dY09auEb5+rsREcITE8zxPQSmwfLCX/ZYYt3cifK0Unx9OPVoPvFAqZKK4uES+M2alhGEI6B/Hj3+vpa8D0tevf5fjKpVgQIApDtLR95YHF2Ws6ksfKgd05GyNfZ61OTLtuzivrwGInyo7gYBz84J/uLEspH73cLf2c7P96/UBd0op8ff3F1JKGUIIoowkjnnbhrW95WSUnr1jgmqBzIZeW9yXe7xt+CZFQgJLaZJASSmD16lgl/bsnhDwYc7GGBooFfSllBJCCCa5GE26u6b//cefDc9/tiX21X1lBL27qi/dG+e+HYDoD7T5T1Ge30YhfzomhDkY/1rzQHpYQu+npYF7szcPevBBsO1khiE/26E3QE690ebiwWsCLd/dPMDh4vcju+VVbh1Kd4zwXggADEMgE2JK+vty2r4nhq4KtT4KACzz6/nPBswSFw+kE7tbbn65Z3zpEn+7vJ1je9PL64aufHPXEACz/f2FhBBEmEnlLzZG0w/kjjcAMCzLAIDljbeDVTfeDqjeEu18enEvixP9jQRrANgBAMsyUACsAmBpgoIN0xP2uDA3MDl9XfiTVf3s4/CrXBsAwAKOkj/VPH9AeGVVWEL+tyNrzi3ts1cGiJ5vGyoGwBye7h+d+8kQujPajWYoB6oBOIIQ7JrtLwRAEhRgCfP7hUyc1fvTl5/F1IbpYAyllDEEus3zMjlUvyOCvuWuf7TzKkNnHc+wve5jF6Z6jZmdbuMR0ifI1jnKU0cam/P1OO7ovLD1voaGCjOJtJ/tkIlHPaYuy7SNnJQCc9nUrpXTvbA4ND15eVgZAKsurXLdGivLubcyWOsGzJ7byzLm/TCbm9+NdSvYP87z2Wxvy0UAxAAg6BQ21ofYnb+7pA89OtqdPv4kIhUAKVTKJZRS8skIH/+nm6Kzn6wfUHBgsv/gTk3sWkiFAmxiIrj5vc19107xz9i/7yHiRsuwdt+ToQdy6y8RhsHyAAvZ4NDuN4x0BKauTka4kVb69N1dqUNfAGUMQ8DznVteATAyOUh4uByDPrqp1Wp5k7urB1Xn5Ne3TD/60EYgYFu1Wk56cLpvtqWlqfXwT5JHyWInbvafMcddAx4SkRA6qnbuwt4DT3NPn1iW+5X8HFWp5nlsbNQdPGfsZs/IwfrFJUVwtLND1f1HOLrxq0mrPCud5ozssWH+lisbLpR1rAWA4U7GUw+tGbC3rqoMbRoGvFqNsto2NLXzzw30RAbO1gZWKU+aSr86lb06rUNz+rMY90WjQuw+bNZQqLUMMp5XfDs3MWsWz3ea2mPT/G4btXWEGOqz4C1NL4Z8lBJFk+QC0j9Fy2Znd4YmH69qa3WwMLFxcjR1am5s0Q6LcB89wMNc79y9kpqUspaspsyig3V1Dak3M0oTQnyto6ZGur3f18W0NvFhWTZDiIYCJBvgU4rA708p4o+OHsMez8lpEzS0tk6M9Y5impsL7rxsfMSyjLqytKFwYpTnBH1Gb4zftKUWuTW12hPKeCYnKQnW/r3g5OtnnXXjTuXKSBOPyw9eFT8yC5oXs3CW5dmtO5ru7vk2o/BFvjZ68luGLlXPo+P8xOHXH5fmbLtTOpVlGA3PU5+v5wZtLy2pEh+8lF9943FF7rGklx8ok6veS8ioWXcgtfIrC9r+GBJJDxXPzFgb674o3Nc86taTV9sPnkr7Iju/4ZAyuWgzpTB8t49T+PY5vQ+YSJiQ8ibNK+jrv0zLKX/38ov6UjgVISXlD1LAIbq61mLAZcMAp+O5Hw2iqav70g/6d/v8Nx5bb1uUy4WSz4bSYzOCUwEYKjuNK/m18e1yHktCjz/9NKbdTciMZ7q2zJpo73O1B5bQrTcedlgMn0mNbT23G5l02yibvJxfll7EmQREHqv8fkTJ6tgex+SbDlfOvZjGM0YeSg+PXsGibgF8zDen+bTLP/Ap7w3mbHREwxmWAIDRB0O638/bGkv9pYgFoA9A+BoKZxnys4Mc7mw696FSTq8u6Z080cWw15v472Bz/ZAjk33zy7+IognTehQOtzGMAGCMrpDsTz3ra4SkK2gSBQDDD0/2ulC0ZSC9uTr0xWSZ1RxrYPAIJ+M4AH2mOul/WLs9hsaHOw9kCPk5qAUAKBQsQwAdHRM7E2LwadamWLp9on8DAEdCAFsd/aANM8a3b09/obFRzOMFVna9BTqWgT1nvEuXZ5ZSaWBsQtHWiOLVw3odj9h5rmpqYgoVWHnNJ4RA5BacN+rgJXr41EF+ir8s+eeMx8nyUP6WUXRhv561YE37s0yn85LLIehydkxCgoKVAI6nZ/hpb73T5ykA+EulZj30YAHAau9bPsdeboqglxYFahb4mH/WJTgQQsAQ8juI7E2JUkLiaacgKQigfgicnfBD1tloy4KFkwc7b/9gWo9vJpa7tBvqigRxJQ3q6fszoqflVy11szf4lKc0YF0y5bIJYROhpEiM53iRbaR139C9rm4yy8Oltepp4e6GY56qPrlcqf6cE4tDzlYKRbP1JJSAJ1oVOsC1qTmeU/GUF7fzbEVxg/6rp/UtNjyv1QOh4HlNEyiFWsNlm0hFLo86pLjSqtfL2S9opW5Ns+uMKI8Jz5lu2lJfX6MhsvbrqSnJp+pz7salpECbApAEhUwYN/a4epCJIDY8yJl9f2tS/nQf6+8Xj/AcqxGyFYy2Q1fdobE6cjV/z6orhZ8BeP6r5ACg8fG/BinYP0JbSEoKe3hW4IoPpwbs8tYXuX+eWrb++OPq2zZU222Av53L+/HXMGOcr/hlTnlaVlGzcMEYn35VRXWCkQvevZ5NCFVCTm7aNX4QNnHc7piZ0/VNrUxAZQFssaEzZ2Bq4l1SWjWrWa2StwuFome1Dcyr7JyX6ucPlOBgZtgjYIGNfwCTe/XyDWMV/SIhvVzHIbxfX6GOhHl68vh+qJtyGYtujrxIGFFdmFNfnF8gFAokUd28vXo5DIvjStzDBQJrc2LX0wcuPXp4ltW0DGgprjlJiKojMauaA+D2w9L+W1rbtczbx58KV4/1G/TwRoGotanN2K6bqSBk/Y3Blwoats8MdDD4fLJf0pwBLuPVrxpLH9e1FyqVYH5r936ljgqAJfHx/CB90aBgN/NNt09mePXsJp0XKoQXgKunU1+l5ZY08cuW9WVFhmJu/rhen+ZUtRb8cCHn+sczA1f/MM3/RogJtYlHPGPb3fWdPmPHMj8eOnxz67yFh/dvWNf2w/WbbHnYQMZx9GiiMjATt7S2lVY/fwa+vWkHAA3ExlY8T1lWLAQoZ7sx8fTd5pbWVqFIyHIsAQSsDgHA1zadqntZqKkoLK5uk+i3qR3d+O6z5+K+Wsx+++kW9Xcr3nm1c8W7rSqplPcaMiQMEvhQSpl3BnZblrp+0FNNB+c586NL760b63PLz0XKBMhd4NnLiZ65np+hAnIA6MQGm28sf/bKV1XeIB/c2+ZLAHTdOuXv7N6vjGIiwFNKSbgRufvsVeMNt6BufUTiDuH21aFpx34qyThzr1jvva/vXPRyNu5eWt323bRo78WnPo1dcPzK8+qFnySpl0zq3Xfu+KF5LaeyY2BvX9rU0u7x9PqN26Q6f5VApGv3ZO/eaYWPMxfoWVgZ6lqaSTT1dSaaitImHY3qemuXFaEgELAMCKhDgkLBxiU/9gIDoiUUYAVSAEBtVSnfWN+o4drbzG1t3cUSEW4lJr54fuvO6vbc1HSalFRERk3fmv4wc5Grt0zLSC3t10Y6L4jpbbv1xx8zueziRu67j6I/Y9Ua6baEjHm2dqZpOfl1NrvSyl8ONtdbsHhSj8n+nqYOmRCD6Oo28R1lKzqBTfy1ADvtICEAGlK+uDXoyIKBTt9+99RvUE+TbxaO6xk8qLctTj4ozayo1Vy2MhVMOXIl98y5a8/t508OjokMd8eBI/eanlYxHz4uq851LCs2MjAzIB4DB4x/criisqyh8gjbVrWh5VLB5y1ic0tjdydXsZ7UQqztKBKK2MauDSGkDAPKMOApb5WYmAhYyAy0HAeW54HmppcAIJOZatraGjYzRGvGajSn68uKzr18fPcFgBYGABkyKlLiGzCm1wA5X5GWLuDb2p6vO/Xy9pP0/BHjBvsMmDbdSfv9D7cNrz0sudS3b/f6klcq76YO3mz7SPePBgfZez171dD08bcP57Na0WNDO+uy+DM5LwGAxMfzfyfA15gZIYSox3917TmA59eutaYkP2uLmKHw/WHaUM+JPGUJw/MwM9PzLKpoxneHU0ucXK3uLJgaGKDhNKNnFrk+ifno+qzssAt7J72z2PGah/vnd0+f/6TpxfNDEOFdpiw7v/5xdT4AePQeaKqmREsAUJFQyLMMQAgYgfBhIsCB19ZrOQ4iEEBX1wwqIFtHh0ZIBbuePetQl5bean+dEnK8bg/exf0Tj5joqNhJb4GrasDp01c+DRUXV69dEqF0tjYKzi1pyJr57nGHcD8b/b0fxwxpaVQNaVNRUKoFg47c5MySMXOO5CYDqAUApBWDKsGQ+D9GuAV/jitQolSChEPODNxwoyKsl3Wvh09fvVBezRnraABBXQtcDfVF/RdM6OWiXNhHnlfW6rbw09uHInoYzI4a1ONC2YG4C4qPdh/+IftlxIDJCi9ZSB/x/as3ZqQmHA3TlmICAdJBgGcPrtXC31+ohJKJZ/axhGGg1WjBa/kOAAQcVfFaDaUMQ6Cja7e2Hkx8ezu5mpbWDIBnCAFPqQ6nazPJKjpmW8T06RI7CzPcO3pGe3Pv3j07hoj0I6ZNyK6urGE3/XD3K0sDkf2GBYFeHCEl+088SDx/s/SJhMFTMUF7kgbZACjDEBwdTdlEADIZ6J8J71cVUW9AVaTLuTCd57YEAITHZ/i0n53vm9eFwP3q+zMcRZ6Jc/okzAj1OQ6YTA1wdd1+eHl0S9mBBQ37F0Rvk9r6bfaatIxOOXuTm3LpIfVauE5L3EIuQ2Q7Rql8424GdkOdZq6gk9MKqE5gZDIBAAvPRPnOozTmxDXKOHiv+U3JgwUkNuNMIic+ifzhDF2QXsAN+ux7auA/pCzEx3N71tbRDx998RadFxV4FTBZbC4yHP11nN+9U3N6TgVg8Dts7xeQhPwBjNUJyHbJ6jXsR/7oJjztjKV5bi2TGJdNPkhM7HNGGXb9+pPK5MyiF9G7YuR0XXwKf94f7MOHVEtIqBReBj+EvTXa1c7Fwbu+oga5F6/WejTmNs2O6GaWW9Hx5ardt+4LPd2Odh8QodtnVCzHa7RsyuFjyL95IwOtjbvN7Mwf1JRVLrPuP3hi1Afv4+iMmSWoeta7VaN/cNCGDRF6Rgb09Lz5Weam+m+1tKlF7W3qiVI3t3HB48daugUFozQri79z7DhTm5n+PMBa/+RHMXaT7+bWme7J5tWmQaFi155eorb2jrqH1+8+qPnx9rsMk/V49GhPERKzOVkXvhjf+Up/TiwSFAwz7jiH1/Lg6R9uYcGecT22+csswq7cLN618srz7wEYUwqOkPhqALwvC1OWp0Kq4qp3p0ETEVMtige0cFYQhhDKOgd8PmztihE21mZIPXsW3Xx8MGXjB6YZt9KM5x1NaGqreBmr52J1TSTWKLIunvsyLzXVpVfkYETOmcZVxQ7zSz5w8Ouqp0+g49ED/iOHQ9PcSLVaai+Vmnm3tfLi2tIyuAT68d1iR3gX3kjJEBjqkt6zJqBP1BDUviyi5zZ9Rkoz0hgB4Q4Zmul8V9yqnjr1RAlE3kGqkZ+OlxpJxUi/cYsSPUOTsauWDzmPNq+iH5/2TEjIqu9C1n8rGYYQwpO4RA6AIQCWUjR7i0QuXy/vvUPDEf3DKcXjvk0tLiTLepsPXaTwuXjx6ovSqPDuds9eNakJqIjjOTS3ql+cv1v67sHnjad3Rztd7R/kEL54R+rki1Udh5VyuSA+OZkDIcRm2JSnwz780P308uV8zdPMpzA0dbCXuZuEjBkJc2dnPE6+g3tnz6H9VWmGVF+QRMGqWtv4Yfo2tt69hkfDPbwfV1hUwprY2PDONhbMN+/Fozknm1JVUzUj0jHU6BiKB8yfgdDowTQt5Q6RGhuD0XDa1MOHBYWpqbyQaNN1JezTlrqmfK1QPNOhV4BjSNxoauloSx5fSUbGT5fRXl0NDUfowOVvc6SlUXB53aqBaK28DoWCRWIi92YsfIIhHM9TvX0Tum81N5TMFAgFDE/5NjOpSDc/v6Ha0EjXSM/c6EC/j5JnCFp5bXZFg7rAt4+7Y25V+4vahuYfJbpi0tSqNXC11gtbPcnrlN6x7EXLL7y8cdjGSL51UdChjq03afyNG0cowPg6Ghp06EhMBBRMW2MrMVCr5gcNCcj66fhPY0uzs9e4hvazDxsxDD59Q7S3Ll7zy7xw3o+rKPncwsZoYnNl8YCUnTvjc27c1ncJl9OC2/cYQeQgWDk5gieU9Bw62KLkaRZeFb2CQ3dXnNu1n3CtrZRvV9Hn1y5zmobaLGMzg/eb6pqYhibynk1g8NS+kybCppsjnty6S37ctoNrKi25KZUILxmKRGHVzero0tJXfIC7C6SGhu7Ne/ulTL1QJZyqlJNwLwuadrWACfg2XQOeWlxb1PuKg51+j5yXNfu0Gq6pramDLStt8rK1Nu+lqy9qbWxWXfnZBsZYSxxGDpAFLz+UfrkRaHhTly8v6nGgV3ebt2ZsuV1+/2Vz6/dzejnr6EmYiVvvxL4CzgKAvkf/q9P37uqfk5pKb+3eVdSWdXM0gEc2vQeavqqsmccamS2ThfQxCYodjnZKuHsJiWz+7VvtjLY9WU8qdmzX8p4UQnAqNekeOxyD5sxCa10dX1taxogNDHmhiQlpfFVOfvxwE0hLI2W4dioUkAJCiKa9gxcZ2dk6B4+NIza9/DWlGRnC1FOn6xvyn2eJtJqN2pKsCzyllgIn37smAYFOoxct1bxIOEmvfqUcC3BnfmvTdICgS4sD9zrYGZsod2eM2J9Xde/NzzcPch5gYGtcPWdf2pPXsAt50wa8rjnRL28h/rseagkh4gOTel6LDHUO2XXyMeqr2rB6qg9Sn9e1pRc3n7WzNy0rbqbO+j4hUUYjp4nvl6tw/9zF2sKrlyNrH914QACYOcqsqlu144WW1h/4RMaYBA6L4hobW9iUI0dRmX4XOhIh1Yj0iFfkEISNHIYXT3LovSMJpD43p1VkbKrn0CcIvaKjwanUuP79fqhK8qiW04LV0yeBI0YjIKI/zc/NI8n796Eh4+FxVJUtZkhbeZfNZ+yHjM4JilN0798/iDqUZJPMfd+X6vINORJtS6u+kJYLQTtUKrVBU0uH1MfVdKy5kR5mf37b93ZDW+ZTpUxUDXP+dRUEIYS+Pt4lBJ3YmBJgvBQKokhM5N8sm3jDHrjsGO6+MyLMsVtddZNxa6tGx9BMX8DzEDMSMaiOFJSIVCWcCX9d10/ULgtik/Z+V6/Oejg9LM36XCISOQJA6ObnqVHzu3Ws7cJ8oqP5XlGR9P7ps0z6sQQiMjXBot07cfP0eaQeOAgBr7pmYSRaUFffNowTSDYKLGyYaZs/wsMLl0nqvn3Q95Jh3Hvv0PaWDj754BG2NPVOqUDT9hlflr2t01sSGMLAWBvae2vf2XOm+ji78XYZl3h/QQ0I1VK+vU7ItDeCaFrBadTg1GqIhUwbT5m89XtS375Up7qqlMsF8Skp2l/hBQqwMtkvqAz5R2fADKG0cznFXSClpAuo5PUBiQ5g3CaSNtk72PRqFBi+06xn6q1nb8eIVQ1aTVX5pyCiH141iF8i7ycVwxDouPZY0NpBtveeu5B6hoUwN/bvg9jAEAMnT+LOrd/AlD96eEVTkD709Wob+fVd2Njc8cXIDzcQEIbJvHgJzsFBkPXy5XfMW0r4qtIMMwtpXHXanXxAydgFXxI31NXp6dq57jWwcYzpaGzRtlZUsYbtTSVMS8Oegpc5B7siEA5AGwBtlyzau/54pRJM/N8F0H+HsL6Os4+NpmzcccKBUhUA1ZsfNnf9Qd2CnLzaEgd36RSuqqy5QdMOc1tzQ07INkoor7Iza2BKRTIRn52tNjAzfaxu0pC6qhqqr6+DkGFDWnWk+pxQQPTUqnYQAdSEEAqlkkF8PE8pfcYKhFCp1NTa0x1BwyJ5Qwtz2lBdD1arYaSGOk+q0+7kw3WoGHnZWlEb0ZeI9AOIvnFMa3kd11JUyAhYUDVDRC1q5gWAmi7htf/RA7MMQXw8/UdlHoJ/ciYaFw8uSEj9507y6aUClXA8hKBEAMrzai0k9R0CW0ZqYKDWivikRhNfI2cPHZWqWdRa8OJq5b0bnwPQQC4XkJwcrb6dzKS8uGITzKyod79gWllWgeNvv9eia2Wpnv7VdgNGKqVaMDHSnmGzRRcvHlX5BDuqVeppWipirW1t+Je37uHqp5u11uHh9K33V4kcQkNo3qWz/SE1DyX5P92mAArahjZaiSsLSUNDoo5z99HWwf68oLYa1pX5Td1Fbcs17QZLGXWdWk+oLRGztKi1WU2NDSQqiYh05OY3FHz1sPoSw5CWrsMy+rcH5AkJClZhLiOJO7NpXGIi/7qCW6mQCeMTs9WDbHSnbJ7Te5+eDot2noAIGHCvaydZMSirD4GBBSrsA5Dl0JfPLqthLmzbllh64/4MOMk7SPpuDShAAV/GPfhDr6ioaN9hwzWajnb2xv4DTP3z52AtrBC3dhVqyitx/dvv0ZL/HCxoMafSWBILC7FsaCSiJ0/Exd3f4/mVS2ANTRAQEwX/qCHci/RM9u6hI1xt1uOb0NStJJWlqa+fWs+777mgqdNihowaorVuKRP4Ft8DW5YNqq6CWNsChudhbaWDwoIaUMrAwtwY3/9YkP7euex+lNL2cEKYZIBb1yWrcKWcCQdA4lM4APR3Xvi3Y4SNqPuGuQFPXpW3lq78OvM9HtBpB55VA5USALoCiR1r4/a9fOkCF4N+/WjGuUuC1DPnbrQ+uq4gQFVXmO8BG1m0LHLomsBx4w2Funra1LMXBNmXfgJpaaQSqS7UjBAwtSR9J02Aa1BvZF66Sp9euUacevggMDaGV2u0zMXd36M56xGY9qZ2gHS0aaixqYcM4eMVsJN508ybd0jqwYPVbU+efgiWu8A0l+Tz9j7OQpHeeTu37p4B40bwPu5O2psfbml7fu/Obuv2otLWDj7s49m94vR0JOrlW++QfjJjfLgoVHgho+LL8bsfLvm7HcoCwMklcsUnU/xWuOvr0AtPKyo9oK9noSswnB5iM+b9yT1OPs2pqhv+XVZoBSH3Kgky64CyDpDGFkIa681ldZY+vu/4z59rcCz+Y3XmNxsHaSoK1zGEtFJIZbB2ec9x6MjdI99fGeMZPkCUdiWJXNz2BVP+8P51qQA3wTKubRpeJDGzIG11tbBwdYFYTx88YYj/qJFaUytrUpD9nLEwN0X2tatQqzrA8QSq1uYOqY4gp62qIuPp9RSDVy9e6Lv19ufCxoyW6tg7RlbWN03VaJnu+iL+Tk9Xtx2lBXnRj2/etzDqEcTrm9vrPbiXmlJUX/GJysIyrTityGHs4O7eNpZ67R8lFZ0vf/aKzop2HTbY18a6uKAuz14qIh0tan0PAwOrxPf7rV4Q2T28jejee1xQqSXrB7v4Dw+xefgg9RXkoVaobVYBlIKCgZ2pFOlZ1TnT9j+d0cCQu2M8qAjZ+DntkVEljSfxerJxi3Ijli6y3jl3jkpSXzS+pam9GvWN+g7DR84LmTBpWHdvGdKup+DmiVNoKiosleoJ4gUMnjfUti6XODjFBo8bx3vL+5G6hnpiYGqKA2s+QmtBHky6dUNzXS00VdWIWrMabj080djQAMpT3DqSgPwrl2qhUX1hYCxFa5t2PsQ61u59ghA+aqRWbGwsuH3+J6SdPaPmqiqOSg10TVvUiA6YMl/jam3DHl27Yq6y5tnedZRyhBA62lqycvOSPhsv3H+VsOhU7rq5LvofLZnoM1LLsuhQa8DzgLGRCE+f1MLKRAw9a4MNPVclryXTPc38pkQ5321pahVrWEFp+tNXx8UEla1tnLCssr1uf2n7XhDSpqSU+V3ZLKUEhDBmQVE73tr66ey05BSS/tNFYmJjg97hfeEeEoLnDx5pUo4l5tXk53ZIxMxdkYi501TXPltgZtnPLyoSXkMGc411deTR5auMrbs7lfUNIw9/ukqfHj9K2Ja6dE4ocTOS9dCPmDMbOhIhvXniJG9kakJ6DB7CVecXCe8cO4nqJ5mcmNXeF4rIi/YO7SBWR9/GM6wvFzVpPDS8hr15+hzy0tLBGBpi2uoP+LtHTjA3v9zQj2hbblL4C5OUUto/PkX7jr/Fjrlj3BfsOP5syudp1T+ECPFJL0d9Z4mEUQnFopdu3Yx8rKXCEWamuqih7NuRW+9vJQAwy0U/JHZgN/9Nux+fvgmU/MrLMARr+T8QXpcJoEpQ009hbRI5ozBq7iyhREcMaxMDlOe9VB/f9UOlbdXTLAcLg6xjl1JWaC1dF8DAeK0sYrBFaNwYLafhBMnnLqDg6hUQVRsoB7jEjMCQudPp3tlziaDuVWxzB7bKV650cfTyoD/Mm0+gagd4AqmjE0LHjEK3oCDNs9R0wcOEk6QlL6dYLKI/2FsaEntWrShtM3LzHjocQVH9CMdSaCi0z1IzBUnff3+yn/raeHgpuMTERF4BMAlUSQmJt7r1XlBpZm7tzfkn88IJSyh+A2Ftj3UdTTW8aPGPBccA8AIKEJLffGdP/uM7AJAkhyD5zbLeFMq9Fp4SYMKV8p9P8gZuuKHtPEpGmSQr/crF+HX9xCbWha1VVWon1cuKdf0dgr2Guvc8kFTwUKtjN8MhVL4jbMJ4mFhbae5euCRMO3e+DfW1F6QGogSBRKRuaWv/tLH8lXt7azsIBc+2NRaB6tcKGNalrqqGR3tHu1RHuIkyzPP2kgLfS5s+7Wvp6xsWPDoWYz9eo3l8Jdnh8dnTCwrzXny3apyHysvJkuy+eor/+sTZVlN35wZ1U5ldW2VlYWXW3WWJgJp5dgKUUpI2J4ABvPg+BoxcKhGDo+Q5IaDbhrqIrfXztFlVnR54XTLlCCEnXtce/BwpKhRgk5RywZ/wcYkcELzOkX8z9PqKMeTkksBDDz8d1jA6yPtQD13xjMPLo7JKDs6lp1YOyXO2cdzjEDHuxvi9x+nSB8808g3bqV5wNIVDz590XXv4/SoVsvP62Oqt5XTOo5e8blhshZWVkyMcfG8O+uY4jT2ZQuHaO1Mp/2UeDCFgbGWriFvvCqcJ8+mEU1fU829m0tD3NqvNPftVzxoUwuV+PZXe3Dienz+wxyYI7ePOrBpe+3xHVNKa4W7Rr0vdXo9+BmRvySf96IogqzUKgFXKZKLf82PAvlmBQf6KSKNIkFEBu57nutQ4xNzAZeVEvwlajlpU1raLJGLWv19PM/+8giocvPii1NfXsVER6eNVUtHctP/8k6Ony63ch8ycFtp9SF9BZmYWkhNPoTb7SYNQQJdxL5/s43ke7iEh+g0teny/x0YdiQZ3I2yGj/lJsXI5/+3cRW1s+bP+TRrdvYNXr/bWMTXFmRXLdtGiR/OITCEEsoDsbDUAmPvJXWvqmz4VGhqP9JL3Q9/YGF7QqmFSD56hNXcv5H4Sa1Ll2920n0DCHt60N7VNZiGYOaSfCx4VtdVkv6jLNDUQNUmEDJdTXB8q0GjIvrulQeUMKWYBXF3TTxAen8KRPwn1BH/GpSCJiVyXeIUhAry/enGwhb0Rq2ioV5m3UAY97PTQThl8vzeVa9aCLpnZxwZqje13R+98s/5yfjyxD9g678NVch0LU37vR5+h9Elmu4DglIe/14pnpw6VA4C5q5dLazvjZqpV3zqORA7thlVUo6KEAgwjlPJUpycYgSHLsADlgba2TAagdgYlrIAz7K3u3d+q5lVFRnVGyguqVI4xOXVla+6PF2cU38+Q9ooajEHLZ/OntlH7kTu+mzvSusMtup/D129PDmB+ul2k3fjlHdI3xNlsqK/5QFWbGs0dHPxCbdECppSIxMu/TcnPrgJO9Y9Pqf4vpXLKriO8nRODhjs76C3JLayShnlbB4o4DrsSMpH4tDatAyjQB/p7Ggqkiyb0kvTqYYV9Rx/Rworm2m6h/q6D5CZWjY5BjoYujnTb0hVUW168I7p3wLr00wf4Z69KBzOeYZaW9jajGIb1ULU21leoa0fRzooAhtHy4AkAngcIMQUDCSNgwLAMwHMtAMCWl1OBp98qDcRDbaztG5o8vDOEh36kgprKfZ7dbHbUNVfOuf3dvsWsvj7jHOar9+wnY5vAAY69S2rL81d/csVl1nh/NuKdIeTzb++2bTjyuF0NNDUDZc4i9J4+oJvd/FjPJa6O+mhTaxf693C6uObb7I+vFRQ08l2m708FqASY9fHgJzpaBAe5GBx/cjdXODXOG18ffsol3irWdAB0wSBnG3mgi2VFTR3b09VInP6sXrVwzWXRsMFudNxIH7MzD8rNrqSkF4bMjVBzIJTXqCu5svwfz7a2jjcPjZoyblxcgEhqiJsXr6K5vgFiK1vLlqZaSwA5oAIGIGABQnmuRaJuv9/C6lYB1JywDCASSgCgqKiowyMwwprwAnQ0txj59o/o7+zhirtnTrvn3r51WtzWUKjixeVqrcZe30CPdjR11LS+yr8f2afb7Ogga3xzMA1GRrq1i8f7SOOGuPAqLa8CRA5fJ6Sy3yQX4uSt4pYtK0KkFSU1PpqScp/ZQyz7XP26YCAo1XYxw+kf1sZkA4QSgsK6BpOWNir0CHTGlTtlmh+SiscViBBgry/aNCnay/ry6TS7MG9L430ns8iS79Jvvjc/uN3GTIdZuvHqkbcPpfcmQOPjO/dMaFMjM+2Dlbrdxk4+EL5k6fZFmzcHRIT20ValPqQNjx6qBa1NvI2rO0+kZpthaakHASsQChiIBAIKQhgRyzWC1zSAchAQBhCKnAAAtrIxYnMbZ2NLa745/xlfcD1FbaJWa95eu8p2RPyHC2wHD/vMZ9QI66DwEObZ7VQCPdr4YVLh9299fF3xY/KzxvglQVQl4MuHrbzU6GgmMa/MrfQQtLQ4vDW8Z8XzDqy80cL1Pngq56q5iSHMbUxQ8KJS2im0db9Le5nf1MZwlKfkTrP6xy/2347LKm3deSipaEw2cDzWwdR1zWz/4aYmInj0tEVDfQfSntfXLR7Yrb8uC52lX6bmna9QLWAYRjtGoWBb8vMmHNn02R2hljOa8fZy0+EhftwI1RMua+NKwaPzZ6tYTtVka2JGY0cMg66peQA4gQ04vkNHJCK8RkMFYoluJUTGYFldLUfB8jwI6dzdoMJ5Mj9//eA+vXmRkGVUVcWiC5s3C7td34OhUrU2auw4yGNiRBd37G55cvxYLGkqTZ3t7y8sZJjj61JK++85mqlaMa6ntz5LLG7dLYRbd3MYGBD07WFsuTGuh6caMDqcWXM78XbZpYSk/M+VVwsUALSExP+1DUxQKFgkAlRZRUh8SuKp/Q8SHYE+P703MNHZgIy5/qCYP3Y1P6G3j33w50cfCR/VqtI39bGT37pfJNUyzNcEtL4vzwsSO5HtrNIMOmXXuvIZNgJJyDtBJLTFUUju3Ulfa2jrdaC+sGSIk5isM9Q3MGcI4aVGpgOFpF0qEgqgUalZXsudndnT3vRkbv0LkRbeOgKBUMwI2tQAIBAYSsQidDcQs4ZcR7FQR3Clqq6Ov37uRNSkIfnWX+3OKygUSpOqcp8eJa2vrlKA2Z2WppkNCL9lSEZyZmXyzJH8UHmA7ZlNJ/Oqlo8TDqhuUHXUXSsymxTpMfXWmsEjfjifVfHJnZK3AfwoYBkkfdBXEO5lQUlc4j8m4Rh/Pc4v4emHEfT68r50rqfZSTEwCIAegOndgLt7xshqCj4O10bokY/BEGwb6ipWyuWC16f3bGfZLca7mhyu3jOKTvUxLQc6GUlRztZHr+9cQ9c/LFA5RE+mFp69j1jZe20LmvkOff/Bc2rSKyrp+oaxRbHhYXdHfXWibXbidWrQzX/1li1bdEQugXVjvjpO07Meaj8e378QELkBgJNI8MGNVRH0zOL+pQBkLAH84S98c8d1lfhafR3Tre7FZ5GtM3o7zwPgYwHM9hGzD0PEhH4e4UxffDiInl0Q2jTW02re3zKVXpetvhfmoLjzccyBXVMDtqV9HJUZ6mcdfjYp72Ts1pvR3+TUjFIBSQDs3+3rHHr0vdAg/+4GpqduVbE+ft28wVOfJT/lqeJTUrSExPOEEJbjqJ2nEJ8vjPMaf+ZqNn/tSe1xSqnWCMKJigGuY3U7GrS0sYUV6Eu1VTnPUitKcp/ZONhp2XYVJ2hr1XVxMpS6WErKynNeqO2tLXg9qZ7tqjWblqk5Kja3tOQfpTxkowKsnQa5W12wMTPr/lKtv33j4QeX+3gY2y4MdljDUWClwvnNFJQHISCEVOw8Xxh160HRwzVjuu9MXNBvt6OuYJBWw2mKVXTTiqsFivkbrqxXt7aXxE8L2HliSdjxPdN8vzyxtO/MLgSL/KrugxBC+3l6SuNHWpU2F1cZhgTbIrWgOTFyy51ZABoBkG2xXj+4uJj1UbW1CVytdRx/vFlYsvtqyaaejoaDP5ruP7xOpVLdTCs7V9+kau1uLzWyNJYE6eoKjWyt9CTaDtC3Nt7amKki74PnsSDA/tvVc/vOmLv5DqxnroNJeJj6xrnzL80tzTThA/t7nj9wirm///tjT9Z7yo/crj65NV1n9tJtHwoa2psqb1y5USQL8nftaWNncnDhgrq3wyDUFwv0F39x/bt8jXYWIUT/yxHuyUP6evgpVv84JbNdfSCcEDal89zj52gjnoAHhfEEB50tE6J7TDM2NUDpq4YcPQnbdvTy868O5tXtBcCsC+82fkRfm4MtJTXQNTZEu4FUERp//ThNULAkLpFjX7ORfjzownrbsxOFLGv2orSxZfhXDyIZhtTyxxSstrptUmyfbmufPSkxGhvjbTx37aXMndkNwQ2E3HjW0HEi71FJlbWuSD7Qz8rP29nEV8BQj1YNV/g8v4FEBLvpb/w2nZx71TqbYUiNFaX+W+YGbr2eXtKe8KB0zsvyprKONlUfA2dHU16gY3HjcGLtkxvJ+2lL3Zn5gxxGZT2vaDmb03y1OOORidjA0EHP0c62pbJK586+A5oXBUXDaorysqYOdI5sbGyRRs58ezvDMqq8nBrtyH4uw53sje38YmftKRMwPMfxZN06MOEAOzW5iM9eBzaXIW2PGzRnDj8s+3GIo6Svm6XEs66swSYy2tvA6lreoWRKSf9pSzMdhQL37tZmPgIBg3qeJh68XZwNmTmbklLE4026VqQxfK6sj141L8SlPyEEu/z9hYQAywJtgy/MD9HcWTmAHpjYs03GQsF0UqVEb7AgxQAinYDjJsApACGXlgSnn5/jX20PDO6yPaY7x/bMzPl0MHUXM9N/BnVZ02Ewdn4PNj2/gIH92L2z+/442t1yesFuRcWmWM/EL+MCDi2K8FstNnWLFxm7rABjOVaoZ9ujq6xL8OUo19TcjeEdQTr4btGioWKAYJ6fxerqPWPpLF+r3Z3n5b8nj3eyrGQiMASTHHUOpr8fTh+tHUCPzw7Yj84jDVGCQsEaAsZHFoe/v3d670V/VFf+l+clr8u4proZ9f1+gu8Kly6K6OsJdBXnsLsUbgsvLQ3af3JhaNlPKyLog/VRNFM5gA63k44EQ0AIwViZuaLi69F0ub/1UwBEqZQLuo4VfialDQIscr8eT98JdjqevW1E03shjrfurI+mSR8O/wgA2DeydyVVMoaA0zfjPavoqZH006FONQDMu7hy5ntGez9++dkwemttdGPKB4MLLywNuX1+ScD6WEux05tcOEWnUKzW9rFe8s1Y2XIAZn+GFRDyN5T+JKVc8Fvq/q8osIT80rKkkykp+m5ywN6KTQPpiYke9OSsXrfOzQ/9ctvQ7t8MlmACAOza5S8EoHdthTz3wvw+FQAcf8WUVChYmUwmglwpCNAXuT/+LFo739MiJ/vLuI53/Oxoyop+3M1PYj7w9/cXTpkil0AuFyhkMhEFiNxc952cTQPppnAbddYnEZrJ3c2SALBddY1GC1yNPtsR43n90rLQ04nTvCsfrfClmRv6FwZKRTKW+eVZft9L6fe9v/4EkfpnQ6EAmyT/BfJKUMhEhCEY52oxt3bPJDrdzaIYQP/fLUoXkXqQVDzj5cYYOsnFOBOE/I5SqwQYpVLJGACuz76IpXPdzJoyNo/glnnbqO+u7E+vKwevB/mFFf9wtr8QhGBjtNvN3C1DNU5Ax7V3wujhSb2aAJi8prz+ZojsgOmPt46iR+aElgCwp5QyXRpIlHK5IEn+f9cG5b/aE0vvxoq+zy8vCL0GoBsrYECpknm9Wq/ppIQh6A4MfbA2WvXliJ6P5YDgtzTX16zxjdFun7zaPYqLNJB05Hw5ll/Yw47uGubBPd4cUyMEfMGQ1z0GYQhMTf2gn3ZztGu7B4O8F5/H8uv62NcC0O/SwM6Ob1TJUKVcIBB01l8vD7JfXvPNcLrM13IV/t1c/9eE410zwqfc3zi8OnfzUNpPCk8Qgtn+EP5xCXECCwDJ66ISL68c1AGA6eLMkdfUUUKAxX1sBhbuGE3fDbSlzoAq/5sJ/NJQpwY3oOPJJ1H05JKwB0ZADACDfnrM8oNvyaqLtwymQXrM6YX+dvuq9oynw80ka/+kZ0Jn1WlnzwRcWBSQVLVvjPr4ssHXRvZwtujqBUH+1X1jCLN+Pe8KGPj3dv7yWVZJBiuVInqQjxsoJRHOij+sJUle9xUBQJ6X1qU62uiJ+0gEwTzPQ/G6FnsdpZSi2wB/p3MPHhW3fZ9admbqgG5CqZijIwa561tY6p/7ePet5H4+VgEjPM0TvxnpUf3dqrAtlsYS40370rfcb+Wn9g9x0S+uamk9W9OxkTAEcYl/XNfCRtzU+ltb60r09L2vXH2hsjYgA5SLgmcQAkqT/sVtTwCA59cyIqCjsqo5w72XS6+XpTUvm1rbMigFFImJfzjprhYl9MylZ/fE0CLUxXA2KCCTy4kCIIRhqASwtjPT08krazhfIxK9M31yKDdvyQmNRAtmV/yIgkuFTQ9rqlt4dzfTSg3DnDqTlPf2oO3pvl89qVkhAXzEnGZUQVH1U7kcPM/xf1YsQDntGiatvLyjsrz+qIu7lVQsFSD17ouazjOP5H/DFu5Scw/AdO/cPuMCu84V/rKzpLzTsy8LdNpZvnscP8JEtOuNliVMV2xgkfJuKPdg3YAZEsD+wrJwmr5tDJe1aTg33du6QSZmc3I3RdHvJv5Sqd9pDykDQC9xoTz/8soh6i7HQP6Jcuya7BupjOo+9P/1RmR/16OP0iQBACStG3783oaR1BwYTZhfehaAEBgAgckr+tALi4MX6urCOoxFXsWhGdr1fZ2pD0ADpcKOJx9H0c1RLjtpgoLdO8VRogSY100nVoS5Hm08NIuGi7CSML+h3v5Fg403u2f+W5uPUYAkKBSsspM1Qv8qtiSkv3akreEYKz0u8vKNJ3uqgRPHjo5mE/FLlQMPCO2tTVDV2NG3rQ3lDRSb62saCWuoc6FDyExoadGsMDaTQldf14LEJXJTowM18QC/Li6REkJwL6Po48qq8qoJ0V7zKU9t198g2r96PkIITVAo2E4vTf9zW+QBwLYpYZPuro3ks5Ryfkmo05zOmKtTQ7o0QXTu3cHXkpeGaDI+GtpyaGHfQBvANGdLLH38xYi3AOD6uqGn7iwP4W6ti+5YOcwn9s37M4QABDg5yeVJ8Zah9OCSiCfW1ta6/7StCf5TO1gq5ss66fXRfv6qpjZS38yR0EDHAQBoeLj8zUs1BvoiS4FILDA0NNBTaTizV0ATBx7FJQ22loCeUFe/v9jIgLGQMmJrQ7EAALKqqogSYHhKMdjWwNXBycE75VoO+vS0cZ8d5SMhhPzLlYv9l97dKRwpKSnUhPC1jo5mci1DHl+9l//uvaLG2n0pRUgBKBDPpKSAaoor77l7WBnfzyz+cu4PacdNAZdZw3ouvHw7X+9CXu1+Ul6VYWCk6/7gSUXi28cz91BA07+oiKZ08fomv/1+S6CjkVjWy8HuWX751wu+SblAlUqG9E/5n9wE9P9wsQiBrq6u1dPPR9KzS8OW/RdtvBj/2zqZK5VKhmEI18UAZf6slJgmKNhd/p0QfFtbm0ZHzFBOy5lTCiQoZSKWIa9Tvj8UaUKCgiWEqH5unvG/bJB/2DpZAADXN47dkBE/mKZ+Pk6dsHma7PVC/Hf9zv/EXvr/yBa9bumpJ5VE308vhbq1XehhIzUHAC+vbPLf9Tv/a8drsGJhsMvCOxuGqU4v7nfKGtD9o8Y+/wnj/wGjjGk+anuJLgAAAABJRU5ErkJggg=="
-
 
 def get_login_token() -> str:
     with open('/snowflake/session/token', 'r') as f:
@@ -296,35 +588,74 @@ def create_snowflake_session() -> Session:
             'warehouse': os.getenv('SNOWFLAKE_WAREHOUSE', 'FLUX_WH'),
             'database': os.getenv('SNOWFLAKE_DATABASE', 'FLUX_DB'),
             'schema': os.getenv('SNOWFLAKE_SCHEMA', 'PRODUCTION'),
+            # The session is shared for the life of the process; keep it from
+            # idling out so requests don't pay a fresh OAuth login
+            'client_session_keep_alive': True,
+            'client_prefetch_threads': 4,
+            'network_timeout': 30,
+            # Server-side '?' binding, so executemany() sends one array-bound INSERT
+            'paramstyle': 'qmark',
         }
         conn = snowflake.connector.connect(**creds)
         return Session.builder.configs({"connection": conn}).create()
     raise RuntimeError("SPCS token not found")
 
 
+# get_valid_session() only probes the connection with SELECT 1 when the SPCS
+# token file has been rotated or the last probe is older than this; otherwise
+# the cached session is returned without a round-trip
+SESSION_CHECK_INTERVAL_SECONDS = 300
+_session_checked_at = float('-inf')  # time.monotonic() of the last successful probe
+_token_mtime = None        # token file mtime seen at that probe
+
+
+def _get_token_mtime() -> Optional[float]:
+    try:
+        return os.stat('/snowflake/session/token').st_mtime
+    except OSError:
+        return None
+
+
+def _is_token_expired_error(e: Exception) -> bool:
+    """390114 is Snowflake's authentication-token-expired error code"""
+    error_str = str(e)
+    return '390114' in error_str or 'token' in error_str.lower() and 'expired' in error_str.lower()
+
+
+def _mark_session_suspect():
+    """Force the next get_valid_session() call to probe the connection"""
+    global _session_checked_at
+    _session_checked_at = float('-inf')
+
+
 def get_valid_session() -> Optional[Session]:
     """
     Get a valid Snowflake session, refreshing the token if expired.
     SPCS automatically refreshes the token file at /snowflake/session/token,
     so we just need to reconnect when we detect an expired token.
     """
-    global snowflake_session
+    global snowflake_session, _session_checked_at, _token_mtime
     
     if snowflake_session is None:
         try:
             snowflake_session = create_snowflake_session()
+            _session_checked_at, _token_mtime = time.monotonic(), _get_token_mtime()
         except Exception as e:
             logger.error(f"Failed to create Snowflake session: {e}")
             return None
     
+    # Fast path: token unchanged and recently probed - a local stat() only
+    token_mtime = _get_token_mtime()
+    if token_mtime == _token_mtime and time.monotonic() - _session_checked_at < SESSION_CHECK_INTERVAL_SECONDS:
+        return snowflake_session
+    
     # Test the session with a simple query to detect token expiration
     try:
         snowflake_session.sql("SELECT 1").collect()
+        _session_checked_at, _token_mtime = time.monotonic(), token_mtime
         return snowflake_session
     except Exception as e:
-        error_str = str(e)
-        # Check for token expiration errors (390114 is the token expired error code)
-        if '390114' in error_str or 'token' in error_str.lower() and 'expired' in error_str.lower():
+        if _is_token_expired_error(e):
             logger.warning("Snowflake token expired, refreshing session...")
             try:
                 if snowflake_session:
@@ -333,6 +664,7 @@ def get_valid_session() -> Optional[Session]:
                     except:
                         pass
                 snowflake_session = create_snowflake_session()
+                _session_checked_at, _token_mtime = time.monotonic(), _get_token_mtime()
                 logger.info("Snowflake session refreshed successfully")
                 return snowflake_session
             except Exception as refresh_error:
@@ -343,58 +675,740 @@ def get_valid_session() -> Optional[Session]:
             raise
 
 
-def generate_ami_reading(meter_info: dict, service_area: str, emission_pattern: str) -> dict:
-    """Generate a single realistic AMI reading"""
-    hour = datetime.now().hour
+# Shared generator for reading synthesis; numpy Generators serialize concurrent
+# calls internally, so worker threads can draw from it safely
+_reading_rng = np.random.default_rng()
+
+# Usage multiplier by customer segment (anything else counts as residential)
+SEGMENT_USAGE_MULTIPLIERS = {'INDUSTRIAL': 15, 'COMMERCIAL': 5}
+
+
+class MeterFleet:
+    """
+    Columnar meter fleet used by the streaming workers: one numpy array per
+    attribute instead of a list of per-meter dicts. Segments are stored as
+    int8 codes into segment_labels, with the usage multiplier precomputed per
+    code, so a batch is a single index array gathered from each column.
+    """
+    __slots__ = ('meter_ids', 'transformer_ids', 'circuit_ids', 'substation_ids',
+                 'segment_code', 'segment_labels', 'segment_multiplier',
+                 'latitude', 'longitude', 'coords_complete', 'production_matched', '_meter_records')
+    
+    def __init__(self, meter_ids, transformer_ids, circuit_ids, substation_ids,
+                 segments, latitude, longitude, production_matched: bool):
+        self.meter_ids = np.asarray(meter_ids, dtype=object)
+        self.transformer_ids = np.asarray(transformer_ids, dtype=object)
+        self.circuit_ids = np.asarray(circuit_ids, dtype=object)
+        self.substation_ids = np.asarray(substation_ids, dtype=object)
+        labels, codes = np.unique(np.asarray(segments, dtype=object).astype(str), return_inverse=True)
+        self.segment_labels = labels
+        self.segment_code = codes.astype(np.int8)
+        self.segment_multiplier = np.array([SEGMENT_USAGE_MULTIPLIERS.get(seg, 1) for seg in labels], dtype=np.float64)
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.coords_complete = not (np.isnan(self.latitude).any() or np.isnan(self.longitude).any())
+        self.production_matched = production_matched
+        self._meter_records = {}
+    
+    def __len__(self) -> int:
+        return len(self.meter_ids)
+    
+    @classmethod
+    def from_rows(cls, rows: list) -> 'MeterFleet':
+        """Build from production query rows (METER_ID, ..., LATITUDE, LONGITUDE)"""
+        def coord(v):
+            return float(v) if v else np.nan
+        return cls(
+            [row['METER_ID'] for row in rows],
+            [row['TRANSFORMER_ID'] for row in rows],
+            [row['CIRCUIT_ID'] for row in rows],
+            [row['SUBSTATION_ID'] for row in rows],
+            [row['CUSTOMER_SEGMENT'] for row in rows],
+            [coord(row['LATITUDE']) for row in rows],
+            [coord(row['LONGITUDE']) for row in rows],
+            production_matched=True,
+        )
+    
+    @classmethod
+    def synthetic(cls, count: int, service_area: str) -> 'MeterFleet':
+        """Synthetic fleet: 80% residential, 10% commercial, 10% industrial around Houston"""
+        prefix = service_area[:3]
+        i = np.arange(count)
+        segments = np.where(i % 10 == 1, 'INDUSTRIAL', np.where(i % 10 == 0, 'COMMERCIAL', 'RESIDENTIAL'))
+        
+        def grouped_ids(template: str, group: int) -> np.ndarray:
+            # One string per transformer/circuit/substation, shared by its meters
+            ids = np.array([template.format(n) for n in range(-(-count // group))], dtype=object)
+            return np.repeat(ids, group)[:count]
+        
+        return cls(
+            [f'MTR-{prefix}-{n:06d}' for n in range(count)],
+            grouped_ids(f'XFMR-{prefix}-{{:05d}}', 10),
+            grouped_ids(f'CIRCUIT-{prefix}-{{:04d}}', 100),
+            grouped_ids(f'SUB-{prefix}-{{:03d}}', 1000),
+            segments,
+            29.7604 + _reading_rng.uniform(-0.5, 0.5, count),
+            -95.3698 + _reading_rng.uniform(-0.5, 0.5, count),
+            production_matched=False,
+        )
+    
+    def sample(self, n: int) -> np.ndarray:
+        """Indices of n meters drawn with replacement"""
+        if not len(self):
+            return np.empty(0, dtype=np.intp)
+        return _reading_rng.integers(0, len(self), n)
+    
+    def meter_records(self, service_area: str) -> list:
+        """
+        The 'meter' sub-dict of the raw JSON records, one per meter, built on
+        first use per service area. Records share these dicts, so they must not
+        be mutated.
+        """
+        records = self._meter_records.get(service_area)
+        if records is None:
+            latitude = [None if v != v else v for v in self.latitude.tolist()]  # NaN -> null
+            longitude = [None if v != v else v for v in self.longitude.tolist()]
+            records = [
+                {
+                    'meter_id': meter_id,
+                    'transformer_id': transformer_id,
+                    'circuit_id': circuit_id,
+                    'substation_id': substation_id,
+                    'customer_segment': segment,
+                    'service_area': service_area,
+                    'geo': {
+                        'latitude': lat,
+                        'longitude': lon
+                    }
+                }
+                for meter_id, transformer_id, circuit_id, substation_id, segment, lat, lon in zip(
+                    self.meter_ids.tolist(), self.transformer_ids.tolist(), self.circuit_ids.tolist(),
+                    self.substation_ids.tolist(), self.segment_labels[self.segment_code].tolist(),
+                    latitude, longitude)
+            ]
+            self._meter_records[service_area] = records
+        return records
+
+
+def _freeze_fleet(fleet: MeterFleet) -> MeterFleet:
+    """Make a fleet's columns read-only so jobs can safely share it"""
+    for column in (fleet.meter_ids, fleet.transformer_ids, fleet.circuit_ids, fleet.substation_ids,
+                   fleet.segment_code, fleet.segment_labels, fleet.segment_multiplier,
+                   fleet.latitude, fleet.longitude):
+        column.flags.writeable = False
+    return fleet
+
+
+@functools.lru_cache(maxsize=32)
+def _synthetic_fleet(count: int, service_area: str) -> MeterFleet:
+    """Shared synthetic fleet per (count, service_area); workers only read fleets, so jobs can share one"""
+    return _freeze_fleet(MeterFleet.synthetic(count, service_area))
+
+
+# Production fleets are cached per (table, meters) so starting or restarting a
+# job doesn't re-sample the production table (and resume its warehouse) every time.
+# Entries are (fleet, loaded_at) with loaded_at from time.monotonic(), kept in
+# least-recently-used order. `meters` comes from the job request, so the cache
+# is bounded and expired fleets are dropped rather than held for the process life.
+PRODUCTION_FLEET_TTL_SECONDS = 3600
+PRODUCTION_FLEET_CACHE_MAX = 8
+_production_fleets = {}
+_production_fleets_lock = threading.Lock()
+
+
+def _cached_production_fleet(key: tuple):
+    """Return the cached fleet for key if still fresh, marking it most recently used"""
+    with _production_fleets_lock:
+        cached = _production_fleets.pop(key, None)
+        if cached is None or time.monotonic() - cached[1] >= PRODUCTION_FLEET_TTL_SECONDS:
+            return None
+        _production_fleets[key] = cached
+        return cached[0]
+
+
+def _store_production_fleet(key: tuple, fleet: MeterFleet):
+    """Cache a fleet, dropping expired entries and the least recently used beyond PRODUCTION_FLEET_CACHE_MAX"""
+    now = time.monotonic()
+    with _production_fleets_lock:
+        for stale in [k for k, (_, loaded_at) in _production_fleets.items()
+                      if now - loaded_at >= PRODUCTION_FLEET_TTL_SECONDS]:
+            del _production_fleets[stale]
+        _production_fleets.pop(key, None)
+        _production_fleets[key] = (fleet, now)
+        while len(_production_fleets) > PRODUCTION_FLEET_CACHE_MAX:
+            del _production_fleets[next(iter(_production_fleets))]
+
+
+def sampled_source(table: str, rows: int, where: str = '', alias: str = '') -> str:
+    """
+    FROM-clause source yielding `rows` random rows of table (after the optional
+    WHERE filter). SAMPLE (n ROWS) picks rows without the full-table sort that
+    ORDER BY RANDOM() LIMIT n needs.
+    """
+    source = f"(SELECT * FROM {table} {where})" if where else table
+    return f"{source} {alias} SAMPLE ({rows} ROWS)" if alias else f"{source} SAMPLE ({rows} ROWS)"
+
+
+def load_meter_fleet(production_source: str, meters: int, service_area: str, purpose: str = 'streaming') -> MeterFleet:
+    """Load the meter fleet for a streaming job from production, or fall back to synthetic"""
+    try:
+        src_cfg = PRODUCTION_DATA_SOURCES.get(production_source)
+        if production_source != 'SYNTHETIC' and src_cfg:
+            key = (src_cfg.table, meters)
+            cached = _cached_production_fleet(key)
+            if cached is not None:
+                logger.info(f"Reusing {len(cached)} cached production meters for {purpose}")
+                return cached
+        session = get_valid_session()
+        if session and production_source != 'SYNTHETIC' and src_cfg:
+            result = session.sql(f"""
+                SELECT 
+                    {src_cfg.meter_col} as meter_id,
+                    {src_cfg.transformer_col or 'NULL'} as transformer_id,
+                    {src_cfg.circuit_col or 'NULL'} as circuit_id,
+                    {src_cfg.substation_col or 'NULL'} as substation_id,
+                    COALESCE({src_cfg.segment_col or "'RESIDENTIAL'"}, 'RESIDENTIAL') as customer_segment,
+                    {src_cfg.lat_col or 'NULL'} as latitude,
+                    {src_cfg.lon_col or 'NULL'} as longitude
+                FROM {sampled_source(src_cfg.table, meters)}
+            """).collect()
+            if result:
+                logger.info(f"Loaded {len(result)} production meters for {purpose}")
+                fleet = _freeze_fleet(MeterFleet.from_rows(result))
+                _store_production_fleet(key, fleet)
+                return fleet
+    except Exception as e:
+        logger.error(f"Failed to load production meters for {purpose}: {e}")
+    
+    logger.info(f"Using {meters} synthetic meters for {purpose}")
+    return _synthetic_fleet(meters, service_area)
+
+
+def _uniform_ranges(usage_low: float, usage_high: float) -> tuple:
+    """(lows, spans) column vectors for base usage, voltage, power factor, temperature"""
+    lows = np.array([usage_low, 118.0, 0.92, 15.0])
+    highs = np.array([usage_high, 122.0, 0.99, 35.0])
+    return lows[:, None], (highs - lows)[:, None]
+
+
+# Per time-of-day band, built once
+_USAGE_RANGES = {
+    'peak': _uniform_ranges(1.5, 3.5),
+    'morning': _uniform_ranges(1.0, 2.5),
+    'off_peak': _uniform_ranges(0.3, 1.5),
+}
+
+
+def generate_ami_columns(fleet: MeterFleet, idx: np.ndarray) -> tuple:
+    """
+    Generate one realistic AMI reading for each fleet index in idx, column-wise.
+    Meter attributes are gathered with idx and all random draws for the batch
+    happen in a few vectorised numpy calls. Returns (reading_timestamp, columns),
+    where columns maps each per-reading column name to a list of values; the
+    batch shares the single reading timestamp.
+    """
+    n = len(idx)
+    now = datetime.now()
+    hour = now.hour
     
     # Time-of-day usage multiplier
     if 14 <= hour <= 19:  # Peak hours
-        base_usage = random.uniform(1.5, 3.5)
+        usage_range = _USAGE_RANGES['peak']
     elif 6 <= hour <= 9:  # Morning peak
-        base_usage = random.uniform(1.0, 2.5)
+        usage_range = _USAGE_RANGES['morning']
     else:  # Off-peak
-        base_usage = random.uniform(0.3, 1.5)
+        usage_range = _USAGE_RANGES['off_peak']
+    
+    # Base usage, voltage, power factor and temperature come from one (4, n)
+    # draw scaled in place, rather than four uniform() calls and their temporaries
+    draws = _reading_rng.random((4, n))
+    draws *= usage_range[1]
+    draws += usage_range[0]
+    base_usage, voltage, power_factor, temperature_c = draws
     
     # Segment multiplier
-    segment = meter_info.get('customer_segment', 'RESIDENTIAL')
-    if segment == 'INDUSTRIAL':
-        usage_multiplier = 15
-    elif segment == 'COMMERCIAL':
-        usage_multiplier = 5
-    else:
-        usage_multiplier = 1
-    
-    # Data quality
-    quality_roll = random.randint(1, 100)
-    if quality_roll <= 1:
-        data_quality = 'OUTAGE'
-        is_outage = True
-    elif quality_roll >= 98:
-        data_quality = 'ANOMALY'
-        is_outage = False
+    codes = fleet.segment_code[idx]
+    
+    # Data quality: 1% outage, 3% anomaly
+    quality_roll = _reading_rng.integers(1, 101, n)
+    
+    latitude = fleet.latitude[idx].tolist()
+    longitude = fleet.longitude[idx].tolist()
+    if not fleet.coords_complete:
+        latitude = [None if v != v else v for v in latitude]  # NaN -> NULL
+        longitude = [None if v != v else v for v in longitude]
+    
+    return now, {
+        'METER_ID': fleet.meter_ids[idx].tolist(),
+        'TRANSFORMER_ID': fleet.transformer_ids[idx].tolist(),
+        'CIRCUIT_ID': fleet.circuit_ids[idx].tolist(),
+        'SUBSTATION_ID': fleet.substation_ids[idx].tolist(),
+        'USAGE_KWH': np.round(base_usage * fleet.segment_multiplier[codes], 4).tolist(),
+        'VOLTAGE': np.round(voltage, 2).tolist(),
+        'POWER_FACTOR': np.round(power_factor, 3).tolist(),
+        'TEMPERATURE_C': np.round(temperature_c, 1).tolist(),
+        'CUSTOMER_SEGMENT': fleet.segment_labels[codes].tolist(),
+        'LATITUDE': latitude,
+        'LONGITUDE': longitude,
+        'IS_OUTAGE': (quality_roll <= 1).tolist(),
+        'DATA_QUALITY': np.where(quality_roll <= 1, 'OUTAGE', np.where(quality_roll >= 98, 'ANOMALY', 'VALID')).tolist(),
+    }
+
+
+# Keys of the reading dicts from generate_ami_readings(), in insert order
+AMI_READING_COLUMNS = (
+    'METER_ID', 'TRANSFORMER_ID', 'CIRCUIT_ID', 'SUBSTATION_ID', 'READING_TIMESTAMP',
+    'USAGE_KWH', 'VOLTAGE', 'POWER_FACTOR', 'TEMPERATURE_C', 'SERVICE_AREA',
+    'CUSTOMER_SEGMENT', 'LATITUDE', 'LONGITUDE', 'IS_OUTAGE', 'DATA_QUALITY',
+    'PRODUCTION_MATCHED', 'EMISSION_PATTERN',
+)
+
+
+def generate_ami_readings(fleet: MeterFleet, idx: np.ndarray, service_area: str, emission_pattern: str) -> list:
+    """Generate one AMI reading dict (table column -> value) for each fleet index in idx"""
+    now, cols = generate_ami_columns(fleet, idx)
+    production_matched = fleet.production_matched
+    return [
+        {
+            'METER_ID': meter_id,
+            'TRANSFORMER_ID': transformer_id,
+            'CIRCUIT_ID': circuit_id,
+            'SUBSTATION_ID': substation_id,
+            'READING_TIMESTAMP': now,
+            'USAGE_KWH': usage_kwh,
+            'VOLTAGE': voltage,
+            'POWER_FACTOR': power_factor,
+            'TEMPERATURE_C': temperature_c,
+            'SERVICE_AREA': service_area,
+            'CUSTOMER_SEGMENT': segment,
+            'LATITUDE': latitude,
+            'LONGITUDE': longitude,
+            'IS_OUTAGE': is_outage,
+            'DATA_QUALITY': data_quality,
+            'PRODUCTION_MATCHED': production_matched,
+            'EMISSION_PATTERN': emission_pattern,
+        }
+        for (meter_id, transformer_id, circuit_id, substation_id, usage_kwh, voltage, power_factor,
+             temperature_c, segment, latitude, longitude, is_outage, data_quality) in zip(*cols.values())
+    ]
+
+
+def generate_raw_ami_records(fleet: MeterFleet, idx: np.ndarray, service_area: str, emission_pattern: str,
+                             batch_id: str, batch_timestamp: datetime) -> list:
+    """
+    Nested raw AMI JSON records (as a head-end system would emit them) for each
+    fleet index in idx, built straight from generate_ami_columns(). The header
+    and metadata sub-dicts are batch constants and the meter sub-dicts come
+    prebuilt from the fleet, so only the reading and quality parts are new.
+    """
+    reading_time, cols = generate_ami_columns(fleet, idx)
+    meters = fleet.meter_records(service_area)
+    production_matched = fleet.production_matched
+    header = {
+        'source_system': 'AMI_HEAD_END',
+        'message_type': 'METER_READING',
+        'batch_id': batch_id,
+        'emission_timestamp': batch_timestamp,
+        'version': '2.0'
+    }
+    # The batch is serialized in one go, so its records share one ingestion
+    # timestamp. Timestamps stay datetimes; orjson writes them as ISO 8601
+    metadata = {
+        'emission_pattern': emission_pattern,
+        'ingestion_timestamp': datetime.now()
+    }
+    return [
+        {
+            'header': header,
+            'meter': meters[i],
+            'reading': {
+                'timestamp': reading_time,
+                'usage_kwh': usage_kwh,
+                'voltage': voltage,
+                'power_factor': power_factor,
+                'temperature_c': temperature_c
+            },
+            'quality': {
+                'data_quality': data_quality,
+                'is_outage': is_outage,
+                'production_matched': production_matched
+            },
+            'metadata': metadata
+        }
+        for i, usage_kwh, voltage, power_factor, temperature_c, is_outage, data_quality in zip(
+            idx.tolist(), cols['USAGE_KWH'], cols['VOLTAGE'], cols['POWER_FACTOR'], cols['TEMPERATURE_C'],
+            cols['IS_OUTAGE'], cols['DATA_QUALITY'])
+    ]
+
+
+def write_ami_parquet(sink, reading_time: datetime, cols: dict, constants: dict):
+    """
+    Write a batch from generate_ami_columns() to sink as flat, zstd-compressed
+    Parquet, one lower-case column per reading field plus the reading timestamp
+    and the batch-level constants. pyarrow is imported on first use.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    n = len(cols['METER_ID'])
+    columns = {name.lower(): values for name, values in cols.items()}
+    columns['reading_timestamp'] = pa.repeat(pa.scalar(reading_time, pa.timestamp('us')), n)
+    for name, value in constants.items():
+        columns[name] = pa.repeat(pa.scalar(value), n)
+    pq.write_table(pa.table(columns), sink, compression='zstd', compression_level=1)
+
+
+# Rows per flush - Snowflake's cap for a single VALUES clause, kept as the
+# upper bound for one array-bound INSERT
+MAX_INSERT_ROWS = 16384
+
+# Flushes at least this large go through write_pandas (Parquet PUT + COPY INTO),
+# which beats a bound INSERT once the batch is big enough to amortize the PUT;
+# smaller, latency-bound flushes stay on executemany
+WRITE_PANDAS_MIN_ROWS = 5000
+
+
+class MicroBatcher:
+    """
+    Buffers generated rows and decides when to flush them, the way the Snowpipe
+    Streaming SDK does: a batch goes out once it reaches the size limit or once
+    its oldest row has waited max_lag seconds, whichever comes first.
+    
+    max_lag adapts to insert latency fed back through record_flush(): it shrinks
+    while inserts run slow so buffered rows don't queue behind them, and grows
+    back towards the configured lag once inserts are fast again.
+    """
+    __slots__ = ('rows', 'bytes', 'deadline', 'opened_at', 'max_bytes', 'max_rows', 'max_lag',
+                 'row_bytes', 'target_lag', 'lag_floor', 'insert_latency')
+    
+    def __init__(self, max_bytes: Optional[int] = None, max_lag: Optional[float] = None,
+                 max_rows: int = MAX_INSERT_ROWS, row_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes or SNOWPIPE_SDK_LIMITS['optimal_batch_size_mb']['max'] * 1024 * 1024
+        self.max_lag = max_lag if max_lag is not None else SNOWPIPE_SDK_LIMITS['max_client_lag_seconds']['default']
+        self.max_rows = max_rows
+        self.row_bytes = row_bytes or SNOWPIPE_SDK_LIMITS['row_size_estimate_bytes']
+        self.target_lag = self.max_lag
+        self.lag_floor = min(0.2, self.max_lag)
+        self.insert_latency = None  # EWMA, seconds
+        self.rows = []
+        self.bytes = 0
+        self.deadline = None
+        self.opened_at = None
+    
+    def add(self, rows: list):
+        if not self.rows:
+            self.opened_at = time.monotonic()
+            self.deadline = self.opened_at + self.max_lag
+        self.rows.extend(rows)
+        self.bytes += len(rows) * self.row_bytes
+    
+    def should_flush(self) -> bool:
+        if not self.rows:
+            return False
+        return (self.bytes >= self.max_bytes
+                or len(self.rows) >= self.max_rows
+                or time.monotonic() >= self.deadline)
+    
+    def age(self) -> float:
+        """Seconds the oldest buffered row has been waiting"""
+        return time.monotonic() - self.opened_at if self.rows else 0.0
+    
+    def drain(self) -> list:
+        """Take up to max_rows buffered rows; any remainder starts a fresh lag window"""
+        batch, self.rows = self.rows[:self.max_rows], self.rows[self.max_rows:]
+        self.bytes = len(self.rows) * self.row_bytes
+        self.opened_at = time.monotonic() if self.rows else None
+        self.deadline = self.opened_at + self.max_lag if self.rows else None
+        return batch
+    
+    def record_flush(self, latency: float, alpha: float = 0.2):
+        """Feed back how long a flush took and resize the lag window"""
+        if self.insert_latency is None:
+            self.insert_latency = latency
+        else:
+            self.insert_latency = alpha * latency + (1 - alpha) * self.insert_latency
+        if self.insert_latency > 2 * self.target_lag:
+            self.max_lag = max(self.max_lag * 0.7, self.lag_floor)
+        elif self.insert_latency < 0.5 * self.target_lag:
+            self.max_lag = min(self.max_lag * 1.3, self.target_lag)
+
+
+@functools.lru_cache(maxsize=64)
+def _insert_sql(target_table: str, columns: tuple = AMI_READING_COLUMNS) -> str:
+    """Parameterized INSERT for a table/column list, built once per pair"""
+    return f"INSERT INTO {target_table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+# Pulls a reading dict's values out in AMI_READING_COLUMNS order, as one tuple
+_reading_values = operator.itemgetter(*AMI_READING_COLUMNS)
+
+
+def insert_streaming_rows(session: Session, target_table: str, rows: list):
+    """
+    Insert generated reading dicts into target_table. Values are bound
+    server-side as one array instead of being escaped into SQL text; large
+    batches go through write_pandas instead.
+    """
+    if len(rows) >= WRITE_PANDAS_MIN_ROWS:
+        *namespace, table_name = target_table.split('.')
+        write_pandas(
+            session.connection,
+            pd.DataFrame.from_records(rows, columns=AMI_READING_COLUMNS),
+            table_name,
+            database=namespace[-2] if len(namespace) > 1 else None,
+            schema=namespace[-1] if namespace else None,
+            quote_identifiers=False,
+            use_logical_type=True,
+        )
     else:
-        data_quality = 'VALID'
-        is_outage = False
+        with session.connection.cursor() as cur:
+            cur.executemany(_insert_sql(target_table), list(map(_reading_values, rows)))
+
+
+class GroupCommitWriter:
+    """
+    Coalesces concurrent writes to one table (group commit). Each caller queues
+    its rows and waits its turn on the flush lock; whoever gets the lock takes
+    everything queued so far - including rows from jobs that arrived while the
+    previous insert was running - and inserts it in one call. Callers return
+    once their rows are committed, or re-raise the insert's error.
+    """
+    __slots__ = ('_lock', '_flush_lock', '_pending')
+    
+    def __init__(self):
+        self._lock = threading.Lock()        # guards _pending
+        self._flush_lock = threading.Lock()  # one insert in flight per table
+        self._pending = []
+    
+    def write(self, rows: list, insert_fn):
+        entry = {'rows': rows, 'done': False, 'error': None}
+        with self._lock:
+            self._pending.append(entry)
+        with self._flush_lock:
+            if not entry['done']:
+                with self._lock:
+                    group, self._pending = self._pending, []
+                try:
+                    insert_fn(rows if len(group) == 1 else [row for waiter in group for row in waiter['rows']])
+                except Exception as e:
+                    for waiter in group:
+                        waiter['error'] = e
+                finally:
+                    for waiter in group:
+                        waiter['done'] = True
+        if entry['error'] is not None:
+            raise entry['error']
+
+
+_table_writers = {}  # target table -> GroupCommitWriter
+_table_writers_lock = threading.Lock()
+
+
+def _table_writer(target_table: str) -> GroupCommitWriter:
+    writer = _table_writers.get(target_table)
+    if writer is None:
+        with _table_writers_lock:
+            writer = _table_writers.setdefault(target_table, GroupCommitWriter())
+    return writer
+
+
+class BatchPacer:
+    """
+    Paces a worker loop against a fixed monotonic schedule rather than sleeping
+    a full interval after each batch, so time spent generating and writing is
+    absorbed into the interval instead of lowering the effective rate. A worker
+    that falls more than max_catchup intervals behind resets the schedule
+    rather than bursting to make up the backlog. Waits end early once
+    stop_event is set.
+    """
+    __slots__ = ('interval', 'max_catchup', 'next_tick', 'stop_event')
     
-    return {
-        'METER_ID': meter_info.get('meter_id', f'MTR-{uuid.uuid4().hex[:8].upper()}'),
-        'TRANSFORMER_ID': meter_info.get('transformer_id'),
-        'CIRCUIT_ID': meter_info.get('circuit_id'),
-        'SUBSTATION_ID': meter_info.get('substation_id'),
-        'READING_TIMESTAMP': datetime.now(),
-        'USAGE_KWH': round(base_usage * usage_multiplier, 4),
-        'VOLTAGE': round(random.uniform(118, 122), 2),
-        'POWER_FACTOR': round(random.uniform(0.92, 0.99), 3),
-        'TEMPERATURE_C': round(random.uniform(15, 35), 1),
-        'SERVICE_AREA': service_area,
-        'CUSTOMER_SEGMENT': segment,
-        'LATITUDE': meter_info.get('latitude'),
-        'LONGITUDE': meter_info.get('longitude'),
-        'IS_OUTAGE': is_outage,
-        'DATA_QUALITY': data_quality,
-        'PRODUCTION_MATCHED': meter_info.get('production_matched', False),
-        'EMISSION_PATTERN': emission_pattern,
-    }
+    def __init__(self, interval: float, max_catchup: int = 3, stop_event: threading.Event = None):
+        self.interval = interval
+        self.max_catchup = max_catchup
+        self.next_tick = time.monotonic()
+        self.stop_event = stop_event or threading.Event()
+    
+    def sleep(self, seconds: float):
+        """Sleep for seconds, or until stop_event is set"""
+        self.stop_event.wait(seconds)
+    
+    def reset(self):
+        """Restart the schedule from now, e.g. after an error back-off"""
+        self.next_tick = time.monotonic()
+    
+    def wait(self) -> float:
+        """
+        Sleep until the next tick. Returns 0.0, or the seconds the loop was
+        behind schedule if that exceeded the catch-up limit and the schedule
+        was reset.
+        """
+        self.next_tick += self.interval
+        now = time.monotonic()
+        delay = self.next_tick - now
+        if delay >= 0:
+            self.sleep(delay)
+        elif -delay > self.max_catchup * self.interval:
+            self.next_tick = now
+            return -delay
+        return 0.0
+
+
+def extend_ndjson(buf: bytearray, records) -> bytearray:
+    """
+    Append records to buf as newline-terminated JSON lines. Each line is copied
+    in and freed straight away, which is several times faster than joining a
+    list of every serialized line for large batches.
+    """
+    for record in records:
+        buf += orjson.dumps(record)
+        buf += b'\n'
+    return buf
+
+
+# Snowpipe loads 1-16 MB files far more efficiently than a stream of tiny ones
+STAGE_FILE_TARGET_BYTES = 8 * 1024 * 1024
+STAGE_FILE_MAX_AGE_SECONDS = 30
+
+
+class NdjsonFileBuffer:
+    """
+    Coalesces NDJSON batches into one stage file. Batches accumulate
+    until the file reaches target_bytes or its oldest batch has waited max_age
+    seconds, so small, frequent batches still land as reasonably sized files.
+    """
+    __slots__ = ('data', 'rows', 'batches', 'opened_at', 'target_bytes', 'max_age')
+    
+    def __init__(self, target_bytes: int = STAGE_FILE_TARGET_BYTES, max_age: float = STAGE_FILE_MAX_AGE_SECONDS):
+        self.target_bytes = target_bytes
+        self.max_age = max_age
+        self.data = bytearray()
+        self.rows = 0
+        self.batches = 0
+        self.opened_at = None
+    
+    def add(self, records: list):
+        if not self.data:
+            self.opened_at = time.monotonic()
+        extend_ndjson(self.data, records)
+        self.rows += len(records)
+        self.batches += 1
+    
+    def should_flush(self) -> bool:
+        if not self.data:
+            return False
+        return len(self.data) >= self.target_bytes or time.monotonic() - self.opened_at >= self.max_age
+    
+    def drain(self) -> tuple:
+        """Take the buffered file as (ndjson_bytes, rows, batches) and start a new one"""
+        drained = (self.data, self.rows, self.batches)
+        self.data = bytearray()
+        self.rows = 0
+        self.batches = 0
+        self.opened_at = None
+        return drained
+
+
+# S3 uploads run on their own small pool so a worker can generate its next
+# batch while earlier ones are still in flight
+UPLOAD_MAX_IN_FLIGHT = 3
+_upload_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('FLUX_UPLOAD_WORKERS', '8')),
+    thread_name_prefix='flux-upload',
+)
+
+
+class UploadQueue:
+    """
+    A job's in-flight uploads on the shared upload pool. At most max_in_flight
+    are outstanding; results come back to the worker thread in submission
+    order, so job stats keep a single writer.
+    """
+    __slots__ = ('in_flight', 'max_in_flight')
+    
+    def __init__(self, max_in_flight: int = UPLOAD_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.in_flight = deque()
+    
+    def submit(self, context, fn, *args):
+        self.in_flight.append((_upload_executor.submit(fn, *args), context))
+    
+    def run(self, context, fn, *args):
+        """Upload on the calling thread, for when the shared pool may be shut down"""
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        self.in_flight.append((future, context))
+    
+    def completed(self, wait: bool = False):
+        """
+        Yield (context, error) for finished uploads, oldest first. Blocks on the
+        oldest while more than max_in_flight are outstanding, or on all of them
+        when wait is set; error is None for a successful upload.
+        """
+        while self.in_flight:
+            future, context = self.in_flight[0]
+            if not (wait or future.done() or len(self.in_flight) > self.max_in_flight):
+                return
+            self.in_flight.popleft()
+            yield context, future.exception()
+
+
+# Job lifecycle shared by the streaming workers below. Each worker owns its
+# config parsing and how a batch is written; registration, stop checks,
+# failure, pacing and error back-off go through these helpers.
+
+def _mark_job_running(job_id: str, stats: dict):
+    """Publish the worker's stats dict and flip a STARTING job to RUNNING"""
+    with _job_lock(job_id):
+        job = active_streaming_jobs.get(job_id)
+        if job is not None:
+            job['stats'] = stats
+            # A stop requested while the worker was starting up must stick
+            if job['status'] == 'STARTING':
+                job['status'] = 'RUNNING'
+
+
+def _fail_job(job_id: str):
+    """Mark a job FAILED when its worker can't start"""
+    with _job_lock(job_id):
+        job = active_streaming_jobs.get(job_id)
+        if job is not None:
+            job['status'] = 'FAILED'
+            job['stats']['errors'] = job['stats'].get('errors', 0) + 1
+
+
+def _job_should_stop(job_id: str, label: str) -> bool:
+    """True once the job was removed or asked to stop; acknowledges a stop as STOPPED"""
+    with _job_lock(job_id):
+        job = active_streaming_jobs.get(job_id)
+        if job is None:
+            logger.info(f"Job {job_id} removed, stopping {label} worker")
+            return True
+        if job['status'] == 'STOPPING':
+            logger.info(f"Job {job_id} stopping {label}")
+            job['status'] = 'STOPPED'
+            return True
+    return False
+
+
+def _wait_for_next_batch(job_id: str, pacer: BatchPacer):
+    """Sleep until the job's next batch is due, warning if it can't keep up"""
+    behind = pacer.wait()
+    if behind:
+        logger.warning(f"Job {job_id}: {behind:.1f}s behind schedule (one batch every {pacer.interval:g}s)")
+
+
+def _back_off_after_error(job_id: str, stats: dict, pacer: BatchPacer, e: Exception, label: str, delay: float):
+    """Count a failed batch, back off, and restart the job's batch schedule"""
+    logger.error(f"{label} error for job {job_id}: {e}")
+    if _is_token_expired_error(e):
+        _mark_session_suspect()  # next batch re-probes and reconnects
+    stats['errors'] += 1
+    pacer.sleep(delay)
+    pacer.reset()
 
 
 def snowpipe_streaming_worker(job_id: str, config: dict):
@@ -412,7 +1426,11 @@ def snowpipe_streaming_worker(job_id: str, config: dict):
     service_area = config.get('service_area', 'TEXAS_GULF_COAST')
     emission_pattern = config.get('emission_pattern', 'STAGGERED_REALISTIC')
     production_source = config.get('production_source', 'SYNTHETIC')
-    target_table = config.get('target_table', f'{DB}.{SCHEMA_PRODUCTION}.AMI_STREAMING_DATA')
+    target_table = config.get('target_table', get_production_table('AMI_STREAMING_DATA'))
+    lag_limits = SNOWPIPE_SDK_LIMITS['max_client_lag_seconds']
+    max_client_lag = min(max(config.get('max_client_lag', lag_limits['default']), lag_limits['min']), lag_limits['max'])
+    batch_size_mb = min(config.get('batch_size_mb', SNOWPIPE_SDK_LIMITS['optimal_batch_size_mb']['max']),
+                        SNOWPIPE_SDK_LIMITS['max_batch_size_mb'])
     
     # Initialize stats
     stats = {
@@ -423,132 +1441,71 @@ def snowpipe_streaming_worker(job_id: str, config: dict):
         'last_batch_time': None
     }
     
-    with streaming_lock:
-        if job_id in active_streaming_jobs:
-            active_streaming_jobs[job_id]['stats'] = stats
-            active_streaming_jobs[job_id]['status'] = 'RUNNING'
+    _mark_job_running(job_id, stats)
     
     # Load meter fleet from production or generate synthetic
-    meter_fleet = []
-    try:
-        session = get_valid_session()
-        if session and production_source != 'SYNTHETIC':
-            # Load real meter IDs from production table
-            src_cfg = PRODUCTION_DATA_SOURCES.get(production_source)
-            if src_cfg:
-                result = session.sql(f"""
-                    SELECT 
-                        {src_cfg['meter_col']} as meter_id,
-                        {src_cfg.get('transformer_col', 'NULL')} as transformer_id,
-                        {src_cfg.get('circuit_col', 'NULL')} as circuit_id,
-                        {src_cfg.get('substation_col', 'NULL')} as substation_id,
-                        COALESCE({src_cfg.get('segment_col', "'RESIDENTIAL'")}, 'RESIDENTIAL') as customer_segment,
-                        {src_cfg.get('lat_col', 'NULL')} as latitude,
-                        {src_cfg.get('lon_col', 'NULL')} as longitude
-                    FROM {src_cfg['table']}
-                    ORDER BY RANDOM()
-                    LIMIT {meters}
-                """).collect()
-                
-                for row in result:
-                    meter_fleet.append({
-                        'meter_id': row['METER_ID'],
-                        'transformer_id': row['TRANSFORMER_ID'],
-                        'circuit_id': row['CIRCUIT_ID'],
-                        'substation_id': row['SUBSTATION_ID'],
-                        'customer_segment': row['CUSTOMER_SEGMENT'],
-                        'latitude': row['LATITUDE'],
-                        'longitude': row['LONGITUDE'],
-                        'production_matched': True
-                    })
-                logger.info(f"Loaded {len(meter_fleet)} production meters for streaming")
-    except Exception as e:
-        logger.error(f"Failed to load production meters: {e}")
-    
-    # Fallback to synthetic if no production meters loaded
-    if not meter_fleet:
-        logger.info(f"Generating {meters} synthetic meters for streaming")
-        for i in range(meters):
-            segment = 'INDUSTRIAL' if i % 10 == 1 else ('COMMERCIAL' if i % 10 == 0 else 'RESIDENTIAL')
-            meter_fleet.append({
-                'meter_id': f'MTR-{service_area[:3]}-{i:06d}',
-                'transformer_id': f'XFMR-{service_area[:3]}-{i // 10:05d}',
-                'circuit_id': f'CIRCUIT-{service_area[:3]}-{i // 100:04d}',
-                'substation_id': f'SUB-{service_area[:3]}-{i // 1000:03d}',
-                'customer_segment': segment,
-                'latitude': 29.7604 + random.uniform(-0.5, 0.5),
-                'longitude': -95.3698 + random.uniform(-0.5, 0.5),
-                'production_matched': False
-            })
+    meter_fleet = load_meter_fleet(production_source, meters, service_area, 'streaming')
     
     # Calculate timing
     batch_interval = batch_size / max(rows_per_sec, 1)  # seconds between batches
     
+    # Rows are generated every batch_interval but only inserted once the batch
+    # reaches batch_size_mb or max_client_lag seconds, like the SDK client would
+    batcher = MicroBatcher(max_bytes=batch_size_mb * 1024 * 1024, max_lag=max_client_lag)
+    pacer = BatchPacer(max(batch_interval, 0.1), stop_event=_job_stop_event(job_id))
+    
+    def insert_batch(session):
+        buffered_for = batcher.age()
+        batch = batcher.drain()
+        insert_started = time.monotonic()
+        
+        # Concurrent flushes from other jobs streaming into the same table are
+        # coalesced with this one into a single insert
+        _table_writer(target_table).write(batch, lambda rows: insert_streaming_rows(session, target_table, rows))
+        insert_latency = time.monotonic() - insert_started
+        batcher.record_flush(insert_latency)
+        
+        # Update stats - end-to-end covers time buffered plus the insert itself
+        stats.update(
+            total_rows=stats['total_rows'] + len(batch),
+            batches_sent=stats['batches_sent'] + 1,
+            last_batch_time=datetime.now(),
+            insert_latency_ms=round(batcher.insert_latency * 1000, 1),
+            end_to_end_latency_ms=round((buffered_for + insert_latency) * 1000, 1),
+            batch_window_ms=round(batcher.max_lag * 1000),
+        )
+        
+        logger.debug("Job %s: Inserted %d rows", job_id, len(batch))
+    
     # Main streaming loop
     while True:
         # Check if job should stop
-        with streaming_lock:
-            if job_id not in active_streaming_jobs:
-                logger.info(f"Job {job_id} removed, stopping worker")
-                break
-            if active_streaming_jobs[job_id]['status'] == 'STOPPING':
-                logger.info(f"Job {job_id} stopping")
-                active_streaming_jobs[job_id]['status'] = 'STOPPED'
-                break
+        if _job_should_stop(job_id, 'Snowpipe Streaming'):
+            break
         
         try:
             # Generate batch of readings
-            batch = []
-            for _ in range(min(batch_size, len(meter_fleet))):
-                meter = random.choice(meter_fleet)
-                reading = generate_ami_reading(meter, service_area, emission_pattern)
-                batch.append(reading)
+            sampled = meter_fleet.sample(min(batch_size, len(meter_fleet)))
+            batcher.add(generate_ami_readings(meter_fleet, sampled, service_area, emission_pattern))
             
-            session = get_valid_session()
-            if batch and session:
-                # Build INSERT statement with VALUES
-                columns = list(batch[0].keys())
-                col_str = ', '.join(columns)
-                
-                values_list = []
-                for row in batch:
-                    vals = []
-                    for col in columns:
-                        v = row[col]
-                        if v is None:
-                            vals.append('NULL')
-                        elif isinstance(v, bool):
-                            vals.append('TRUE' if v else 'FALSE')
-                        elif isinstance(v, (int, float)):
-                            vals.append(str(v))
-                        elif isinstance(v, datetime):
-                            vals.append(f"'{v.strftime('%Y-%m-%d %H:%M:%S')}'")
-                        else:
-                            vals.append(f"'{str(v)}'")
-                    values_list.append(f"({', '.join(vals)})")
-                
-                # Execute batch insert
-                insert_sql = f"INSERT INTO {target_table} ({col_str}) VALUES {', '.join(values_list)}"
-                session.sql(insert_sql).collect()
-                
-                # Update stats
-                with streaming_lock:
-                    if job_id in active_streaming_jobs:
-                        active_streaming_jobs[job_id]['stats']['total_rows'] += len(batch)
-                        active_streaming_jobs[job_id]['stats']['batches_sent'] += 1
-                        active_streaming_jobs[job_id]['stats']['last_batch_time'] = datetime.now()
-                
-                logger.debug(f"Job {job_id}: Inserted {len(batch)} rows")
+            if batcher.should_flush():
+                session = get_valid_session()
+                if session:
+                    insert_batch(session)
             
-            # Sleep for batch interval
-            time.sleep(max(batch_interval, 0.1))
+            # Sleep until the next batch is due
+            _wait_for_next_batch(job_id, pacer)
             
         except Exception as e:
-            logger.error(f"Streaming error for job {job_id}: {e}")
-            with streaming_lock:
-                if job_id in active_streaming_jobs:
-                    active_streaming_jobs[job_id]['stats']['errors'] += 1
-            time.sleep(1)  # Back off on error
+            _back_off_after_error(job_id, stats, pacer, e, 'Streaming', delay=1)
+    
+    # Flush whatever is still buffered when the job stops
+    try:
+        session = get_valid_session()
+        while session and batcher.rows:
+            insert_batch(session)
+    except Exception as e:
+        logger.error(f"Final flush failed for job {job_id}: {e}")
     
     logger.info(f"Snowpipe Streaming worker for job {job_id} finished")
 
@@ -565,10 +1522,7 @@ def raw_json_s3_streaming_worker(job_id: str, config: dict):
     
     if not BOTO3_AVAILABLE:
         logger.error(f"boto3 not available - cannot start S3 streaming for job {job_id}")
-        with streaming_lock:
-            if job_id in active_streaming_jobs:
-                active_streaming_jobs[job_id]['status'] = 'FAILED'
-                active_streaming_jobs[job_id]['stats']['errors'] += 1
+        _fail_job(job_id)
         return
     
     logger.info(f"Starting Raw JSON S3 Streaming worker for job {job_id}")
@@ -598,184 +1552,101 @@ def raw_json_s3_streaming_worker(job_id: str, config: dict):
         'last_file_time': None
     }
     
-    with streaming_lock:
-        if job_id in active_streaming_jobs:
-            active_streaming_jobs[job_id]['stats'] = stats
-            active_streaming_jobs[job_id]['status'] = 'RUNNING'
+    _mark_job_running(job_id, stats)
     
-    # Initialize S3 client with role assumption
+    # Shared S3 client, refreshed by get_s3_client before assumed-role credentials expire
     try:
-        if aws_access_key and aws_secret_key:
-            # First create STS client with base credentials
-            if aws_role_arn:
-                # Assume role to get temporary credentials
-                sts_client = boto3.client(
-                    'sts',
-                    aws_access_key_id=aws_access_key,
-                    aws_secret_access_key=aws_secret_key,
-                    region_name=aws_region
-                )
-                assumed_role = sts_client.assume_role(
-                    RoleArn=aws_role_arn,
-                    RoleSessionName=f'flux-s3-streaming-{job_id[:8]}'
-                )
-                creds = assumed_role['Credentials']
-                s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=creds['AccessKeyId'],
-                    aws_secret_access_key=creds['SecretAccessKey'],
-                    aws_session_token=creds['SessionToken'],
-                    region_name=aws_region
-                )
-                logger.info(f"Assumed role {aws_role_arn} for S3 access")
-            else:
-                # Use base credentials directly
-                s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=aws_access_key,
-                    aws_secret_access_key=aws_secret_key,
-                    region_name=aws_region
-                )
-        else:
-            # Try default credentials (IAM role, env vars, etc.)
-            s3_client = boto3.client('s3', region_name=aws_region)
+        s3_client = get_s3_client(aws_region, aws_access_key, aws_secret_key, aws_role_arn)
         
         # Test connection
         s3_client.head_bucket(Bucket=s3_bucket)
         logger.info(f"S3 client initialized for bucket: {s3_bucket}")
     except Exception as e:
         logger.error(f"Failed to initialize S3 client: {e}")
-        with streaming_lock:
-            if job_id in active_streaming_jobs:
-                active_streaming_jobs[job_id]['status'] = 'FAILED'
-                active_streaming_jobs[job_id]['stats']['errors'] += 1
+        _fail_job(job_id)
         return
     
-    # Load meter fleet
-    meter_fleet = []
-    try:
-        session = get_valid_session()
-        if session and production_source != 'SYNTHETIC':
-            src_cfg = PRODUCTION_DATA_SOURCES.get(production_source)
-            if src_cfg:
-                result = session.sql(f"""
-                    SELECT 
-                        {src_cfg['meter_col']} as meter_id,
-                        {src_cfg.get('transformer_col', 'NULL')} as transformer_id,
-                        {src_cfg.get('circuit_col', 'NULL')} as circuit_id,
-                        {src_cfg.get('substation_col', 'NULL')} as substation_id,
-                        COALESCE({src_cfg.get('segment_col', "'RESIDENTIAL'")}, 'RESIDENTIAL') as customer_segment,
-                        {src_cfg.get('lat_col', 'NULL')} as latitude,
-                        {src_cfg.get('lon_col', 'NULL')} as longitude
-                    FROM {src_cfg['table']}
-                    ORDER BY RANDOM()
-                    LIMIT {meters}
-                """).collect()
-                
-                for row in result:
-                    meter_fleet.append({
-                        'meter_id': row['METER_ID'],
-                        'transformer_id': row['TRANSFORMER_ID'],
-                        'circuit_id': row['CIRCUIT_ID'],
-                        'substation_id': row['SUBSTATION_ID'],
-                        'customer_segment': row['CUSTOMER_SEGMENT'],
-                        'latitude': float(row['LATITUDE']) if row['LATITUDE'] else None,
-                        'longitude': float(row['LONGITUDE']) if row['LONGITUDE'] else None,
-                        'production_matched': True
-                    })
-                logger.info(f"Loaded {len(meter_fleet)} production meters for S3 streaming")
-    except Exception as e:
-        logger.error(f"Failed to load production meters: {e}")
-    
-    # Fallback to synthetic
-    if not meter_fleet:
-        logger.info(f"Generating {meters} synthetic meters for S3 streaming")
-        for i in range(meters):
-            segment = 'INDUSTRIAL' if i % 10 == 1 else ('COMMERCIAL' if i % 10 == 0 else 'RESIDENTIAL')
-            meter_fleet.append({
-                'meter_id': f'MTR-{service_area[:3]}-{i:06d}',
-                'transformer_id': f'XFMR-{service_area[:3]}-{i // 10:05d}',
-                'circuit_id': f'CIRCUIT-{service_area[:3]}-{i // 100:04d}',
-                'substation_id': f'SUB-{service_area[:3]}-{i // 1000:03d}',
-                'customer_segment': segment,
-                'latitude': 29.7604 + random.uniform(-0.5, 0.5),
-                'longitude': -95.3698 + random.uniform(-0.5, 0.5),
-                'production_matched': False
-            })
+    # Load meter fleet from production or generate synthetic
+    meter_fleet = load_meter_fleet(production_source, meters, service_area, 'S3 streaming')
+    pacer = BatchPacer(batch_interval_sec, stop_event=_job_stop_event(job_id))
+    uploads = UploadQueue()
+    
+    def record_uploads(wait: bool = False):
+        """Count finished uploads; a failed one raises into the loop's error back-off"""
+        for (s3_key, rows), err in uploads.completed(wait):
+            if err:
+                raise err
+            stats.update(
+                total_rows=stats['total_rows'] + rows,
+                files_written=stats['files_written'] + 1,
+                last_file_time=datetime.now(),
+            )
+            logger.debug("Job %s: Wrote %d records to s3://%s/%s", job_id, rows, s3_bucket, s3_key)
     
     # Main streaming loop - write JSON batches to S3
     while True:
         # Check if job should stop
-        with streaming_lock:
-            if job_id not in active_streaming_jobs:
-                logger.info(f"Job {job_id} removed, stopping S3 worker")
-                break
-            if active_streaming_jobs[job_id]['status'] == 'STOPPING':
-                logger.info(f"Job {job_id} stopping")
-                active_streaming_jobs[job_id]['status'] = 'STOPPED'
-                break
+        if _job_should_stop(job_id, 'S3 streaming'):
+            break
         
         try:
             # Generate batch of JSON records
             batch_timestamp = datetime.now()
             batch_id = f"BATCH_{batch_timestamp.strftime('%Y%m%d_%H%M%S')}_{batch_timestamp.microsecond}"
             
-            records = []
-            for _ in range(rows_per_batch):
-                meter = random.choice(meter_fleet)
-                reading = generate_ami_reading(meter, service_area, emission_pattern)
-                
-                # Convert to JSON-serializable format
-                json_record = {
-                    'meter_id': reading['METER_ID'],
-                    'transformer_id': reading['TRANSFORMER_ID'],
-                    'circuit_id': reading['CIRCUIT_ID'],
-                    'substation_id': reading['SUBSTATION_ID'],
-                    'reading_timestamp': reading['READING_TIMESTAMP'].isoformat(),
-                    'usage_kwh': reading['USAGE_KWH'],
-                    'voltage': reading['VOLTAGE'],
-                    'power_factor': reading['POWER_FACTOR'],
-                    'temperature_c': reading['TEMPERATURE_C'],
-                    'service_area': reading['SERVICE_AREA'],
-                    'customer_segment': reading['CUSTOMER_SEGMENT'],
-                    'latitude': reading['LATITUDE'],
-                    'longitude': reading['LONGITUDE'],
-                    'is_outage': reading['IS_OUTAGE'],
-                    'data_quality': reading['DATA_QUALITY'],
+            # Timestamps stay datetimes; orjson writes them in the same ISO 8601
+            # form isoformat() would, without a Python-level call per batch
+            reading_time, cols = generate_ami_columns(meter_fleet, meter_fleet.sample(rows_per_batch))
+            
+            # JSON records are built straight from the generated columns, skipping
+            # the intermediate table-row dicts
+            records = [
+                {
+                    'meter_id': meter_id,
+                    'transformer_id': transformer_id,
+                    'circuit_id': circuit_id,
+                    'substation_id': substation_id,
+                    'reading_timestamp': reading_time,
+                    'usage_kwh': usage_kwh,
+                    'voltage': voltage,
+                    'power_factor': power_factor,
+                    'temperature_c': temperature_c,
+                    'service_area': service_area,
+                    'customer_segment': segment,
+                    'latitude': latitude,
+                    'longitude': longitude,
+                    'is_outage': is_outage,
+                    'data_quality': data_quality,
                     'batch_id': batch_id,
-                    'emission_timestamp': batch_timestamp.isoformat()
+                    'emission_timestamp': batch_timestamp,
                 }
-                records.append(json_record)
-            
-            # Write JSON array to S3
-            json_content = json.dumps(records, indent=None)
-            s3_key = f"{s3_prefix}ami_stream_{batch_id}.json"
+                for (meter_id, transformer_id, circuit_id, substation_id, usage_kwh, voltage, power_factor,
+                     temperature_c, segment, latitude, longitude, is_outage, data_quality) in zip(*cols.values())
+            ]
             
-            s3_client.put_object(
-                Bucket=s3_bucket,
-                Key=s3_key,
-                Body=json_content.encode('utf-8'),
-                ContentType='application/json'
-            )
+            # Write gzipped newline-delimited JSON to S3, matching the other JSON writers.
+            # Compression and upload run in the background while the next batch is generated
+            s3_key = f"{s3_prefix}ami_stream_{batch_id}.json.gz"
+            s3_client = get_s3_client(aws_region, aws_access_key, aws_secret_key, aws_role_arn)
+            uploads.submit((s3_key, len(records)), gzip_and_upload, s3_client, s3_bucket, s3_key,
+                           extend_ndjson(bytearray(), records))
             
             # Update stats
-            with streaming_lock:
-                if job_id in active_streaming_jobs:
-                    active_streaming_jobs[job_id]['stats']['total_rows'] += len(records)
-                    active_streaming_jobs[job_id]['stats']['files_written'] += 1
-                    active_streaming_jobs[job_id]['stats']['last_file_time'] = datetime.now()
-            
-            logger.debug(f"Job {job_id}: Wrote {len(records)} records to s3://{s3_bucket}/{s3_key}")
+            record_uploads()
             
-            # Sleep between batches
-            time.sleep(batch_interval_sec)
+            # Sleep until the next batch is due
+            _wait_for_next_batch(job_id, pacer)
             
+        except Exception as e:
+            _back_off_after_error(job_id, stats, pacer, e, 'S3 streaming', delay=5)
+    
+    # Let uploads still in flight finish before the job is reported done
+    while uploads.in_flight:
+        try:
+            record_uploads(wait=True)
         except Exception as e:
             logger.error(f"S3 streaming error for job {job_id}: {e}")
-            with streaming_lock:
-                if job_id in active_streaming_jobs:
-                    active_streaming_jobs[job_id]['stats']['errors'] += 1
-            time.sleep(5)  # Back off on error
+            stats['errors'] += 1
     
     logger.info(f"Raw JSON S3 Streaming worker for job {job_id} finished")
 
@@ -783,6 +1654,7 @@ def raw_json_s3_streaming_worker(job_id: str, config: dict):
 def internal_stage_streaming_worker(job_id: str, config: dict):
     """
     Background worker that streams raw AMI JSON files to Snowflake internal stages.
+    With stage_file_format='parquet' it writes flat zstd Parquet files instead.
     
     UTILITY PERSPECTIVE:
     This simulates how raw AMI data from smart meters lands in a staging area
@@ -808,7 +1680,7 @@ def internal_stage_streaming_worker(job_id: str, config: dict):
     service_area = config.get('service_area', 'TEXAS_GULF_COAST')
     emission_pattern = config.get('emission_pattern', 'STAGGERED_REALISTIC')
     production_source = config.get('production_source', 'SYNTHETIC')
-    stage_name = config.get('stage_name', f'{DB}.{SCHEMA_PRODUCTION}.STG_AMI_RAW_JSON')
+    stage_name = config.get('stage_name', qualify_production_object('STG_AMI_RAW_JSON'))
     file_format = config.get('stage_file_format', 'json')
     
     # Initialize stats
@@ -821,181 +1693,199 @@ def internal_stage_streaming_worker(job_id: str, config: dict):
         'stage_name': stage_name
     }
     
-    with streaming_lock:
-        if job_id in active_streaming_jobs:
-            active_streaming_jobs[job_id]['stats'] = stats
-            active_streaming_jobs[job_id]['status'] = 'RUNNING'
+    _mark_job_running(job_id, stats)
     
-    # Load meter fleet
-    meter_fleet = []
-    try:
-        session = get_valid_session()
-        if session and production_source != 'SYNTHETIC':
-            src_cfg = PRODUCTION_DATA_SOURCES.get(production_source)
-            if src_cfg:
-                result = session.sql(f"""
-                    SELECT 
-                        {src_cfg['meter_col']} as meter_id,
-                        {src_cfg.get('transformer_col', 'NULL')} as transformer_id,
-                        {src_cfg.get('circuit_col', 'NULL')} as circuit_id,
-                        {src_cfg.get('substation_col', 'NULL')} as substation_id,
-                        COALESCE({src_cfg.get('segment_col', "'RESIDENTIAL'")}, 'RESIDENTIAL') as customer_segment,
-                        {src_cfg.get('lat_col', 'NULL')} as latitude,
-                        {src_cfg.get('lon_col', 'NULL')} as longitude
-                    FROM {src_cfg['table']}
-                    ORDER BY RANDOM()
-                    LIMIT {meters}
-                """).collect()
-                
-                for row in result:
-                    meter_fleet.append({
-                        'meter_id': row['METER_ID'],
-                        'transformer_id': row['TRANSFORMER_ID'],
-                        'circuit_id': row['CIRCUIT_ID'],
-                        'substation_id': row['SUBSTATION_ID'],
-                        'customer_segment': row['CUSTOMER_SEGMENT'],
-                        'latitude': float(row['LATITUDE']) if row['LATITUDE'] else None,
-                        'longitude': float(row['LONGITUDE']) if row['LONGITUDE'] else None,
-                        'production_matched': True
-                    })
-                logger.info(f"Loaded {len(meter_fleet)} production meters for stage streaming")
-    except Exception as e:
-        logger.error(f"Failed to load production meters for stage streaming: {e}")
-    
-    # Fallback to synthetic
-    if not meter_fleet:
-        logger.info(f"Generating {meters} synthetic meters for stage streaming")
-        for i in range(meters):
-            segment = 'INDUSTRIAL' if i % 10 == 1 else ('COMMERCIAL' if i % 10 == 0 else 'RESIDENTIAL')
-            meter_fleet.append({
-                'meter_id': f'MTR-{service_area[:3]}-{i:06d}',
-                'transformer_id': f'XFMR-{service_area[:3]}-{i // 10:05d}',
-                'circuit_id': f'CIRCUIT-{service_area[:3]}-{i // 100:04d}',
-                'substation_id': f'SUB-{service_area[:3]}-{i // 1000:03d}',
-                'customer_segment': segment,
-                'latitude': 29.7604 + random.uniform(-0.5, 0.5),
-                'longitude': -95.3698 + random.uniform(-0.5, 0.5),
-                'production_matched': False
-            })
+    # Load meter fleet from production or generate synthetic
+    meter_fleet = load_meter_fleet(production_source, meters, service_area, 'stage streaming')
+    pacer = BatchPacer(batch_interval_sec, stop_event=_job_stop_event(job_id))
     
     # Main streaming loop - write JSON batches to internal stage
     while True:
         # Check if job should stop
-        with streaming_lock:
-            if job_id not in active_streaming_jobs:
-                logger.info(f"Job {job_id} removed, stopping stage streaming worker")
-                break
-            if active_streaming_jobs[job_id]['status'] == 'STOPPING':
-                logger.info(f"Job {job_id} stopping stage streaming")
-                active_streaming_jobs[job_id]['status'] = 'STOPPED'
-                break
+        if _job_should_stop(job_id, 'internal stage streaming'):
+            break
         
         try:
             session = get_valid_session()
             if not session:
                 logger.error(f"No valid Snowflake session for stage streaming job {job_id}")
-                time.sleep(5)
+                pacer.sleep(5)
+                pacer.reset()
                 continue
             
             # Generate batch of JSON records
             batch_timestamp = datetime.now()
             batch_id = f"BATCH_{batch_timestamp.strftime('%Y%m%d_%H%M%S')}_{batch_timestamp.microsecond}"
             
-            records = []
-            for _ in range(rows_per_batch):
-                meter = random.choice(meter_fleet)
-                reading = generate_ami_reading(meter, service_area, emission_pattern)
-                
-                # Build raw JSON record ( This mirrors real AMI JSON from meters)
-                json_record = {
-                    'header': {
-                        'source_system': 'AMI_HEAD_END',
-                        'message_type': 'METER_READING',
-                        'batch_id': batch_id,
-                        'emission_timestamp': batch_timestamp.isoformat(),
-                        'version': '2.0'
-                    },
-                    'meter': {
-                        'meter_id': reading['METER_ID'],
-                        'transformer_id': reading['TRANSFORMER_ID'],
-                        'circuit_id': reading['CIRCUIT_ID'],
-                        'substation_id': reading['SUBSTATION_ID'],
-                        'customer_segment': reading['CUSTOMER_SEGMENT'],
-                        'service_area': reading['SERVICE_AREA'],
-                        'geo': {
-                            'latitude': reading['LATITUDE'],
-                            'longitude': reading['LONGITUDE']
-                        }
-                    },
-                    'reading': {
-                        'timestamp': reading['READING_TIMESTAMP'].isoformat(),
-                        'usage_kwh': reading['USAGE_KWH'],
-                        'voltage': reading['VOLTAGE'],
-                        'power_factor': reading['POWER_FACTOR'],
-                        'temperature_c': reading['TEMPERATURE_C']
-                    },
-                    'quality': {
-                        'data_quality': reading['DATA_QUALITY'],
-                        'is_outage': reading['IS_OUTAGE'],
-                        'production_matched': reading['PRODUCTION_MATCHED']
-                    },
-                    'metadata': {
-                        'emission_pattern': reading['EMISSION_PATTERN'],
-                        'ingestion_timestamp': datetime.now().isoformat()
-                    }
-                }
-                records.append(json_record)
+            # Files are built in memory and streamed to the stage, with no temp
+            # file to write, re-read and unlink per batch
+            sampled = meter_fleet.sample(rows_per_batch)
+            payload = io.BytesIO()
+            if file_format == 'parquet':
+                # Flat zstd Parquet: far smaller than JSON for this numeric schema
+                reading_time, cols = generate_ami_columns(meter_fleet, sampled)
+                file_name = f"ami_stream_{batch_id}.parquet"
+                write_ami_parquet(payload, reading_time, cols, {
+                    'service_area': service_area,
+                    'production_matched': meter_fleet.production_matched,
+                    'emission_pattern': emission_pattern,
+                    'batch_id': batch_id,
+                    'emission_timestamp': batch_timestamp,
+                })
+            else:
+                # Raw JSON records mirror real AMI JSON from meters
+                records = generate_raw_ami_records(meter_fleet, sampled, service_area, emission_pattern,
+                                                   batch_id, batch_timestamp)
+                
+                # Gzipped NDJSON (newline-delimited JSON), compressed here at level 1
+                # like the S3 writers rather than by PUT's AUTO_COMPRESS
+                file_name = f"ami_stream_{batch_id}.json.gz"
+                payload.write(gzip.compress(extend_ndjson(bytearray(), records), compresslevel=1, mtime=0))
             
-            # Write JSON to temp file and PUT to stage
-            # Using NDJSON (newline-delimited JSON) for easier processing
-            import tempfile
+            # PUT the payload to the internal stage; both formats arrive compressed
+            payload.seek(0)
+            put_result = session.file.put_stream(payload, f"@{stage_name}/{file_name}", auto_compress=False, overwrite=True)
             
-            file_name = f"ami_stream_{batch_id}.json"
+            logger.debug("PUT result for job %s: %s", job_id, put_result)
             
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-                for record in records:
-                    f.write(json.dumps(record) + '\n')
-                temp_file_path = f.name
+            # Update stats
+            stats.update(
+                total_rows=stats['total_rows'] + len(sampled),
+                files_written=stats['files_written'] + 1,
+                last_file_time=datetime.now(),
+            )
             
-            try:
-                # PUT file to internal stage
-                put_result = session.sql(f"""
-                    PUT 'file://{temp_file_path}' @{stage_name}/{file_name}
-                    AUTO_COMPRESS = TRUE
-                    OVERWRITE = TRUE
-                """).collect()
-                
-                logger.debug(f"PUT result for job {job_id}: {put_result}")
-                
-                # Update stats
-                with streaming_lock:
-                    if job_id in active_streaming_jobs:
-                        active_streaming_jobs[job_id]['stats']['total_rows'] += len(records)
-                        active_streaming_jobs[job_id]['stats']['files_written'] += 1
-                        active_streaming_jobs[job_id]['stats']['last_file_time'] = datetime.now()
-                
-                logger.debug(f"Job {job_id}: Wrote {len(records)} records to @{stage_name}/{file_name}")
-            finally:
-                # Clean up temp file
-                import os
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
+            logger.debug("Job %s: Wrote %d records to @%s/%s", job_id, len(sampled), stage_name, file_name)
             
-            # Sleep between batches
-            time.sleep(batch_interval_sec)
+            # Sleep until the next batch is due
+            _wait_for_next_batch(job_id, pacer)
             
         except Exception as e:
-            logger.error(f"Internal stage streaming error for job {job_id}: {e}")
-            with streaming_lock:
-                if job_id in active_streaming_jobs:
-                    active_streaming_jobs[job_id]['stats']['errors'] += 1
-            time.sleep(5)  # Back off on error
+            _back_off_after_error(job_id, stats, pacer, e, 'Internal stage streaming', delay=5)
     
     logger.info(f"Internal Stage Streaming worker for job {job_id} finished")
 
 
+# External stage targets are cached per stage name as
+# ((s3_bucket, s3_prefix, associated_pipes), loaded_at) so restarting a job
+# doesn't repeat DESC STAGE and SHOW PIPES. loaded_at is from time.monotonic().
+EXTERNAL_STAGE_TTL_SECONDS = 300
+_external_stages = {}
+_external_stages_lock = threading.Lock()
+
+
+def describe_external_stage(stage_name: str) -> tuple:
+    """
+    (s3_bucket, s3_prefix, associated_pipes) for an external stage; s3_bucket
+    is None if the stage URL couldn't be resolved. Only stages with a bucket and
+    at least one pipe are cached, so a pipe created right after a job start is
+    still picked up by the next one.
+    """
+    with _external_stages_lock:
+        cached = _external_stages.get(stage_name)
+    if cached and time.monotonic() - cached[1] < EXTERNAL_STAGE_TTL_SECONDS:
+        return cached[0]
+    
+    # PATTERN: Discover pipes that reference this stage for auto-refresh
+    # Without S3 event notifications, Snowpipe won't detect new files
+    # We trigger ALTER PIPE REFRESH periodically to ensure data flows through
+    associated_pipes = []
+    stage_ref = stage_name.upper()  # also matches the @stage form
+    try:
+        session = get_valid_session()
+        if session:
+            for schema_path in PIPE_SCHEMAS:
+                try:
+                    result = session.sql(f"SHOW PIPES IN SCHEMA {schema_path}").collect()
+                    for row in result:
+                        row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
+                        pipe_def = row_dict.get('definition', '') or ''
+                        pipe_name = row_dict.get('name', '')
+                        # Check if pipe references this stage
+                        if stage_ref in pipe_def.upper():
+                            associated_pipes.append(f"{schema_path}.{pipe_name}")
+                except Exception as e:
+                    logger.debug(f"Could not check pipes in {schema_path}: {e}")
+    except Exception as e:
+        logger.warning(f"Could not discover pipes for stage {stage_name}: {e}")
+    
+    # Get S3 bucket/prefix from external stage metadata
+    s3_bucket = None
+    s3_prefix = ''
+    
+    try:
+        session = get_valid_session()
+        if session:
+            # Query stage metadata to get the S3 URL
+            result = session.sql(f"DESC STAGE {stage_name}").collect()
+            for row in result:
+                row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
+                prop_name = row_dict.get('property', row_dict.get('PROPERTY', ''))
+                prop_val = row_dict.get('property_value', row_dict.get('PROPERTY_VALUE', ''))
+                
+                if prop_name.upper() == 'URL':
+                    # Parse s3://bucket/prefix
+                    # Handle JSON array format: ["s3://bucket/prefix/"]
+                    url_value = prop_val
+                    if url_value.startswith('[') and url_value.endswith(']'):
+                        try:
+                            urls = json.loads(url_value)
+                            if urls and len(urls) > 0:
+                                url_value = urls[0]
+                        except:
+                            # Try simple string extraction
+                            url_value = url_value.strip('[]"\'')
+                    
+                    if url_value.startswith('s3://'):
+                        parts = url_value[5:].rstrip('/').split('/', 1)
+                        s3_bucket = parts[0]
+                        s3_prefix = parts[1] + '/' if len(parts) > 1 else ''
+                        logger.info(f"External stage {stage_name} maps to s3://{s3_bucket}/{s3_prefix}")
+    except Exception as e:
+        logger.error(f"Failed to get external stage metadata: {e}")
+    
+    target = (s3_bucket, s3_prefix, tuple(associated_pipes))
+    if s3_bucket and associated_pipes:
+        with _external_stages_lock:
+            _external_stages[stage_name] = (target, time.monotonic())
+    return target
+
+
+def refresh_pipes(session: Session, pipes: tuple) -> dict:
+    """
+    ALTER PIPE ... REFRESH each pipe and return {pipe_name: error} for the
+    pipes that could not be refreshed.
+
+    Several pipes are refreshed in one multi-statement request rather than one
+    round trip per pipe. If that request fails, every pipe is retried on its
+    own so one dropped pipe or missing privilege does not hold back the rest.
+    Token errors are raised so the caller can mark the session suspect.
+    """
+    if len(pipes) > 1:
+        try:
+            with session.connection.cursor() as cur:
+                cur.execute(';\n'.join(f"ALTER PIPE {pipe_name} REFRESH" for pipe_name in pipes),
+                            num_statements=len(pipes))
+                # Errors in later statements only surface while walking the results
+                while cur.nextset():
+                    pass
+            return {}
+        except Exception as batch_err:
+            if _is_token_expired_error(batch_err):
+                raise
+            logger.debug(f"Batched pipe refresh failed, refreshing pipes one at a time: {batch_err}")
+    
+    failed = {}
+    for pipe_name in pipes:
+        try:
+            session.sql(f"ALTER PIPE {pipe_name} REFRESH").collect()
+        except Exception as pipe_err:
+            if _is_token_expired_error(pipe_err):
+                raise
+            failed[pipe_name] = pipe_err
+    return failed
+
+
 def external_stage_streaming_worker(job_id: str, config: dict):
     """
     Background worker that streams raw AMI JSON files to Snowflake external stages (S3/Azure/GCS).
@@ -1027,21 +1917,18 @@ def external_stage_streaming_worker(job_id: str, config: dict):
     emission_pattern = config.get('emission_pattern', 'STAGGERED_REALISTIC')
     production_source = config.get('production_source', 'SYNTHETIC')
     stage_name = config.get('stage_name')
+    target_file_mb = config.get('target_file_mb', STAGE_FILE_TARGET_BYTES / (1024 * 1024))
+    max_file_age_sec = config.get('max_file_age_sec', STAGE_FILE_MAX_AGE_SECONDS)
     
     if not stage_name:
         logger.error(f"No stage_name provided for external stage streaming job {job_id}")
-        with streaming_lock:
-            if job_id in active_streaming_jobs:
-                active_streaming_jobs[job_id]['status'] = 'FAILED'
+        _fail_job(job_id)
         return
     
     # Check boto3 availability for external stages
     if not BOTO3_AVAILABLE:
         logger.error(f"boto3 not available - cannot stream to external S3 stage for job {job_id}")
-        with streaming_lock:
-            if job_id in active_streaming_jobs:
-                active_streaming_jobs[job_id]['status'] = 'FAILED'
-                active_streaming_jobs[job_id]['stats']['errors'] += 1
+        _fail_job(job_id)
         return
     
     # Initialize stats
@@ -1056,128 +1943,32 @@ def external_stage_streaming_worker(job_id: str, config: dict):
         'stage_name': stage_name
     }
     
-    with streaming_lock:
-        if job_id in active_streaming_jobs:
-            active_streaming_jobs[job_id]['stats'] = stats
-            active_streaming_jobs[job_id]['status'] = 'RUNNING'
-    
-    # PATTERN: Discover pipes that reference this stage for auto-refresh
-    # Without S3 event notifications, Snowpipe won't detect new files
-    # We trigger ALTER PIPE REFRESH periodically to ensure data flows through
-    associated_pipes = []
-    try:
-        session = get_valid_session()
-        if session:
-            for schema_path in [f"{DB}.PRODUCTION", f"{DB}.DEV"]:
-                try:
-                    result = session.sql(f"SHOW PIPES IN SCHEMA {schema_path}").collect()
-                    for row in result:
-                        row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
-                        pipe_def = row_dict.get('definition', '') or ''
-                        pipe_name = row_dict.get('name', '')
-                        # Check if pipe references this stage
-                        if stage_name.upper() in pipe_def.upper() or f"@{stage_name}".upper() in pipe_def.upper():
-                            full_pipe_name = f"{schema_path}.{pipe_name}"
-                            associated_pipes.append(full_pipe_name)
-                            logger.info(f"Job {job_id}: Found associated pipe {full_pipe_name} for stage {stage_name}")
-                except Exception as e:
-                    logger.debug(f"Could not check pipes in {schema_path}: {e}")
-    except Exception as e:
-        logger.warning(f"Job {job_id}: Could not discover associated pipes: {e}")
+    _mark_job_running(job_id, stats)
     
     #  Track refresh state
     files_since_last_refresh = 0
     REFRESH_EVERY_N_FILES = 5  # Refresh pipes every N files written
     
-    # Get S3 bucket/prefix from external stage metadata
-    s3_bucket = None
-    s3_prefix = ''
-    
-    try:
-        session = get_valid_session()
-        if session:
-            # Query stage metadata to get the S3 URL
-            result = session.sql(f"DESC STAGE {stage_name}").collect()
-            for row in result:
-                row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
-                prop_name = row_dict.get('property', row_dict.get('PROPERTY', ''))
-                prop_val = row_dict.get('property_value', row_dict.get('PROPERTY_VALUE', ''))
-                
-                if prop_name.upper() == 'URL':
-                    # Parse s3://bucket/prefix
-                    # Handle JSON array format: ["s3://bucket/prefix/"]
-                    url_value = prop_val
-                    if url_value.startswith('[') and url_value.endswith(']'):
-                        try:
-                            import json
-                            urls = json.loads(url_value)
-                            if urls and len(urls) > 0:
-                                url_value = urls[0]
-                        except:
-                            # Try simple string extraction
-                            url_value = url_value.strip('[]"\'')
-                    
-                    if url_value.startswith('s3://'):
-                        parts = url_value[5:].rstrip('/').split('/', 1)
-                        s3_bucket = parts[0]
-                        s3_prefix = parts[1] + '/' if len(parts) > 1 else ''
-                        logger.info(f"External stage {stage_name} maps to s3://{s3_bucket}/{s3_prefix}")
-    except Exception as e:
-        logger.error(f"Failed to get external stage metadata: {e}")
+    # S3 bucket/prefix and the pipes to refresh, cached across job starts
+    s3_bucket, s3_prefix, associated_pipes = describe_external_stage(stage_name)
+    for pipe_name in associated_pipes:
+        logger.info(f"Job {job_id}: Found associated pipe {pipe_name} for stage {stage_name}")
     
     if not s3_bucket:
         logger.error(f"Could not determine S3 bucket from stage {stage_name} for job {job_id}")
-        with streaming_lock:
-            if job_id in active_streaming_jobs:
-                active_streaming_jobs[job_id]['status'] = 'FAILED'
-                active_streaming_jobs[job_id]['stats']['errors'] += 1
+        _fail_job(job_id)
         return
     
     # Initialize S3 client
-    # Try multiple credential sources: env vars, IAM role, default chain
+    # Credential sources in order: assumed role, env keys, default chain
     s3_client = None
     aws_region = 'us-west-2'  # Default region
+    aws_access_key = os.getenv('AWS_ACCESS_KEY_ID', '')
+    aws_secret_key = os.getenv('AWS_SECRET_ACCESS_KEY', '')
+    aws_role_arn = os.getenv('AWS_ROLE_ARN', '')
     
     try:
-        # Try to get credentials from environment or IAM role
-        aws_access_key = os.getenv('AWS_ACCESS_KEY_ID', '')
-        aws_secret_key = os.getenv('AWS_SECRET_ACCESS_KEY', '')
-        aws_role_arn = os.getenv('AWS_ROLE_ARN', '')
-        
-        if aws_access_key and aws_secret_key:
-            if aws_role_arn:
-                # Assume role for temporary credentials
-                sts_client = boto3.client(
-                    'sts',
-                    aws_access_key_id=aws_access_key,
-                    aws_secret_access_key=aws_secret_key,
-                    region_name=aws_region
-                )
-                assumed_role = sts_client.assume_role(
-                    RoleArn=aws_role_arn,
-                    RoleSessionName=f'flux-ext-stage-{job_id[:8]}'
-                )
-                creds = assumed_role['Credentials']
-                s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=creds['AccessKeyId'],
-                    aws_secret_access_key=creds['SecretAccessKey'],
-                    aws_session_token=creds['SessionToken'],
-                    region_name=aws_region
-                )
-                logger.info(f"Assumed role {aws_role_arn} for external stage S3 access")
-            else:
-                s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=aws_access_key,
-                    aws_secret_access_key=aws_secret_key,
-                    region_name=aws_region
-                )
-                logger.info("Using AWS env credentials for external stage S3 access")
-        else:
-            # Try default credential chain (IAM role, instance profile, etc.)
-            s3_client = boto3.client('s3', region_name=aws_region)
-            logger.info("Using default AWS credential chain for external stage S3 access")
+        s3_client = get_s3_client(aws_region, aws_access_key, aws_secret_key, aws_role_arn)
         
         # Test connection
         s3_client.head_bucket(Bucket=s3_bucket)
@@ -1185,186 +1976,266 @@ def external_stage_streaming_worker(job_id: str, config: dict):
         
     except Exception as e:
         logger.error(f"Failed to initialize S3 client for external stage: {e}")
-        with streaming_lock:
-            if job_id in active_streaming_jobs:
-                active_streaming_jobs[job_id]['status'] = 'FAILED'
-                active_streaming_jobs[job_id]['stats']['errors'] += 1
+        _fail_job(job_id)
         return
     
-    # Load meter fleet
-    meter_fleet = []
+    # Load meter fleet from production or generate synthetic
+    meter_fleet = load_meter_fleet(production_source, meters, service_area, 'external stage streaming')
+    pacer = BatchPacer(batch_interval_sec, stop_event=_job_stop_event(job_id))
+    pending = NdjsonFileBuffer(int(target_file_mb * 1024 * 1024), max_file_age_sec)
+    
+    uploads = UploadQueue()
+    
+    def flush_pending(inline: bool = False):
+        """Start uploading the coalesced batches as one gzipped NDJSON file"""
+        ndjson, rows, batches = pending.drain()
+        flushed_at = datetime.now()
+        file_name = f"ami_stream_{flushed_at.strftime('%Y%m%d_%H%M%S')}_{flushed_at.microsecond}.json.gz"
+        s3_key = f"{s3_prefix}{file_name}" if s3_prefix else file_name
+        s3_client = get_s3_client(aws_region, aws_access_key, aws_secret_key, aws_role_arn)
+        upload = uploads.run if inline else uploads.submit
+        upload((s3_key, rows, batches), gzip_and_upload, s3_client, s3_bucket, s3_key, ndjson)
+    
+    def record_uploads(wait: bool = False):
+        """Count finished uploads and refresh the stage's pipes every few files"""
+        nonlocal files_since_last_refresh
+        for (s3_key, rows, batches), s3_err in uploads.completed(wait):
+            if s3_err:
+                logger.error(f"S3 upload failed for job {job_id}: {s3_err}")
+                stats['errors'] += 1
+                continue
+            
+            # Update stats
+            written_at = datetime.now()
+            stats.update(
+                total_rows=stats['total_rows'] + rows,
+                files_written=stats['files_written'] + 1,
+                batches_sent=stats['batches_sent'] + batches,
+                last_file_time=written_at,
+                last_batch_time=written_at,
+            )
+            
+            logger.debug("Job %s: Wrote %d records (%d batches) to s3://%s/%s", job_id, rows, batches, s3_bucket, s3_key)
+            
+            # PATTERN: Trigger pipe refresh after every N files
+            # This ensures data flows through Snowpipe without relying on S3 event notifications
+            files_since_last_refresh += 1
+            if associated_pipes and files_since_last_refresh >= REFRESH_EVERY_N_FILES:
+                # Reset whether or not the refresh works, so a failing pipe is
+                # retried every N files rather than after every file
+                files_since_last_refresh = 0
+                try:
+                    # The cached session; it is only re-probed after a token error
+                    refresh_session = get_valid_session()
+                    if refresh_session:
+                        failed = refresh_pipes(refresh_session, associated_pipes)
+                        for pipe_name, pipe_err in failed.items():
+                            logger.debug(f"Job {job_id}: Pipe refresh failed for {pipe_name}: {pipe_err}")
+                        refreshed = [pipe_name for pipe_name in associated_pipes if pipe_name not in failed]
+                        if refreshed:
+                            logger.info(f"Job {job_id}: Triggered refresh for pipes {', '.join(refreshed)}")
+                except Exception as refresh_err:
+                    if _is_token_expired_error(refresh_err):
+                        _mark_session_suspect()
+                    logger.debug(f"Job {job_id}: Could not refresh pipes: {refresh_err}")
+    
+    # Main streaming loop - batches are generated on schedule and coalesced
+    # into one S3 file until it is large or old enough to upload
+    while True:
+        # Check if job should stop; whatever is still buffered goes out first
+        if _job_should_stop(job_id, 'external stage streaming'):
+            try:
+                # Uploaded on this thread: at app shutdown the upload pool may
+                # no longer accept work, and the buffer would be lost
+                if pending.data:
+                    flush_pending(inline=True)
+            except Exception as e:
+                logger.error(f"Final flush failed for job {job_id}: {e}")
+            record_uploads(wait=True)
+            break
+        
+        try:
+            # Generate batch of JSON records
+            batch_timestamp = datetime.now()
+            batch_id = f"BATCH_{batch_timestamp.strftime('%Y%m%d_%H%M%S')}_{batch_timestamp.microsecond}"
+            
+            # Same nested structure as internal stage
+            records = generate_raw_ami_records(meter_fleet, meter_fleet.sample(rows_per_batch), service_area,
+                                               emission_pattern, batch_id, batch_timestamp)
+            
+            pending.add(records)
+            if pending.should_flush():
+                flush_pending()
+            record_uploads()
+            
+            # Sleep until the next batch is due
+            _wait_for_next_batch(job_id, pacer)
+            
+        except Exception as e:
+            _back_off_after_error(job_id, stats, pacer, e, 'External stage streaming', delay=5)
+    
+    logger.info(f"External Stage Streaming worker for job {job_id} finished")
+
+
+def _show_stages(session: Session, schema_path: str) -> list:
     try:
-        session = get_valid_session()
-        if session and production_source != 'SYNTHETIC':
-            src_cfg = PRODUCTION_DATA_SOURCES.get(production_source)
-            if src_cfg:
-                result = session.sql(f"""
-                    SELECT 
-                        {src_cfg['meter_col']} as meter_id,
-                        {src_cfg.get('transformer_col', 'NULL')} as transformer_id,
-                        {src_cfg.get('circuit_col', 'NULL')} as circuit_id,
-                        {src_cfg.get('substation_col', 'NULL')} as substation_id,
-                        COALESCE({src_cfg.get('segment_col', "'RESIDENTIAL'")}, 'RESIDENTIAL') as customer_segment,
-                        {src_cfg.get('lat_col', 'NULL')} as latitude,
-                        {src_cfg.get('lon_col', 'NULL')} as longitude
-                    FROM {src_cfg['table']}
-                    ORDER BY RANDOM()
-                    LIMIT {meters}
-                """).collect()
-                
-                for row in result:
-                    meter_fleet.append({
-                        'meter_id': row['METER_ID'],
-                        'transformer_id': row['TRANSFORMER_ID'],
-                        'circuit_id': row['CIRCUIT_ID'],
-                        'substation_id': row['SUBSTATION_ID'],
-                        'customer_segment': row['CUSTOMER_SEGMENT'],
-                        'latitude': float(row['LATITUDE']) if row['LATITUDE'] else None,
-                        'longitude': float(row['LONGITUDE']) if row['LONGITUDE'] else None,
-                        'production_matched': True
-                    })
-                logger.info(f"Loaded {len(meter_fleet)} production meters for external stage streaming")
+        return session.sql(f"SHOW STAGES IN SCHEMA {schema_path}").collect()
+    except Exception as e:
+        logger.warning(f"Could not list stages in {schema_path}: {e}")
+        return []
+
+
+def load_stages(session: Session) -> dict:
+    """
+    Stages in the app's schemas, split into internal and external and sorted by
+    full name. Each schema is listed with its own SHOW STAGES IN SCHEMA, run
+    concurrently, rather than one SHOW STAGES IN ACCOUNT over every database.
+    """
+    with ThreadPoolExecutor(max_workers=len(PIPE_SCHEMAS)) as pool:
+        results = list(pool.map(functools.partial(_show_stages, session), PIPE_SCHEMAS))
+    
+    stages = {'internal': [], 'external': []}
+    for result in results:
+        for row in result:
+            row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
+            stage_type = row_dict.get('type', '').upper()
+            stage_info = {
+                'name': row_dict.get('name', ''),
+                'database': row_dict.get('database_name', ''),
+                'schema': row_dict.get('schema_name', ''),
+                'type': stage_type,
+                'url': row_dict.get('url', ''),
+                'owner': row_dict.get('owner', ''),
+                'comment': row_dict.get('comment', ''),
+            }
+            stage_info['full_name'] = f"{stage_info['database']}.{stage_info['schema']}.{stage_info['name']}"
+            
+            # Determine cloud provider for external stages
+            url = (stage_info['url'] or '').lower()
+            if stage_type == 'EXTERNAL':
+                if 's3://' in url:
+                    stage_info['cloud_provider'] = 'AWS S3'
+                elif 'azure://' in url or 'blob.core.windows.net' in url:
+                    stage_info['cloud_provider'] = 'Azure Blob'
+                elif 'gcs://' in url or 'storage.googleapis.com' in url:
+                    stage_info['cloud_provider'] = 'Google Cloud Storage'
+                else:
+                    stage_info['cloud_provider'] = 'External'
+                stages['external'].append(stage_info)
+            else:
+                stage_info['cloud_provider'] = 'Snowflake Internal'
+                stages['internal'].append(stage_info)
+    
+    # Sort by full_name for consistent ordering
+    stages['internal'].sort(key=lambda x: x['full_name'])
+    stages['external'].sort(key=lambda x: x['full_name'])
+    return stages
+
+
+# Stage writers upload gzipped NDJSON (.json.gz). PATTERN has to match the whole
+# file name, so pipes created from the older '...\.json' defaults skip those files.
+_GZIP_BLIND_PATTERN = re.compile(r"PATTERN\s*=\s*'[^']*\.json'", re.IGNORECASE)
+
+
+def pipe_misses_gzip_files(definition: str) -> bool:
+    """True when a pipe's PATTERN stops at .json and never matches .json.gz files"""
+    return bool(_GZIP_BLIND_PATTERN.search(definition or ''))
+
+
+def _show_pipes(session: Session, schema_path: str) -> list:
+    try:
+        return session.sql(f"SHOW PIPES IN SCHEMA {schema_path}").collect()
+    except Exception as e:
+        logger.warning(f"preload_dependencies: Could not load pipes from {schema_path}: {e}")
+        return []
+
+
+def _preload_pipes(session: Session):
+    """Preload pipes from multiple schemas, listed concurrently"""
+    try:
+        pipes = []
+        seen_pipes = set()
+        schemas_to_check = PIPE_SCHEMAS
+        
+        with ThreadPoolExecutor(max_workers=len(schemas_to_check)) as pool:
+            results = list(pool.map(functools.partial(_show_pipes, session), schemas_to_check))
+        
+        for result in results:
+            for row in result:
+                row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
+                pipe_info = {
+                    'name': row_dict.get('name', ''),
+                    'database': row_dict.get('database_name', ''),
+                    'schema': row_dict.get('schema_name', ''),
+                    'definition': row_dict.get('definition', ''),
+                    'owner': row_dict.get('owner', ''),
+                    'notification_channel': row_dict.get('notification_channel', ''),
+                    'comment': row_dict.get('comment', ''),
+                }
+                full_name = f"{pipe_info['database']}.{pipe_info['schema']}.{pipe_info['name']}"
+                if full_name not in seen_pipes:
+                    seen_pipes.add(full_name)
+                    pipe_info['full_name'] = full_name
+                    # Determine if it's an external stage pipe
+                    definition = pipe_info.get('definition', '').upper()
+                    pipe_info['is_external'] = any(x in definition for x in ['S3://', 'AZURE://', 'GCS://'])
+                    pipe_info['auto_ingest'] = 'AUTO_INGEST' in definition
+                    pipe_info['misses_gzip_files'] = pipe_misses_gzip_files(pipe_info['definition'])
+                    pipes.append(pipe_info)
+        
+        # Sort by schema then name for consistent ordering
+        pipes.sort(key=lambda x: (x['schema'], x['name']))
+        
+        _publish_dependencies(pipes=pipes)
+        logger.info(f"preload_dependencies: Cached {len(pipes)} pipes from {len(schemas_to_check)} schemas")
     except Exception as e:
-        logger.error(f"Failed to load production meters for external stage streaming: {e}")
-    
-    # Fallback to synthetic
-    if not meter_fleet:
-        logger.info(f"Generating {meters} synthetic meters for external stage streaming")
-        for i in range(meters):
-            segment = 'INDUSTRIAL' if i % 10 == 1 else ('COMMERCIAL' if i % 10 == 0 else 'RESIDENTIAL')
-            meter_fleet.append({
-                'meter_id': f'MTR-{service_area[:3]}-{i:06d}',
-                'transformer_id': f'XFMR-{service_area[:3]}-{i // 10:05d}',
-                'circuit_id': f'CIRCUIT-{service_area[:3]}-{i // 100:04d}',
-                'substation_id': f'SUB-{service_area[:3]}-{i // 1000:03d}',
-                'customer_segment': segment,
-                'latitude': 29.7604 + random.uniform(-0.5, 0.5),
-                'longitude': -95.3698 + random.uniform(-0.5, 0.5),
-                'production_matched': False
+        logger.warning(f"preload_dependencies: Failed to preload pipes: {e}")
+
+
+def _preload_stages(session: Session):
+    """Preload stages from the app schemas"""
+    try:
+        stages = load_stages(session)
+        
+        _publish_dependencies(stages=stages)
+        logger.info(f"preload_dependencies: Cached {len(stages['internal'])} internal, {len(stages['external'])} external stages")
+    except Exception as e:
+        logger.warning(f"preload_dependencies: Failed to preload stages: {e}")
+
+
+def _preload_tables(session: Session):
+    """Preload bronze tables"""
+    try:
+        result = session.sql(f"""
+            SELECT table_catalog, table_schema, table_name, row_count, bytes
+            FROM SNOWFLAKE.ACCOUNT_USAGE.TABLES 
+            WHERE DELETED IS NULL 
+            AND table_schema IN ('PRODUCTION', 'DEV')
+            AND table_catalog = '{DB}'
+            AND (UPPER(table_name) LIKE '%BRONZE%' OR UPPER(table_name) LIKE '%RAW%' OR UPPER(table_name) LIKE '%AMI%')
+            ORDER BY table_schema, table_name
+        """).collect()
+        
+        tables = []
+        for row in result:
+            row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
+            db = row_dict.get('TABLE_CATALOG', '')
+            schema = row_dict.get('TABLE_SCHEMA', '')
+            name = row_dict.get('TABLE_NAME', '')
+            tables.append({
+                'database': db,
+                'schema': schema,
+                'name': name,
+                'full_name': f"{db}.{schema}.{name}",
+                'row_count': row_dict.get('ROW_COUNT', 0),
+                'bytes': row_dict.get('BYTES', 0),
+                'has_variant': True,  # These are known bronze tables
             })
-    
-    # Main streaming loop - write JSON directly to S3 using boto3
-    while True:
-        # Check if job should stop
-        with streaming_lock:
-            if job_id not in active_streaming_jobs:
-                logger.info(f"Job {job_id} removed, stopping external stage streaming worker")
-                break
-            if active_streaming_jobs[job_id]['status'] == 'STOPPING':
-                logger.info(f"Job {job_id} stopping external stage streaming")
-                active_streaming_jobs[job_id]['status'] = 'STOPPED'
-                break
         
-        try:
-            # Generate batch of JSON records
-            batch_timestamp = datetime.now()
-            batch_id = f"BATCH_{batch_timestamp.strftime('%Y%m%d_%H%M%S')}_{batch_timestamp.microsecond}"
-            
-            records = []
-            for _ in range(rows_per_batch):
-                meter = random.choice(meter_fleet)
-                reading = generate_ami_reading(meter, service_area, emission_pattern)
-                
-                # Build raw JSON record (same nested structure as internal stage)
-                json_record = {
-                    'header': {
-                        'source_system': 'AMI_HEAD_END',
-                        'message_type': 'METER_READING',
-                        'batch_id': batch_id,
-                        'emission_timestamp': batch_timestamp.isoformat(),
-                        'version': '2.0'
-                    },
-                    'meter': {
-                        'meter_id': reading['METER_ID'],
-                        'transformer_id': reading['TRANSFORMER_ID'],
-                        'circuit_id': reading['CIRCUIT_ID'],
-                        'substation_id': reading['SUBSTATION_ID'],
-                        'customer_segment': reading['CUSTOMER_SEGMENT'],
-                        'service_area': reading['SERVICE_AREA'],
-                        'geo': {
-                            'latitude': reading['LATITUDE'],
-                            'longitude': reading['LONGITUDE']
-                        }
-                    },
-                    'reading': {
-                        'timestamp': reading['READING_TIMESTAMP'].isoformat(),
-                        'usage_kwh': reading['USAGE_KWH'],
-                        'voltage': reading['VOLTAGE'],
-                        'power_factor': reading['POWER_FACTOR'],
-                        'temperature_c': reading['TEMPERATURE_C']
-                    },
-                    'quality': {
-                        'data_quality': reading['DATA_QUALITY'],
-                        'is_outage': reading['IS_OUTAGE'],
-                        'production_matched': reading['PRODUCTION_MATCHED']
-                    },
-                    'metadata': {
-                        'emission_pattern': reading['EMISSION_PATTERN'],
-                        'ingestion_timestamp': datetime.now().isoformat()
-                    }
-                }
-                records.append(json_record)
-            
-            # Write JSON directly to S3 using boto3
-            file_name = f"ami_stream_{batch_id}.json"
-            s3_key = f"{s3_prefix}{file_name}" if s3_prefix else file_name
-            
-            # Convert records to NDJSON (newline-delimited JSON)
-            json_content = '\n'.join(json.dumps(record) for record in records)
-            
-            try:
-                s3_client.put_object(
-                    Bucket=s3_bucket,
-                    Key=s3_key,
-                    Body=json_content.encode('utf-8'),
-                    ContentType='application/json'
-                )
-                
-                # Update stats
-                with streaming_lock:
-                    if job_id in active_streaming_jobs:
-                        active_streaming_jobs[job_id]['stats']['total_rows'] += len(records)
-                        active_streaming_jobs[job_id]['stats']['files_written'] += 1
-                        active_streaming_jobs[job_id]['stats']['batches_sent'] += 1
-                        active_streaming_jobs[job_id]['stats']['last_file_time'] = datetime.now()
-                        active_streaming_jobs[job_id]['stats']['last_batch_time'] = datetime.now()
-                
-                logger.info(f"Job {job_id}: Wrote {len(records)} records to s3://{s3_bucket}/{s3_key}")
-                
-                # PATTERN: Trigger pipe refresh after every N files
-                # This ensures data flows through Snowpipe without relying on S3 event notifications
-                files_since_last_refresh += 1
-                if associated_pipes and files_since_last_refresh >= REFRESH_EVERY_N_FILES:
-                    try:
-                        refresh_session = get_valid_session()
-                        if refresh_session:
-                            for pipe_name in associated_pipes:
-                                try:
-                                    refresh_session.sql(f"ALTER PIPE {pipe_name} REFRESH").collect()
-                                    logger.info(f"Job {job_id}: Triggered refresh for pipe {pipe_name}")
-                                except Exception as pipe_err:
-                                    logger.debug(f"Job {job_id}: Pipe refresh failed for {pipe_name}: {pipe_err}")
-                            files_since_last_refresh = 0  # Reset counter
-                    except Exception as refresh_err:
-                        logger.debug(f"Job {job_id}: Could not refresh pipes: {refresh_err}")
-                
-            except Exception as s3_err:
-                logger.error(f"S3 put_object failed for job {job_id}: {s3_err}")
-                with streaming_lock:
-                    if job_id in active_streaming_jobs:
-                        active_streaming_jobs[job_id]['stats']['errors'] += 1
-            
-            # Sleep between batches
-            time.sleep(batch_interval_sec)
-            
-        except Exception as e:
-            logger.error(f"External stage streaming error for job {job_id}: {e}")
-            with streaming_lock:
-                if job_id in active_streaming_jobs:
-                    active_streaming_jobs[job_id]['stats']['errors'] += 1
-            time.sleep(5)  # Back off on error
-    
-    logger.info(f"External Stage Streaming worker for job {job_id} finished")
+        _publish_dependencies(tables=tables)
+        logger.info(f"preload_dependencies: Cached {len(tables)} bronze/raw tables")
+    except Exception as e:
+        logger.warning(f"preload_dependencies: Failed to preload tables: {e}")
 
 
 def preload_dependencies_background():
@@ -1373,7 +2244,11 @@ def preload_dependencies_background():
     Caches tables, pipes, stages to improve UX when user navigates to pipeline steps.
     Runs in a background thread to not block app startup.
     """
-    global dependency_cache
+    # A refresh already in flight will publish fresh data; don't queue behind it
+    if not _dependency_refresh_lock.acquire(blocking=False):
+        logger.info("preload_dependencies: Refresh already running, skipping")
+        return
+    _set_thread_sched_policy('SCHED_IDLE')
     
     try:
         session = get_valid_session()
@@ -1383,133 +2258,47 @@ def preload_dependencies_background():
         
         logger.info("preload_dependencies: Starting background preload of dependencies...")
         
-        # Preload pipes from multiple schemas
-        try:
-            pipes = []
-            seen_pipes = set()
-            schemas_to_check = [f"{DB}.PRODUCTION", f"{DB}.DEV"]
-            
-            for schema_path in schemas_to_check:
-                try:
-                    result = session.sql(f"SHOW PIPES IN SCHEMA {schema_path}").collect()
-                    for row in result:
-                        row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
-                        pipe_info = {
-                            'name': row_dict.get('name', ''),
-                            'database': row_dict.get('database_name', ''),
-                            'schema': row_dict.get('schema_name', ''),
-                            'definition': row_dict.get('definition', ''),
-                            'owner': row_dict.get('owner', ''),
-                            'notification_channel': row_dict.get('notification_channel', ''),
-                            'comment': row_dict.get('comment', ''),
-                        }
-                        full_name = f"{pipe_info['database']}.{pipe_info['schema']}.{pipe_info['name']}"
-                        if full_name not in seen_pipes:
-                            seen_pipes.add(full_name)
-                            pipe_info['full_name'] = full_name
-                            # Determine if it's an external stage pipe
-                            definition = pipe_info.get('definition', '').upper()
-                            pipe_info['is_external'] = any(x in definition for x in ['S3://', 'AZURE://', 'GCS://'])
-                            pipe_info['auto_ingest'] = 'AUTO_INGEST' in definition
-                            pipes.append(pipe_info)
-                except Exception as e:
-                    logger.warning(f"preload_dependencies: Could not load pipes from {schema_path}: {e}")
-            
-            # Sort by schema then name for consistent ordering
-            pipes.sort(key=lambda x: (x['schema'], x['name']))
-            
-            with dependency_cache['lock']:
-                dependency_cache['pipes'] = pipes
-            logger.info(f"preload_dependencies: Cached {len(pipes)} pipes from {len(schemas_to_check)} schemas")
-        except Exception as e:
-            logger.warning(f"preload_dependencies: Failed to preload pipes: {e}")
-        
-        # Preload stages
-        try:
-            result = session.sql("SHOW STAGES IN ACCOUNT").collect()
-            stages = {'internal': [], 'external': []}
-            for row in result:
-                row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
-                stage_type = row_dict.get('type', '').upper()
-                stage_info = {
-                    'name': row_dict.get('name', ''),
-                    'database': row_dict.get('database_name', ''),
-                    'schema': row_dict.get('schema_name', ''),
-                    'type': stage_type,
-                    'url': row_dict.get('url', ''),
-                    'owner': row_dict.get('owner', ''),
-                    'comment': row_dict.get('comment', ''),
-                }
-                stage_info['full_name'] = f"{stage_info['database']}.{stage_info['schema']}.{stage_info['name']}"
-                
-                # Determine cloud provider for external stages
-                url = stage_info['url'] or ''
-                if stage_type == 'EXTERNAL':
-                    if 's3://' in url.lower():
-                        stage_info['cloud_provider'] = 'AWS S3'
-                    elif 'azure://' in url.lower() or 'blob.core.windows.net' in url.lower():
-                        stage_info['cloud_provider'] = 'Azure Blob'
-                    elif 'gcs://' in url.lower() or 'storage.googleapis.com' in url.lower():
-                        stage_info['cloud_provider'] = 'Google Cloud Storage'
-                    else:
-                        stage_info['cloud_provider'] = 'External'
-                    stages['external'].append(stage_info)
-                else:
-                    stage_info['cloud_provider'] = 'Snowflake Internal'
-                    stages['internal'].append(stage_info)
-            
-            # Sort by full_name for consistent ordering
-            stages['internal'].sort(key=lambda x: x['full_name'])
-            stages['external'].sort(key=lambda x: x['full_name'])
-            
-            with dependency_cache['lock']:
-                dependency_cache['stages'] = stages
-            logger.info(f"preload_dependencies: Cached {len(stages['internal'])} internal, {len(stages['external'])} external stages")
-        except Exception as e:
-            logger.warning(f"preload_dependencies: Failed to preload stages: {e}")
-        
-        # Preload bronze tables
-        try:
-            result = session.sql(f"""
-                SELECT table_catalog, table_schema, table_name, row_count, bytes
-                FROM SNOWFLAKE.ACCOUNT_USAGE.TABLES 
-                WHERE DELETED IS NULL 
-                AND table_schema IN ('PRODUCTION', 'DEV')
-                AND table_catalog = '{DB}'
-                AND (UPPER(table_name) LIKE '%BRONZE%' OR UPPER(table_name) LIKE '%RAW%' OR UPPER(table_name) LIKE '%AMI%')
-                ORDER BY table_schema, table_name
-            """).collect()
-            
-            tables = []
-            for row in result:
-                row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
-                db = row_dict.get('TABLE_CATALOG', '')
-                schema = row_dict.get('TABLE_SCHEMA', '')
-                name = row_dict.get('TABLE_NAME', '')
-                tables.append({
-                    'database': db,
-                    'schema': schema,
-                    'name': name,
-                    'full_name': f"{db}.{schema}.{name}",
-                    'row_count': row_dict.get('ROW_COUNT', 0),
-                    'bytes': row_dict.get('BYTES', 0),
-                    'has_variant': True,  # These are known bronze tables
-                })
-            
-            with dependency_cache['lock']:
-                dependency_cache['tables'] = tables
-            logger.info(f"preload_dependencies: Cached {len(tables)} bronze/raw tables")
-        except Exception as e:
-            logger.warning(f"preload_dependencies: Failed to preload tables: {e}")
+        # Pipes, stages and tables are independent round trips, so they load
+        # concurrently; each publishes its own snapshot key as soon as it lands
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix='flux-preload',
+                                initializer=_set_thread_sched_policy, initargs=('SCHED_IDLE',)) as pool:
+            for preload in (_preload_pipes, _preload_stages, _preload_tables):
+                pool.submit(preload, session)
         
         # Mark cache as refreshed
-        with dependency_cache['lock']:
-            dependency_cache['last_refresh'] = datetime.now()
+        _publish_dependencies(last_refresh=datetime.now())
         
         logger.info("preload_dependencies: Background preload complete!")
         
     except Exception as e:
         logger.error(f"preload_dependencies: Background preload failed: {e}")
+    finally:
+        _dependency_refresh_lock.release()
+
+
+def _join_streaming_workers(threads: list, timeout: float):
+    """Wait up to timeout seconds in total for the given worker threads to finish"""
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0))
+        if thread.is_alive():
+            logger.warning(f"Streaming worker {thread.name} did not stop within {timeout}s")
+
+
+def _start_dependency_preload():
+    # A dedicated thread: the preload drops its thread to idle priority
+    threading.Thread(target=preload_dependencies_background, daemon=True).start()
+
+
+async def refresh_dependencies_ahead():
+    """Re-run the dependency preload every DEPENDENCY_REFRESH_SECONDS while the cache is being read"""
+    global _dependency_reads
+    while True:
+        await asyncio.sleep(DEPENDENCY_REFRESH_SECONDS)
+        reads, _dependency_reads = _dependency_reads, 0
+        if reads >= DEPENDENCY_REFRESH_MIN_READS:
+            logger.info(f"Refreshing dependency cache ahead of use ({reads} reads since last refresh)")
+            _start_dependency_preload()
 
 
 @asynccontextmanager
@@ -1526,7 +2315,7 @@ async def lifespan(app: FastAPI):
         if snowflake_session:
             logger.info("Reconciling stale streaming job states...")
             reconcile_result = snowflake_session.sql(f"""
-                UPDATE {DB}.{SCHEMA_PRODUCTION}.STREAMING_JOBS 
+                UPDATE {get_production_table('STREAMING_JOBS')} 
                 SET STATUS = 'STALE', 
                     UPDATED_AT = CURRENT_TIMESTAMP()
                 WHERE STATUS = 'RUNNING'
@@ -1538,14 +2327,25 @@ async def lifespan(app: FastAPI):
     #  Start background preloading of dependencies (tables, pipes, stages)
     # This improves UX by having data ready when user navigates to pipeline steps
     try:
-        preload_thread = threading.Thread(target=preload_dependencies_background, daemon=True)
-        preload_thread.start()
+        _start_dependency_preload()
         logger.info("Started background dependency preloading thread")
     except Exception as e:
         logger.warning(f"Could not start background preload: {e}")
+    refresh_task = asyncio.create_task(refresh_dependencies_ahead())
     
     yield
     logger.info("Shutting down...")
+    refresh_task.cancel()
+    # Worker threads are daemons - ask them to stop and give them a bounded
+    # time to flush what they have buffered before the process exits
+    with streaming_lock:
+        jobs = list(active_streaming_jobs.items())
+    for job_id, job in jobs:
+        with _job_lock(job_id):
+            if job['status'] in ('STARTING', 'RUNNING'):
+                _request_job_stop(job)
+    await run_in_threadpool(_join_streaming_workers, [job['thread'] for _, job in jobs],
+                            STREAMING_SHUTDOWN_TIMEOUT_SECONDS)
     if snowflake_session:
         snowflake_session.close()
 
@@ -1553,52 +2353,84 @@ async def lifespan(app: FastAPI):
 app = FastAPI(title="FLUX Data Forge", version="5.0", lifespan=lifespan)
 
 
+# (snapshot, JSON body) of the last /api/cache/status response; the body only
+# changes when a new dependency_cache snapshot is published
+_cache_status_body = (None, b'')
+
+
 @app.get("/api/cache/status")
 async def get_cache_status():
     """
      Check the status of the dependency cache for debugging.
     Returns what has been preloaded and when.
     """
-    with dependency_cache['lock']:
-        return {
-            "pipes_cached": dependency_cache['pipes'] is not None,
-            "pipes_count": len(dependency_cache['pipes']) if dependency_cache['pipes'] else 0,
-            "stages_cached": dependency_cache['stages'] is not None,
+    global _cache_status_body
+    snapshot = dependency_cache
+    built_for, body = _cache_status_body
+    if built_for is not snapshot:
+        pipes = snapshot['pipes']
+        stages = snapshot['stages']
+        tables = snapshot['tables']
+        last_refresh = snapshot['last_refresh']
+        body = orjson.dumps({
+            "pipes_cached": pipes is not None,
+            "pipes_count": len(pipes) if pipes else 0,
+            "stages_cached": stages is not None,
             "stages_count": {
-                "internal": len(dependency_cache['stages']['internal']) if dependency_cache['stages'] else 0,
-                "external": len(dependency_cache['stages']['external']) if dependency_cache['stages'] else 0,
+                "internal": len(stages['internal']) if stages else 0,
+                "external": len(stages['external']) if stages else 0,
             },
-            "tables_cached": dependency_cache['tables'] is not None,
-            "tables_count": len(dependency_cache['tables']) if dependency_cache['tables'] else 0,
-            "last_refresh": str(dependency_cache['last_refresh']) if dependency_cache['last_refresh'] else None,
-        }
+            "tables_cached": tables is not None,
+            "tables_count": len(tables) if tables else 0,
+            "last_refresh": str(last_refresh) if last_refresh else None,
+        })
+        _cache_status_body = (snapshot, body)
+    return Response(content=body, media_type="application/json")
+
+
+# Logo ships as a binary file next to this module and is read once; the
+# content hash doubles as a strong ETag
+_LOGO_BYTES = (Path(__file__).parent / 'flux_logo.png').read_bytes()
+_LOGO_ETAG = f'"{hashlib.sha256(_LOGO_BYTES).hexdigest()[:16]}"'
+_LOGO_HEADERS = {'ETag': _LOGO_ETAG, 'Cache-Control': 'public, max-age=31536000, immutable'}
+# Both possible answers are fixed, so they are built once; a Response holds no
+# per-request state and can be sent any number of times
+_LOGO_RESPONSE = Response(content=_LOGO_BYTES, media_type="image/png", headers=_LOGO_HEADERS)
+_LOGO_NOT_MODIFIED = Response(status_code=304, headers=_LOGO_HEADERS)
 
 
 @app.get("/logo.png")
-async def get_logo():
-    image_data = base64.b64decode(FLUX_LOGO_BASE64)
-    return Response(content=image_data, media_type="image/png")
+async def get_logo(request: Request):
+    if request.headers.get('if-none-match') == _LOGO_ETAG:
+        return _LOGO_NOT_MODIFIED
+    return _LOGO_RESPONSE
 
 
+@functools.lru_cache(maxsize=512)
 def get_material_icon(name: str, size: str = "24px", color: str = "#e2e8f0") -> str:
     return f'<span class="material-symbols-outlined" style="font-size:{size};color:{color};vertical-align:middle;">{name}</span>'
 
 
+# (threshold, suffix), largest first
+_NUMBER_SCALES = ((1_000_000_000, 'B'), (1_000_000, 'M'), (1_000, 'K'))
+
+
+# Dashboard counts repeat across refreshes. A NaN raises, so it is never cached.
+@functools.lru_cache(maxsize=4096)
 def format_number(n):
-    if n >= 1_000_000_000:
-        return f"{n/1_000_000_000:.1f}B"
-    elif n >= 1_000_000:
-        return f"{n/1_000_000:.1f}M"
-    elif n >= 1_000:
-        return f"{n/1_000:.1f}K"
+    for scale, suffix in _NUMBER_SCALES:
+        if n >= scale:
+            return f"{n/scale:.1f}{suffix}"
+    # Below 1000, and NaN (every comparison is False), which int() rejects
     return str(int(n))
 
 
-def get_base_styles():
-    return """
+_FONT_LINKS = """
     <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet" />
-    <link href="https://fonts.googleapis.com/css2?family=Material+Symbols+Outlined:opsz,wght,FILL,GRAD@20..48,100..700,0..1,-50..200" rel="stylesheet" />
-    <style>
+    <link href="https://fonts.googleapis.com/css2?family=Material+Symbols+Outlined:opsz,wght,FILL,GRAD@20..48,100..700,0..1,-50..200" rel="stylesheet" />"""
+
+# Shared stylesheet for every page, served from a content-addressed static URL
+_BASE_CSS = """
         :root {
             --space-xs: 4px;
             --space-sm: 10px;
@@ -2445,10 +3277,42 @@ def get_base_styles():
             .header { padding: var(--space-sm); flex-direction: column; text-align: center; }
             .header h1 { font-size: 1.25rem; }
         }
-    </style>
     """
 
 
+def _minify_css(css: str) -> str:
+    """Drop comments and collapse whitespace, including around braces and semicolons"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r' ?([{};]) ?', r'\1', css).strip()
+
+
+# Minified and gzipped once at import. The URL carries the content hash, so
+# browsers cache it forever and a changed stylesheet gets a new URL.
+_BASE_CSS_BYTES = _minify_css(_BASE_CSS).encode()
+_BASE_CSS_GZ = gzip.compress(_BASE_CSS_BYTES, compresslevel=9, mtime=0)
+_BASE_CSS_VERSION = hashlib.sha256(_BASE_CSS_BYTES).hexdigest()[:10]
+BASE_CSS_URL = f"/static/base.{_BASE_CSS_VERSION}.css"
+_BASE_CSS_HEADERS = {'Cache-Control': 'public, max-age=31536000, immutable', 'Vary': 'Accept-Encoding'}
+_BASE_STYLES = f"""{_FONT_LINKS}
+    <link href="{BASE_CSS_URL}" rel="stylesheet" />
+    """
+
+
+def get_base_styles():
+    return _BASE_STYLES
+
+
+@app.get("/static/base.{version}.css")
+async def get_base_css(version: str, request: Request):
+    if version != _BASE_CSS_VERSION:
+        raise HTTPException(status_code=404, detail="Unknown stylesheet version")
+    if 'gzip' in request.headers.get('accept-encoding', ''):
+        return Response(content=_BASE_CSS_GZ, media_type="text/css",
+                        headers={**_BASE_CSS_HEADERS, 'Content-Encoding': 'gzip'})
+    return Response(content=_BASE_CSS_BYTES, media_type="text/css", headers=_BASE_CSS_HEADERS)
+
+
 def get_header_html():
     return f"""
     <div class="header">
@@ -2500,6 +3364,30 @@ def get_tabs_html(active_tab: str):
     return html
 
 
+# Page chassis: everything up to the page-specific head content, and the
+# header/status bar/tabs strip, only vary by title and tab, so each variant
+# is rendered once and reused by every request for that page.
+@functools.lru_cache(maxsize=None)
+def get_page_head(title: str):
+    """Doctype and <head> prefix with base styles; the caller closes </head>"""
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>{title} - FLUX Data Forge</title>
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        {get_base_styles()}"""
+
+
+@functools.lru_cache(maxsize=None)
+def get_page_chrome(active_tab: str):
+    """Header, status bar and tab strip shown at the top of every page"""
+    return f"""
+            {get_header_html()}
+            {get_status_bar_html()}
+            {get_tabs_html(active_tab)}"""
+
+
 @app.get("/", response_class=HTMLResponse)
 async def home():
     return RedirectResponse(url="/generate")
@@ -2521,6 +3409,16 @@ async def generate_page(
     batch_size_mb: int = 10,
     max_client_lag: int = 1
 ):
+    # Today's date feeds the default batch start date, so it is part of the key
+    return HTMLResponse(render_generate_page(template, mode, fleet, data_flow, service_area,
+                                             rows_per_sec, batch_size_mb, max_client_lag, date.today()))
+
+
+# The generate page depends only on its query parameters and module constants,
+# and switching templates/flows re-requests it, so rendered pages are kept
+@functools.lru_cache(maxsize=64)
+def render_generate_page(template: str, mode: str, fleet: str, data_flow: str, service_area: str,
+                         rows_per_sec: int, batch_size_mb: int, max_client_lag: int, today: date) -> bytes:
     tmpl = USE_CASE_TEMPLATES.get(template, USE_CASE_TEMPLATES['SE Demo'])
     fleet_cfg = FLEET_PRESETS.get(fleet, FLEET_PRESETS['Demo (1K)'])
     area_cfg = UTILITY_PROFILES.get(service_area, UTILITY_PROFILES['TEXAS_GULF_COAST'])
@@ -3177,7 +4075,7 @@ async def generate_page(
         meters = tmpl['meters']
         days = tmpl['days']
         interval = tmpl['interval_minutes']
-        start_date = (date.today() - timedelta(days=days)).isoformat()
+        start_date = (today - timedelta(days=days)).isoformat()
         
         config_section = f'''
         <div class="section-header">
@@ -3757,13 +4655,13 @@ async def generate_page(
                                             {get_material_icon('filter_alt', '12px', '#94a3b8')} File Pattern (which files to ingest)
                                         </label>
                                         <select id="pipe_file_pattern_preset" onchange="updateFilePatternFromPreset()" style="width: 100%; font-size: 0.75rem; padding: 4px; margin-bottom: 4px;">
-                                            <option value=".*ami_stream.*\\.json">AMI Stream Files (ami_stream_*.json)</option>
-                                            <option value=".*ami_data.*\\.json">AMI Data Files (ami_data_*.json)</option>
-                                            <option value=".*\\.json">All JSON Files (*.json)</option>
+                                            <option value=".*ami_stream.*\\.json(\\.gz)?">AMI Stream Files (ami_stream_*.json[.gz])</option>
+                                            <option value=".*ami_data.*\\.json(\\.gz)?">AMI Data Files (ami_data_*.json[.gz])</option>
+                                            <option value=".*\\.json(\\.gz)?">All JSON Files (*.json[.gz])</option>
                                             <option value=".*\\.parquet">All Parquet Files (*.parquet)</option>
                                             <option value="custom">Custom Pattern...</option>
                                         </select>
-                                        <input type="text" id="pipe_file_pattern" value=".*ami_stream.*\\.json" 
+                                        <input type="text" id="pipe_file_pattern" value=".*ami_stream.*\\.json(\\.gz)?" 
                                             style="width: 100%; font-size: 0.75rem; padding: 4px; display: none;" 
                                             placeholder="Regex pattern, e.g., .*orders.*\\.json">
                                         <div style="color: #64748b; font-size: 0.65rem; margin-top: 4px;">
@@ -4248,7 +5146,7 @@ async def generate_page(
                 //  Check if user opted in to auto-create pipe
                 const autoCreatePipe = document.getElementById('auto_create_pipe')?.checked || false;
                 const sourceStage = document.getElementById('pipe_source_stage')?.value || '';
-                const filePattern = document.getElementById('pipe_file_pattern')?.value || '.*ami_stream.*\\.json';
+                const filePattern = document.getElementById('pipe_file_pattern')?.value || '.*ami_stream.*\\.json(\\.gz)?';
                 
                 if (!db || !schema || !tableName) {{
                     if (statusEl) statusEl.innerHTML = '<span style="color: #ef4444;">Please fill in all fields.</span>';
@@ -4338,7 +5236,7 @@ async def generate_page(
                                         <select id="create_pipe_stage_select" style="width: 100%; font-size: 0.75rem; margin-bottom: 6px;">
                                             ${{stageOptions}}
                                         </select>
-                                        <input type="text" id="create_pipe_pattern" value=".*ami_stream.*\\.json" style="width: 100%; font-size: 0.75rem; margin-bottom: 6px;" placeholder="File pattern (regex)">
+                                        <input type="text" id="create_pipe_pattern" value=".*ami_stream.*\\.json(\\.gz)?" style="width: 100%; font-size: 0.75rem; margin-bottom: 6px;" placeholder="File pattern (regex)">
                                         <button type="button" onclick="createPipeForTable('${{db}}', '${{schema}}', '${{tableName.toUpperCase()}}')" 
                                             style="background: #a855f7; color: white; border: none; border-radius: 4px; padding: 6px 10px; font-size: 0.7rem; cursor: pointer; width: 100%;">
                                             Create Snowpipe
@@ -4459,7 +5357,7 @@ async def generate_page(
                 const pipeStatusEl = document.getElementById('pipe_detection_status');
                 
                 const sourceStage = stageSelect?.value;
-                const pattern = patternInput?.value || '.*ami_stream.*\\.json';
+                const pattern = patternInput?.value || '.*ami_stream.*\\.json(\\.gz)?';
                 
                 if (!sourceStage) {{
                     alert('Please select a source stage');
@@ -5023,7 +5921,7 @@ FILE_FORMAT = (TYPE = ${{fileFormat}});`;
                             pipesBySchema[schemaKey].forEach(pipe => {{
                                 const opt = document.createElement('option');
                                 opt.value = pipe.full_name;  // Use full name for unique identification
-                                opt.textContent = pipe.name;
+                                opt.textContent = pipe.misses_gzip_files ? `${{pipe.name}} (⚠ pattern skips .json.gz)` : pipe.name;
                                 opt.dataset.schema = schemaKey;
                                 pipeGroup.appendChild(opt);
                             }});
@@ -5287,18 +6185,11 @@ FILE_FORMAT = (TYPE = ${{fileFormat}});`;
         '''
     
     return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Generate - FLUX Data Forge</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        {get_base_styles()}
+    {get_page_head('Generate')}
     </head>
     <body>
         <div class="container">
-            {get_header_html()}
-            {get_status_bar_html()}
-            {get_tabs_html('generate')}
+            {get_page_chrome('generate')}
             
             <div class="{layout_class}">
                 <div style="min-width: 0; overflow-x: hidden;">
@@ -5418,7 +6309,7 @@ FILE_FORMAT = (TYPE = ${{fileFormat}});`;
         </script>
     </body>
     </html>
-    """
+    """.encode()
 
 
 @app.get("/monitor", response_class=HTMLResponse)
@@ -5442,7 +6333,7 @@ async def monitor_page():
         if session:
             # ========== SECTION 1: SNOWFLAKE TASKS ==========
             result = session.sql(f"""
-                SHOW TASKS LIKE '%AMI_STREAMING%' IN SCHEMA {DB}.PRODUCTION
+                SHOW TASKS LIKE '%AMI_STREAMING%' IN SCHEMA {PIPE_SCHEMAS[0]}
             """).collect()
             
             started_tasks = []
@@ -5471,7 +6362,7 @@ async def monitor_page():
             #  Check for pipes in BOTH PRODUCTION and DEV schemas
             try:
                 seen_pipes = set()
-                for schema_path in [f"{DB}.PRODUCTION", f"{DB}.DEV"]:
+                for schema_path in PIPE_SCHEMAS:
                     try:
                         result = session.sql(f"""
                             SHOW PIPES IN SCHEMA {schema_path}
@@ -5491,7 +6382,8 @@ async def monitor_page():
                                     'definition': definition[:100] if definition else '',
                                     'notification_channel': row_dict.get('notification_channel', ''),
                                     'owner': row_dict.get('owner', ''),
-                                    'is_external': any(x in definition.upper() for x in ['S3://', 'AZURE://', 'GCS://'])
+                                    'is_external': any(x in definition.upper() for x in ['S3://', 'AZURE://', 'GCS://']),
+                                    'misses_gzip_files': pipe_misses_gzip_files(definition),
                                 })
                     except Exception as e:
                         logger.warning(f"Monitor: Could not load pipes from {schema_path}: {e}")
@@ -5505,7 +6397,7 @@ async def monitor_page():
             with streaming_lock:
                 for jid, jdata in active_streaming_jobs.items():
                     if jdata['status'] in ['RUNNING', 'STARTING']:
-                        stats = jdata.get('stats', {})
+                        stats = dict(jdata.get('stats', {}))
                         config = jdata.get('config', {})
                         active_memory_jobs.append({
                             'job_id': jid,
@@ -5532,7 +6424,7 @@ async def monitor_page():
                     SELECT JOB_ID, MECHANISM, TARGET_TABLE, METERS, INTERVAL_MINUTES, 
                            ROWS_PER_SEC, BATCH_SIZE_MB, SERVICE_AREA, STATUS, CREATED_AT,
                            PRODUCTION_SOURCE, EMISSION_PATTERN, PRODUCTION_MATCHED
-                    FROM {DB}.{SCHEMA_PRODUCTION}.STREAMING_JOBS
+                    FROM {get_production_table('STREAMING_JOBS')}
                     ORDER BY CREATED_AT DESC
                     LIMIT 10
                 """).collect()
@@ -5574,13 +6466,13 @@ async def monitor_page():
             for table_name in ['AMI_STREAMING_DATA', 'AMI_STREAMING_READINGS', 'AMI_STREAMING_READINGS_TEXAS_GULF_COAST', 'AMI_STREAMING_READINGS_HOUSTON_METRO']:
                 try:
                     result = session.sql(f"""
-                        SELECT COUNT(*) as cnt FROM {DB}.{SCHEMA_PRODUCTION}.{table_name}
+                        SELECT COUNT(*) as cnt FROM {get_production_table(table_name)}
                         WHERE CREATED_AT >= DATEADD(HOUR, -1, CURRENT_TIMESTAMP())
                     """).collect()
                     recent_rows_1h += result[0]['CNT'] if result else 0
                     
                     result = session.sql(f"""
-                        SELECT COUNT(*) as cnt FROM {DB}.{SCHEMA_PRODUCTION}.{table_name}
+                        SELECT COUNT(*) as cnt FROM {get_production_table(table_name)}
                     """).collect()
                     total_rows += result[0]['CNT'] if result else 0
                 except:
@@ -5667,6 +6559,8 @@ async def monitor_page():
                     schema_color = '#22c55e' if p.get('schema') == 'PRODUCTION' else '#f59e0b'
                     schema_badge = f'<span style="background: {schema_color}20; color: {schema_color}; padding: 2px 6px; border-radius: 4px; font-size: 0.65rem; margin-left: 8px;">{p.get("schema", "")}</span>'
                     external_badge = '<span style="background: #38bdf820; color: #38bdf8; padding: 2px 6px; border-radius: 4px; font-size: 0.65rem; margin-left: 4px;">S3</span>' if p.get('is_external') else ''
+                    if p.get('misses_gzip_files'):
+                        external_badge += '<span title="PATTERN ends in .json; recreate the pipe with a .json(\\.gz)? pattern to load the gzipped files now written" style="background: #f59e0b20; color: #f59e0b; padding: 2px 6px; border-radius: 4px; font-size: 0.65rem; margin-left: 4px;">SKIPS .json.gz</span>'
                     snowpipe_html += f'''
                     <div style="background: rgba(168, 85, 247, 0.1); border: 1px solid rgba(168, 85, 247, 0.3); border-radius: 8px; padding: 12px; margin-bottom: 8px;">
                         <div style="display: flex; align-items: center; flex-wrap: wrap;">
@@ -5853,7 +6747,7 @@ async def monitor_page():
                     # Ensure the table name is fully qualified
                     target_table = active_target
                     if '.' not in target_table:
-                        target_table = f"{DB}.{SCHEMA_PRODUCTION}.{target_table}"
+                        target_table = qualify_production_object(target_table)
                     
                     result = session.sql(f"""
                         SELECT METER_ID, READING_TIMESTAMP, USAGE_KWH, VOLTAGE, CUSTOMER_SEGMENT, DATA_QUALITY, PRODUCTION_MATCHED, CREATED_AT
@@ -5964,7 +6858,7 @@ async def monitor_page():
                     # No active jobs - show default table with guidance
                     result = session.sql(f"""
                         SELECT METER_ID, READING_TIMESTAMP, USAGE_KWH, VOLTAGE, CUSTOMER_SEGMENT, DATA_QUALITY, PRODUCTION_MATCHED, CREATED_AT
-                        FROM {DB}.{SCHEMA_PRODUCTION}.AMI_STREAMING_DATA
+                        FROM {get_production_table('AMI_STREAMING_DATA')}
                         ORDER BY CREATED_AT DESC
                         LIMIT 10
                     """).collect()
@@ -6636,13 +7530,8 @@ async def monitor_page():
             health_detail = "Jobs active, awaiting first data"
     
     return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Monitor - FLUX Data Forge</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    {get_page_head('Monitor')}
         <!--  Removed meta refresh - using AJAX to preserve UI state -->
-        {get_base_styles()}
         <style>
             /* Stream Health Indicator Styles */
             .health-indicator {{
@@ -6690,9 +7579,7 @@ async def monitor_page():
     </head>
     <body>
         <div class="container">
-            {get_header_html()}
-            {get_status_bar_html()}
-            {get_tabs_html('monitor')}
+            {get_page_chrome('monitor')}
             
             <!--  Prominent Stream Health Indicator - answers "is my stream working?" at a glance -->
             <div class="health-indicator {stream_health.lower()}" id="health-indicator">
@@ -7081,18 +7968,11 @@ async def validate_page():
     db_options = "".join([f'<option value="{db}">{db}</option>' for db in databases])
     
     return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Validate - FLUX Data Forge</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        {get_base_styles()}
+    {get_page_head('Validate')}
     </head>
     <body>
         <div class="container">
-            {get_header_html()}
-            {get_status_bar_html()}
-            {get_tabs_html('validate')}
+            {get_page_chrome('validate')}
             
             <div class="panel">
                 <div class="panel-title">{get_material_icon('check_circle', '20px', '#22c55e')} Schema Validation</div>
@@ -7152,7 +8032,7 @@ async def history_page():
             result = snowflake_session.sql(f"""
                 SELECT JOB_ID, CREATED_AT, MODE, DATABASE_NAME, SCHEMA_NAME, TABLE_NAME,
                        METERS, DAYS, ROWS_GENERATED, DURATION_SECONDS, STATUS
-                FROM {DB}.{SCHEMA_APPLICATIONS}.FLUX_GENERATION_HISTORY
+                FROM {get_applications_table('FLUX_GENERATION_HISTORY')}
                 ORDER BY CREATED_AT DESC
                 LIMIT 50
             """).collect()
@@ -7200,18 +8080,11 @@ async def history_page():
         """
     
     return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>History - FLUX Data Forge</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        {get_base_styles()}
+    {get_page_head('History')}
     </head>
     <body>
         <div class="container">
-            {get_header_html()}
-            {get_status_bar_html()}
-            {get_tabs_html('history')}
+            {get_page_chrome('history')}
             
             <div class="panel">
                 <div class="panel-title">{get_material_icon('history', '20px')} Generation History</div>
@@ -7293,12 +8166,12 @@ ALTER TASK {database}.{schema}.{task_name} RESUME;
 
 
 @app.post("/api/task/suspend")
-async def suspend_task(task_name: str = Form(...)):
+def suspend_task(task_name: str = Form(...)):
     """Suspend a running streaming task"""
     try:
         session = get_valid_session()
         if session:
-            session.sql(f"ALTER TASK {DB}.{SCHEMA_PRODUCTION}.{task_name} SUSPEND").collect()
+            session.sql(f"ALTER TASK {qualify_production_object(task_name)} SUSPEND").collect()
             return RedirectResponse(url="/monitor", status_code=303)
     except Exception as e:
         logger.error(f"Failed to suspend task {task_name}: {e}")
@@ -7306,12 +8179,12 @@ async def suspend_task(task_name: str = Form(...)):
 
 
 @app.post("/api/task/resume")
-async def resume_task(task_name: str = Form(...)):
+def resume_task(task_name: str = Form(...)):
     """Resume a suspended streaming task"""
     try:
         session = get_valid_session()
         if session:
-            session.sql(f"ALTER TASK {DB}.{SCHEMA_PRODUCTION}.{task_name} RESUME").collect()
+            session.sql(f"ALTER TASK {qualify_production_object(task_name)} RESUME").collect()
             return RedirectResponse(url="/monitor", status_code=303)
     except Exception as e:
         logger.error(f"Failed to resume task {task_name}: {e}")
@@ -7319,14 +8192,14 @@ async def resume_task(task_name: str = Form(...)):
 
 
 @app.post("/api/streaming/stop")
-async def stop_streaming_job(job_id: str = Form(...)):
+def stop_streaming_job(job_id: str = Form(...)):
     """Stop an active Snowpipe Streaming job"""
     global active_streaming_jobs
     
     try:
-        with streaming_lock:
+        with _job_lock(job_id):
             if job_id in active_streaming_jobs:
-                active_streaming_jobs[job_id]['status'] = 'STOPPING'
+                _request_job_stop(active_streaming_jobs[job_id])
                 logger.info(f"Stopping streaming job: {job_id}")
         
         # Update DB status
@@ -7334,7 +8207,7 @@ async def stop_streaming_job(job_id: str = Form(...)):
         if session:
             try:
                 session.sql(f"""
-                    UPDATE {DB}.{SCHEMA_PRODUCTION}.STREAMING_JOBS 
+                    UPDATE {get_production_table('STREAMING_JOBS')} 
                     SET STATUS = 'STOPPED', UPDATED_AT = CURRENT_TIMESTAMP()
                     WHERE JOB_ID = '{job_id}'
                 """).collect()
@@ -7355,7 +8228,7 @@ async def get_streaming_status():
     jobs = []
     with streaming_lock:
         for job_id, job_data in active_streaming_jobs.items():
-            stats = job_data.get('stats', {})
+            stats = dict(job_data.get('stats', {}))
             config = job_data.get('config', {})
             jobs.append({
                 'job_id': job_id,
@@ -7369,13 +8242,16 @@ async def get_streaming_status():
                 'errors': stats.get('errors', 0),
                 'start_time': str(stats.get('start_time', ''))[:19],
                 'last_batch_time': str(stats.get('last_batch_time', ''))[:19] if stats.get('last_batch_time') else None,
+                'insert_latency_ms': stats.get('insert_latency_ms'),
+                'end_to_end_latency_ms': stats.get('end_to_end_latency_ms'),
+                'batch_window_ms': stats.get('batch_window_ms'),
             })
     
     return JSONResponse({'active_jobs': jobs, 'count': len(jobs)})
 
 
 @app.post("/api/stream")
-async def start_stream(
+def start_stream(
     mode: str = Form(...),
     data_flow: str = Form("snowflake_streaming"),
     meters: int = Form(1000),
@@ -7384,7 +8260,7 @@ async def start_stream(
     rows_per_sec: int = Form(1000),
     batch_size_mb: int = Form(10),
     max_client_lag: int = Form(1),
-    table: str = Form(f"{DB}.{SCHEMA_PRODUCTION}.AMI_STREAMING_DATA"),
+    table: str = Form(get_production_table('AMI_STREAMING_DATA')),
     new_table: str = Form(None),
     # New production matching parameters
     production_source: str = Form("METER_INFRASTRUCTURE"),
@@ -7407,6 +8283,10 @@ async def start_stream(
     - data_format: standard, raw_ami (with VARIANT), or minimal
     - stage_name: External stage for stage destination
     - stage_file_format: parquet, json, or csv
+    
+    Declared sync so FastAPI runs it in the threadpool: the CREATE TABLE /
+    TASK / PIPE / STAGE DDL below blocks for seconds and must not stall the
+    event loop for other requests.
     """
     # Extract mechanism and dest from data_flow for backward compatibility
     flow_cfg = DATA_FLOWS.get(data_flow, DATA_FLOWS['snowflake_streaming'])
@@ -7452,22 +8332,19 @@ async def start_stream(
             else:
                 # Use production-matched meters
                 src_cfg = PRODUCTION_DATA_SOURCES[production_source]
-                segment_where = f"WHERE {src_cfg.get('segment_col', 'CUSTOMER_SEGMENT_ID')} = '{segment_filter}'" if segment_filter else ""
+                segment_where = f"WHERE {src_cfg.segment_col or 'CUSTOMER_SEGMENT_ID'} = '{segment_filter}'" if segment_filter else ""
                 
                 meter_source_sql = f"""
                     SELECT 
-                        m.{src_cfg['meter_col']} AS METER_ID,
-                        m.{src_cfg.get('transformer_col', 'TRANSFORMER_ID')} AS TRANSFORMER_ID,
-                        m.{src_cfg.get('circuit_col', 'CIRCUIT_ID')} AS CIRCUIT_ID,
+                        m.{src_cfg.meter_col} AS METER_ID,
+                        m.{src_cfg.transformer_col or 'TRANSFORMER_ID'} AS TRANSFORMER_ID,
+                        m.{src_cfg.circuit_col or 'CIRCUIT_ID'} AS CIRCUIT_ID,
                         ROW_NUMBER() OVER (ORDER BY RANDOM()) AS METER_NUM,
-                        COALESCE(m.{src_cfg.get('segment_col', "'RESIDENTIAL'")}, 'RESIDENTIAL') AS CUSTOMER_SEGMENT,
-                        m.{src_cfg.get('lat_col', 'NULL')} AS LATITUDE,
-                        m.{src_cfg.get('lon_col', 'NULL')} AS LONGITUDE,
-                        m.{src_cfg.get('substation_col', 'NULL')} AS SUBSTATION_ID
-                    FROM {src_cfg['table']} m
-                    {segment_where}
-                    ORDER BY RANDOM()
-                    LIMIT {meters}
+                        COALESCE(m.{src_cfg.segment_col or "'RESIDENTIAL'"}, 'RESIDENTIAL') AS CUSTOMER_SEGMENT,
+                        m.{src_cfg.lat_col or 'NULL'} AS LATITUDE,
+                        m.{src_cfg.lon_col or 'NULL'} AS LONGITUDE,
+                        m.{src_cfg.substation_col or 'NULL'} AS SUBSTATION_ID
+                    FROM {sampled_source(src_cfg.table, meters, segment_where, 'm')}
                 """
                 production_matched = True
             
@@ -7519,20 +8396,17 @@ async def start_stream(
                     """
                 else:
                     src_cfg = PRODUCTION_DATA_SOURCES[production_source]
-                    segment_where = f"WHERE {src_cfg.get('segment_col', 'CUSTOMER_SEGMENT_ID')} = '{segment_filter}'" if segment_filter else ""
+                    segment_where = f"WHERE {src_cfg.segment_col or 'CUSTOMER_SEGMENT_ID'} = '{segment_filter}'" if segment_filter else ""
                     meter_source_for_task = f"""
                     SELECT 
-                        m.{src_cfg['meter_col']} AS METER_ID,
-                        m.{src_cfg.get('transformer_col', 'TRANSFORMER_ID')} AS TRANSFORMER_ID,
-                        m.{src_cfg.get('circuit_col', 'CIRCUIT_ID')} AS CIRCUIT_ID,
-                        COALESCE(m.{src_cfg.get('segment_col', "'RESIDENTIAL'")}, 'RESIDENTIAL') AS CUSTOMER_SEGMENT,
-                        m.{src_cfg.get('lat_col', 'NULL')} AS LATITUDE,
-                        m.{src_cfg.get('lon_col', 'NULL')} AS LONGITUDE,
-                        m.{src_cfg.get('substation_col', 'NULL')} AS SUBSTATION_ID
-                    FROM {src_cfg['table']} m
-                    {segment_where}
-                    ORDER BY RANDOM()
-                    LIMIT {meters}
+                        m.{src_cfg.meter_col} AS METER_ID,
+                        m.{src_cfg.transformer_col or 'TRANSFORMER_ID'} AS TRANSFORMER_ID,
+                        m.{src_cfg.circuit_col or 'CIRCUIT_ID'} AS CIRCUIT_ID,
+                        COALESCE(m.{src_cfg.segment_col or "'RESIDENTIAL'"}, 'RESIDENTIAL') AS CUSTOMER_SEGMENT,
+                        m.{src_cfg.lat_col or 'NULL'} AS LATITUDE,
+                        m.{src_cfg.lon_col or 'NULL'} AS LONGITUDE,
+                        m.{src_cfg.substation_col or 'NULL'} AS SUBSTATION_ID
+                    FROM {sampled_source(src_cfg.table, meters, segment_where, 'm')}
                     """
                 
                 # Create task with corrected RANDOM() usage (no arguments)
@@ -7647,6 +8521,8 @@ async def start_stream(
                     'meters': meters,
                     'rows_per_sec': rows_per_sec,
                     'batch_size': min(rows_per_sec, 500),  # Batch up to 500 rows or rows_per_sec
+                    'batch_size_mb': batch_size_mb,
+                    'max_client_lag': max_client_lag,
                     'service_area': service_area,
                     'emission_pattern': emission_pattern,
                     'production_source': production_source,
@@ -7655,28 +8531,14 @@ async def start_stream(
                     'sdk_type': sdk_type,
                 }
                 
-                # Create and start streaming thread
-                worker_thread = threading.Thread(
-                    target=snowpipe_streaming_worker,
-                    args=(job_id, streaming_config),
-                    daemon=True
-                )
-                
-                with streaming_lock:
-                    active_streaming_jobs[job_id] = {
-                        'thread': worker_thread,
-                        'status': 'STARTING',
-                        'config': streaming_config,
-                        'stats': {
-                            'total_rows': 0,
-                            'batches_sent': 0,
-                            'errors': 0,
-                            'start_time': datetime.now(),
-                            'last_batch_time': None
-                        }
-                    }
-                
-                worker_thread.start()
+                # Run streaming worker on the shared streaming pool
+                _start_streaming_job(job_id, snowpipe_streaming_worker, streaming_config, {
+                    'total_rows': 0,
+                    'batches_sent': 0,
+                    'errors': 0,
+                    'start_time': datetime.now(),
+                    'last_batch_time': None
+                })
                 task_created = True
                 logger.info(f"Started Snowpipe Streaming worker: {job_id} ({sdk_type}, {rows_per_sec} rows/sec, Production Matched: {production_matched})")
             
@@ -7734,28 +8596,14 @@ async def start_stream(
                     'mechanism': 'raw_json_s3',
                 }
                 
-                # Create and start S3 streaming thread
-                worker_thread = threading.Thread(
-                    target=raw_json_s3_streaming_worker,
-                    args=(job_id, streaming_config),
-                    daemon=True
-                )
-                
-                with streaming_lock:
-                    active_streaming_jobs[job_id] = {
-                        'thread': worker_thread,
-                        'status': 'STARTING',
-                        'config': streaming_config,
-                        'stats': {
-                            'total_rows': 0,
-                            'files_written': 0,
-                            'errors': 0,
-                            'start_time': datetime.now(),
-                            'last_file_time': None
-                        }
-                    }
-                
-                worker_thread.start()
+                # Run S3 streaming worker on the shared streaming pool
+                _start_streaming_job(job_id, raw_json_s3_streaming_worker, streaming_config, {
+                    'total_rows': 0,
+                    'files_written': 0,
+                    'errors': 0,
+                    'start_time': datetime.now(),
+                    'last_file_time': None
+                })
                 task_created = True
                 logger.info(f"Started Raw JSON S3 Streaming: {job_id} → s3://{s3_bucket}/{s3_prefix}")
             
@@ -7848,29 +8696,15 @@ async def start_stream(
                 
                 # Choose appropriate worker based on stage type
                 worker_func = external_stage_streaming_worker if is_external_stage else internal_stage_streaming_worker
-                worker_thread = threading.Thread(
-                    target=worker_func,
-                    args=(job_id, streaming_config),
-                    daemon=True
-                )
-                
-                with streaming_lock:
-                    active_streaming_jobs[job_id] = {
-                        'thread': worker_thread,
-                        'status': 'STARTING',
-                        'config': streaming_config,
-                        'stats': {
-                            'total_rows': 0,
-                            'files_written': 0,
-                            'errors': 0,
-                            'start_time': datetime.now(),
-                            'last_file_time': None,
-                            'stage_name': target_stage,
-                            'stage_type': 'external' if is_external_stage else 'internal'
-                        }
-                    }
-                
-                worker_thread.start()
+                _start_streaming_job(job_id, worker_func, streaming_config, {
+                    'total_rows': 0,
+                    'files_written': 0,
+                    'errors': 0,
+                    'start_time': datetime.now(),
+                    'last_file_time': None,
+                    'stage_name': target_stage,
+                    'stage_type': 'external' if is_external_stage else 'internal'
+                })
                 task_created = True
                 stage_type_label = "External" if is_external_stage else "Internal"
                 logger.info(f"Started {stage_type_label} Stage JSON Streaming: {job_id} → @{target_stage}")
@@ -7884,18 +8718,11 @@ async def start_stream(
     status_text = "Streaming Job Started!" if task_created else ("Failed to Start" if error_message else "Job Registered (Manual Start Required)")
     
     return HTMLResponse(f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Streaming Started - FLUX Data Forge</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        {get_base_styles()}
+    {get_page_head('Streaming Started')}
     </head>
     <body>
         <div class="container">
-            {get_header_html()}
-            {get_status_bar_html()}
-            {get_tabs_html('generate')}
+            {get_page_chrome('generate')}
             
             <div class="panel" style="text-align: center; padding: 40px;">
                 <div style="font-size: 4rem; margin-bottom: 20px;">
@@ -7963,7 +8790,7 @@ async def generate_batch(
     start_date: str = Form(None),
     service_area: str = Form("TEXAS_GULF_COAST"),
     meter_prefix: str = Form("MTR"),
-    table: str = Form(f"{DB}.{SCHEMA_PRODUCTION}.AMI_INTERVAL_READINGS"),
+    table: str = Form(get_production_table('AMI_INTERVAL_READINGS')),
     include_variant: str = Form("false"),
     gen_asset360: str = Form(None),
     gen_work_orders: str = Form(None),
@@ -7974,18 +8801,11 @@ async def generate_batch(
     est_rows = meters * (days * 24 * 60 // interval)
     
     return HTMLResponse(f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Batch Generation Started - FLUX Data Forge</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        {get_base_styles()}
+    {get_page_head('Batch Generation Started')}
     </head>
     <body>
         <div class="container">
-            {get_header_html()}
-            {get_status_bar_html()}
-            {get_tabs_html('generate')}
+            {get_page_chrome('generate')}
             
             <div class="panel" style="text-align: center; padding: 40px;">
                 <div style="font-size: 4rem; margin-bottom: 20px;">
@@ -8128,18 +8948,15 @@ async def list_bronze_tables():
     Advanced Mode: Returns tables that can serve as Snowpipe targets.
     Uses preloaded cache for instant response when available.
     """
-    global dependency_cache
-    
     #  Use cached data if available for instant response
-    with dependency_cache['lock']:
-        if dependency_cache['tables'] is not None:
-            cached_tables = dependency_cache['tables']
-            logger.info(f"list_bronze_tables: Returning {len(cached_tables)} tables from cache (instant)")
-            return {
-                "tables": cached_tables,
-                "count": len(cached_tables),
-                "cached": True
-            }
+    cached_tables = read_dependency('tables')
+    if cached_tables is not None:
+        logger.info(f"list_bronze_tables: Returning {len(cached_tables)} tables from cache (instant)")
+        return {
+            "tables": cached_tables,
+            "count": len(cached_tables),
+            "cached": True
+        }
     
     session = get_valid_session()
     if not session:
@@ -8251,7 +9068,7 @@ async def get_bronze_tables_for_monitor():
         seen_tables = set()
         
         # Search in both PRODUCTION and DEV schemas
-        for schema_path in [f"{DB}.PRODUCTION", f"{DB}.DEV"]:
+        for schema_path in PIPE_SCHEMAS:
             try:
                 db, schema = schema_path.split('.')
                 result = session.sql(f"SHOW TABLES IN {schema_path}").collect()
@@ -8487,7 +9304,7 @@ async def create_bronze_table(
     table_type: str = Form("bronze_variant"),
     create_pipe: bool = Form(False),
     source_stage: str = Form(None),
-    file_pattern: str = Form(".*ami_stream.*\\.json")
+    file_pattern: str = Form(".*ami_stream.*\\.json(\\.gz)?")
 ):
     """
     Create a bronze table for raw data landing with VARIANT column.
@@ -8678,7 +9495,7 @@ async def auto_create_pipe_for_table(
     schema: str = Form(...),
     table_name: str = Form(...),
     source_stage: str = Form(...),
-    file_pattern: str = Form(".*ami_stream.*\\.json"),
+    file_pattern: str = Form(".*ami_stream.*\\.json(\\.gz)?"),
     auto_refresh: bool = Form(True)
 ):
     """
@@ -8977,22 +9794,22 @@ async def get_production_data_sources():
     for source_id, cfg in PRODUCTION_DATA_SOURCES.items():
         source_info = {
             "id": source_id,
-            "name": cfg['name'],
-            "table": cfg.get('table'),
-            "description": cfg['desc'],
-            "expected_count": cfg.get('count', 0),
+            "name": cfg.name,
+            "table": cfg.table,
+            "description": cfg.desc,
+            "expected_count": cfg.count,
         }
         
         # Check actual count if connected and not synthetic
-        if snowflake_session and cfg.get('table'):
+        if snowflake_session and cfg.table:
             try:
-                result = snowflake_session.sql(f"SELECT COUNT(*) as cnt FROM {cfg['table']}").collect()
+                result = snowflake_session.sql(f"SELECT COUNT(*) as cnt FROM {cfg.table}").collect()
                 source_info["actual_count"] = result[0]['CNT'] if result else 0
                 source_info["status"] = "available"
             except Exception as e:
                 source_info["status"] = "error"
                 source_info["error"] = str(e)
-        elif cfg.get('table') is None:
+        elif cfg.table is None:
             source_info["status"] = "synthetic"
         else:
             source_info["status"] = "unknown"
@@ -9058,28 +9875,25 @@ async def fetch_production_meters(
         raise HTTPException(503, "Snowflake not connected")
     
     cfg = PRODUCTION_DATA_SOURCES[source]
-    if not cfg.get('table'):
+    if not cfg.table:
         raise HTTPException(400, f"Source {source} has no table configured")
     
     try:
         # Build query based on source configuration
         segment_filter = ""
-        if segment and cfg.get('segment_col'):
-            segment_filter = f"WHERE {cfg['segment_col']} = '{segment}'"
+        if segment and cfg.segment_col:
+            segment_filter = f"WHERE {cfg.segment_col} = '{segment}'"
         
         query = f"""
         SELECT 
-            {cfg['meter_col']} as METER_ID,
-            {cfg.get('transformer_col', 'NULL')} as TRANSFORMER_ID,
-            {cfg.get('circuit_col', 'NULL')} as CIRCUIT_ID,
-            {cfg.get('segment_col', "'RESIDENTIAL'")} as CUSTOMER_SEGMENT,
-            {cfg.get('lat_col', 'NULL')} as LATITUDE,
-            {cfg.get('lon_col', 'NULL')} as LONGITUDE,
-            {cfg.get('substation_col', 'NULL')} as SUBSTATION_ID
-        FROM {cfg['table']}
-        {segment_filter}
-        ORDER BY RANDOM()
-        LIMIT {sample_size}
+            {cfg.meter_col} as METER_ID,
+            {cfg.transformer_col or 'NULL'} as TRANSFORMER_ID,
+            {cfg.circuit_col or 'NULL'} as CIRCUIT_ID,
+            {cfg.segment_col or "'RESIDENTIAL'"} as CUSTOMER_SEGMENT,
+            {cfg.lat_col or 'NULL'} as LATITUDE,
+            {cfg.lon_col or 'NULL'} as LONGITUDE,
+            {cfg.substation_col or 'NULL'} as SUBSTATION_ID
+        FROM {sampled_source(cfg.table, sample_size, segment_filter)}
         """
         
         result = snowflake_session.sql(query).collect()
@@ -9104,12 +9918,12 @@ async def fetch_production_meters(
             "count": len(meters)
         }
         
-        logger.info(f"Fetched {len(meters)} meters from {cfg['table']}")
+        logger.info(f"Fetched {len(meters)} meters from {cfg.table}")
         
         return {
             "status": "fetched",
             "source": source,
-            "table": cfg['table'],
+            "table": cfg.table,
             "count": len(meters),
             "fetched_at": _production_meters_cache["fetched_at"],
             "meters": meters
@@ -9123,45 +9937,37 @@ async def fetch_production_meters(
         )
 
 
-def generate_synthetic_meters(count: int, segment: str = None) -> list:
+def generate_synthetic_meters(count: int, segment: str = None, service_area: str = 'TEXAS_GULF_COAST') -> list:
     """Generate synthetic meter data when production data is not available"""
-    import random
+    rng = np.random.default_rng()
+    area_cfg = UTILITY_PROFILES.get(service_area, UTILITY_PROFILES['TEXAS_GULF_COAST'])
     
-    segments = ['RESIDENTIAL', 'COMMERCIAL', 'INDUSTRIAL']
+    # Segment mix follows the service area's segment_dist; draw integer codes
+    # and map to labels once for the whole fleet
     if segment:
-        segments = [segment]
+        segs = [segment] * count
+    else:
+        labels, pvec = SEGMENT_SAMPLERS.get(service_area, SEGMENT_SAMPLERS['TEXAS_GULF_COAST'])
+        codes = rng.choice(len(labels), size=count, p=pvec).astype(np.int8)
+        segs = labels[codes].tolist()
     
-    # Distribution: 70% residential, 20% commercial, 10% industrial
-    segment_weights = {'RESIDENTIAL': 0.70, 'COMMERCIAL': 0.20, 'INDUSTRIAL': 0.10}
+    # Coordinates around the service area centre - one column per field,
+    # converted back to Python floats in bulk for the JSON response
+    lats = np.round(area_cfg['center_lat'] + rng.uniform(-0.5, 0.5, count), 6).tolist()
+    lons = np.round(area_cfg['center_lon'] + rng.uniform(-0.5, 0.5, count), 6).tolist()
     
-    meters = []
-    for i in range(count):
-        if segment:
-            seg = segment
-        else:
-            r = random.random()
-            if r < 0.70:
-                seg = 'RESIDENTIAL'
-            elif r < 0.90:
-                seg = 'COMMERCIAL'
-            else:
-                seg = 'INDUSTRIAL'
-        
-        # Houston metro area coordinates
-        lat = 29.7604 + random.uniform(-0.5, 0.5)
-        lon = -95.3698 + random.uniform(-0.5, 0.5)
-        
-        meters.append({
+    return [
+        {
             "meter_id": f"MTR-SYN-{i:06d}",
             "transformer_id": f"XFMR-SYN-{i // 10:05d}",
             "circuit_id": f"CIRCUIT-SYN-{i // 100:04d}",
-            "customer_segment": seg,
-            "latitude": round(lat, 6),
-            "longitude": round(lon, 6),
+            "customer_segment": segs[i],
+            "latitude": lats[i],
+            "longitude": lons[i],
             "substation_id": f"SUB-SYN-{i // 1000:03d}",
-        })
-    
-    return meters
+        }
+        for i in range(count)
+    ]
 
 
 @app.get("/api/production/cache-status")
@@ -9303,22 +10109,19 @@ async def preview_streaming_records(
             production_matched = False
         else:
             src_cfg = PRODUCTION_DATA_SOURCES[production_source]
-            segment_where = f"WHERE {src_cfg.get('segment_col', 'CUSTOMER_SEGMENT_ID')} = '{segment_filter}'" if segment_filter else ""
+            segment_where = f"WHERE {src_cfg.segment_col or 'CUSTOMER_SEGMENT_ID'} = '{segment_filter}'" if segment_filter else ""
             
             meter_source_sql = f"""
                 SELECT 
-                    m.{src_cfg['meter_col']} AS METER_ID,
-                    m.{src_cfg.get('transformer_col', 'TRANSFORMER_ID')} AS TRANSFORMER_ID,
-                    m.{src_cfg.get('circuit_col', 'CIRCUIT_ID')} AS CIRCUIT_ID,
+                    m.{src_cfg.meter_col} AS METER_ID,
+                    m.{src_cfg.transformer_col or 'TRANSFORMER_ID'} AS TRANSFORMER_ID,
+                    m.{src_cfg.circuit_col or 'CIRCUIT_ID'} AS CIRCUIT_ID,
                     ROW_NUMBER() OVER (ORDER BY RANDOM()) AS METER_NUM,
-                    COALESCE(m.{src_cfg.get('segment_col', "'RESIDENTIAL'")}, 'RESIDENTIAL') AS CUSTOMER_SEGMENT,
-                    m.{src_cfg.get('lat_col', 'NULL')} AS LATITUDE,
-                    m.{src_cfg.get('lon_col', 'NULL')} AS LONGITUDE,
-                    m.{src_cfg.get('substation_col', 'NULL')} AS SUBSTATION_ID
-                FROM {src_cfg['table']} m
-                {segment_where}
-                ORDER BY RANDOM()
-                LIMIT {sample_size}
+                    COALESCE(m.{src_cfg.segment_col or "'RESIDENTIAL'"}, 'RESIDENTIAL') AS CUSTOMER_SEGMENT,
+                    m.{src_cfg.lat_col or 'NULL'} AS LATITUDE,
+                    m.{src_cfg.lon_col or 'NULL'} AS LONGITUDE,
+                    m.{src_cfg.substation_col or 'NULL'} AS SUBSTATION_ID
+                FROM {sampled_source(src_cfg.table, sample_size, segment_where, 'm')}
             """
             production_matched = True
         
@@ -9517,13 +10320,13 @@ async def get_monitor_metrics():
             for table_name in ['AMI_STREAMING_DATA', 'AMI_STREAMING_READINGS', 'AMI_STREAMING_READINGS_TEXAS_GULF_COAST', 'AMI_STREAMING_READINGS_HOUSTON_METRO']:
                 try:
                     result = session.sql(f"""
-                        SELECT COUNT(*) as cnt FROM {DB}.{SCHEMA_PRODUCTION}.{table_name}
+                        SELECT COUNT(*) as cnt FROM {get_production_table(table_name)}
                         WHERE CREATED_AT >= DATEADD(HOUR, -1, CURRENT_TIMESTAMP())
                     """).collect()
                     recent_rows_1h += result[0]['CNT'] if result else 0
                     
                     result = session.sql(f"""
-                        SELECT COUNT(*) as cnt FROM {DB}.{SCHEMA_PRODUCTION}.{table_name}
+                        SELECT COUNT(*) as cnt FROM {get_production_table(table_name)}
                     """).collect()
                     total_rows += result[0]['CNT'] if result else 0
                 except:
@@ -9669,22 +10472,27 @@ async def external_stage_diagnostics():
     diagnostics["checks"].append(check3)
     
     # Check 4: STS AssumeRole (if role configured)
+    # boto3 is blocking - client creation and AWS round-trips run in the threadpool
+    # so the event loop stays free
     s3_client = None
     if BOTO3_AVAILABLE and has_creds:
         if aws_role_arn:
             try:
-                sts_client = boto3.client(
+                sts_client = await run_in_threadpool(
+                    _boto_client,
                     'sts',
                     aws_access_key_id=aws_access_key,
                     aws_secret_access_key=aws_secret_key,
                     region_name='us-west-2'
                 )
-                assumed_role = sts_client.assume_role(
+                assumed_role = await run_in_threadpool(
+                    sts_client.assume_role,
                     RoleArn=aws_role_arn,
                     RoleSessionName='flux-diagnostics-check'
                 )
                 creds = assumed_role['Credentials']
-                s3_client = boto3.client(
+                s3_client = await run_in_threadpool(
+                    _boto_client,
                     's3',
                     aws_access_key_id=creds['AccessKeyId'],
                     aws_secret_access_key=creds['SecretAccessKey'],
@@ -9709,7 +10517,8 @@ async def external_stage_diagnostics():
             diagnostics["checks"].append(check4)
         else:
             # Direct credentials without role
-            s3_client = boto3.client(
+            s3_client = await run_in_threadpool(
+                _boto_client,
                 's3',
                 aws_access_key_id=aws_access_key,
                 aws_secret_access_key=aws_secret_key,
@@ -9717,7 +10526,7 @@ async def external_stage_diagnostics():
             )
     
     # Check 5: External stage metadata
-    stage_name = f"{DB}.{SCHEMA_PRODUCTION}.EXT_RAW_AMI"
+    stage_name = qualify_production_object('EXT_RAW_AMI')
     s3_bucket = None
     s3_prefix = ""
     
@@ -9771,7 +10580,7 @@ async def external_stage_diagnostics():
     # Check 6: S3 bucket access
     if s3_client and s3_bucket:
         try:
-            s3_client.head_bucket(Bucket=s3_bucket)
+            await run_in_threadpool(s3_client.head_bucket, Bucket=s3_bucket)
             check6 = {
                 "name": "S3 Bucket Access",
                 "description": f"HeadBucket on {s3_bucket}",
@@ -9794,7 +10603,8 @@ async def external_stage_diagnostics():
         test_key = f"{s3_prefix}_diagnostics_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
         put_succeeded = False
         try:
-            s3_client.put_object(
+            await run_in_threadpool(
+                s3_client.put_object,
                 Bucket=s3_bucket,
                 Key=test_key,
                 Body=b"FLUX Data Forge diagnostics test - safe to delete",
@@ -9803,7 +10613,7 @@ async def external_stage_diagnostics():
             put_succeeded = True
             # Try to clean up test file (optional - don't fail if delete is denied)
             try:
-                s3_client.delete_object(Bucket=s3_bucket, Key=test_key)
+                await run_in_threadpool(s3_client.delete_object, Bucket=s3_bucket, Key=test_key)
                 check7 = {
                     "name": "S3 Write Permission",
                     "description": "PutObject and DeleteObject test",
@@ -9913,73 +10723,28 @@ async def list_stages():
     Intelligently categorizes internal vs external stages and provides useful metadata.
     Uses preloaded cache for instant response when available.
     """
-    global dependency_cache
-    
     #  Use cached data if available for instant response
-    with dependency_cache['lock']:
-        if dependency_cache['stages'] is not None:
-            cached_stages = dependency_cache['stages']
-            internal_count = len(cached_stages.get('internal', []))
-            external_count = len(cached_stages.get('external', []))
-            logger.info(f"list_stages: Returning {internal_count} internal, {external_count} external stages from cache (instant)")
-            return {
-                "stages": cached_stages,
-                "total_internal": internal_count,
-                "total_external": external_count,
-                "total": internal_count + external_count,
-                "cached": True
-            }
+    cached_stages = read_dependency('stages')
+    if cached_stages is not None:
+        internal_count = len(cached_stages.get('internal', []))
+        external_count = len(cached_stages.get('external', []))
+        logger.info(f"list_stages: Returning {internal_count} internal, {external_count} external stages from cache (instant)")
+        return {
+            "stages": cached_stages,
+            "total_internal": internal_count,
+            "total_external": external_count,
+            "total": internal_count + external_count,
+            "cached": True
+        }
     
     session = get_valid_session()
     if not session:
         logger.error("list_stages: Failed to get valid Snowflake session")
         raise HTTPException(503, "Not connected to Snowflake")
     try:
-        # Get stages in current account - use SHOW STAGES for broader visibility
-        logger.info("list_stages: Fetching stages from account...")
-        result = session.sql("SHOW STAGES IN ACCOUNT").collect()
-        logger.info(f"list_stages: Found {len(result)} stages")
-        
-        stages = {
-            'internal': [],
-            'external': []
-        }
-        
-        for row in result:
-            row_dict = row.asDict() if hasattr(row, 'asDict') else dict(row)
-            stage_info = {
-                'name': row_dict.get('name', ''),
-                'database': row_dict.get('database_name', ''),
-                'schema': row_dict.get('schema_name', ''),
-                'type': row_dict.get('type', 'INTERNAL'),
-                'url': row_dict.get('url', ''),
-                'owner': row_dict.get('owner', ''),
-                'comment': row_dict.get('comment', ''),
-            }
-            
-            # Build full qualified name
-            full_name = f"{stage_info['database']}.{stage_info['schema']}.{stage_info['name']}"
-            stage_info['full_name'] = full_name
-            
-            # Determine cloud provider for external stages
-            url = stage_info['url'] or ''
-            if stage_info['type'] == 'EXTERNAL':
-                if 's3://' in url.lower():
-                    stage_info['cloud_provider'] = 'AWS S3'
-                elif 'azure://' in url.lower() or 'blob.core.windows.net' in url.lower():
-                    stage_info['cloud_provider'] = 'Azure Blob'
-                elif 'gcs://' in url.lower() or 'storage.googleapis.com' in url.lower():
-                    stage_info['cloud_provider'] = 'Google Cloud Storage'
-                else:
-                    stage_info['cloud_provider'] = 'External'
-                stages['external'].append(stage_info)
-            else:
-                stage_info['cloud_provider'] = 'Snowflake Internal'
-                stages['internal'].append(stage_info)
-        
-        # Sort by name for consistent ordering
-        stages['internal'].sort(key=lambda x: x['full_name'])
-        stages['external'].sort(key=lambda x: x['full_name'])
+        # Same stage listing as the preload, so cached and live responses match
+        logger.info("list_stages: Fetching stages...")
+        stages = load_stages(session)
         
         logger.info(f"list_stages: Returning {len(stages['internal'])} internal, {len(stages['external'])} external stages")
         return {
@@ -10077,7 +10842,7 @@ async def preview_stage_files(stage_name: str, limit: int = 10):
                             $1:meter:service_area::VARCHAR AS SERVICE_AREA,
                             METADATA$FILENAME AS SOURCE_FILE,
                             METADATA$FILE_ROW_NUMBER AS ROW_NUM
-                        FROM {stage_name} (FILE_FORMAT => '{DB}.{SCHEMA_PRODUCTION}.FF_JSON', PATTERN => '.*{first_recent_file}.*')
+                        FROM {stage_name} (FILE_FORMAT => '{qualify_production_object('FF_JSON')}', PATTERN => '.*{first_recent_file}.*')
                         LIMIT {limit}
                     """
                 else:
@@ -10093,7 +10858,7 @@ async def preview_stage_files(stage_name: str, limit: int = 10):
                             $1:SERVICE_AREA::VARCHAR AS SERVICE_AREA,
                             METADATA$FILENAME AS SOURCE_FILE,
                             METADATA$FILE_ROW_NUMBER AS ROW_NUM
-                        FROM {stage_name} (FILE_FORMAT => '{DB}.{SCHEMA_PRODUCTION}.FF_JSON', PATTERN => '.*{first_recent_file}.*')
+                        FROM {stage_name} (FILE_FORMAT => '{qualify_production_object('FF_JSON')}', PATTERN => '.*{first_recent_file}.*')
                         LIMIT {limit}
                     """
             else:
@@ -10108,7 +10873,7 @@ async def preview_stage_files(stage_name: str, limit: int = 10):
                         $1:SERVICE_AREA::VARCHAR AS SERVICE_AREA,
                         METADATA$FILENAME AS SOURCE_FILE,
                         METADATA$FILE_ROW_NUMBER AS ROW_NUM
-                    FROM {stage_name} (FILE_FORMAT => '{DB}.{SCHEMA_PRODUCTION}.FF_JSON')
+                    FROM {stage_name} (FILE_FORMAT => '{qualify_production_object('FF_JSON')}')
                     LIMIT {limit}
                 """
             result = session.sql(json_query).collect()
@@ -10236,19 +11001,16 @@ async def list_pipes():
     PATTERN: Check multiple schemas (PRODUCTION, DEV) to ensure all user pipes are visible.
     Uses preloaded cache for instant response when available.
     """
-    global dependency_cache
-    
     #  Use cached data if available for instant response
-    with dependency_cache['lock']:
-        if dependency_cache['pipes'] is not None:
-            cached_pipes = dependency_cache['pipes']
-            logger.info(f"list_pipes: Returning {len(cached_pipes)} pipes from cache (instant)")
-            return {
-                "pipes": cached_pipes,
-                "count": len(cached_pipes),
-                "total": len(cached_pipes),
-                "cached": True
-            }
+    cached_pipes = read_dependency('pipes')
+    if cached_pipes is not None:
+        logger.info(f"list_pipes: Returning {len(cached_pipes)} pipes from cache (instant)")
+        return {
+            "pipes": cached_pipes,
+            "count": len(cached_pipes),
+            "total": len(cached_pipes),
+            "cached": True
+        }
     
     session = get_valid_session()
     if not session:
@@ -10258,10 +11020,7 @@ async def list_pipes():
         seen_pipes = set()  # Track full_name to avoid duplicates
         
         #  Check multiple schemas explicitly to ensure DEV pipes are included
-        schemas_to_check = [
-            f"{DB}.PRODUCTION",
-            f"{DB}.DEV"
-        ]
+        schemas_to_check = PIPE_SCHEMAS
         
         for schema_path in schemas_to_check:
             try:
@@ -10293,6 +11052,7 @@ async def list_pipes():
                     definition = pipe_info.get('definition', '').upper()
                     pipe_info['is_external'] = any(x in definition for x in ['S3://', 'AZURE://', 'GCS://'])
                     pipe_info['auto_ingest'] = 'AUTO_INGEST' in definition
+                    pipe_info['misses_gzip_files'] = pipe_misses_gzip_files(pipe_info['definition'])
                     
                     pipes.append(pipe_info)
             except Exception as schema_err:
@@ -10961,7 +11721,6 @@ async def stream_test_data_to_postgres(
     """Stream test AMI data to PostgreSQL"""
     import os
     from datetime import datetime
-    import random
     
     host = os.environ.get('POSTGRES_HOST', '')
     database = os.environ.get('POSTGRES_DATABASE', 'flux_ops')
@@ -11005,25 +11764,32 @@ async def stream_test_data_to_postgres(
         
         # Generate test data
         timestamp = datetime.utcnow()
-        segments = ['RESIDENTIAL', 'COMMERCIAL', 'INDUSTRIAL']
-        service_areas = ['HOUSTON_METRO', 'DALLAS_METRO', 'AUSTIN']
+        segments = np.array(['RESIDENTIAL', 'COMMERCIAL', 'INDUSTRIAL'], dtype=object)
+        service_areas = np.array(['HOUSTON_METRO', 'DALLAS_METRO', 'AUSTIN'], dtype=object)
         
-        test_rows = []
-        for i in range(num_rows):
-            row = (
+        # Draw every column for the whole batch at once instead of per row
+        usage = np.round(_reading_rng.uniform(0.5, 5.0, num_rows), 3).tolist()
+        voltage = np.round(_reading_rng.uniform(118.0, 122.0, num_rows), 2).tolist()
+        temperature = np.round(_reading_rng.uniform(15.0, 35.0, num_rows), 1).tolist()
+        row_segments = segments[_reading_rng.integers(0, len(segments), num_rows)].tolist()
+        row_areas = service_areas[_reading_rng.integers(0, len(service_areas), num_rows)].tolist()
+        
+        test_rows = [
+            (
                 f'MTR-PG-{i:06d}',
                 timestamp,
-                round(random.uniform(0.5, 5.0), 3),
-                round(random.uniform(118.0, 122.0), 2),
-                random.choice(segments),
+                usage[i],
+                voltage[i],
+                row_segments[i],
                 f'TRF-{i // 10:05d}',
                 f'SUB-{i // 100:03d}',
-                random.choice(service_areas),
-                round(random.uniform(15.0, 35.0), 1),
+                row_areas[i],
+                temperature[i],
                 False,
                 'VALID',
             )
-            test_rows.append(row)
+            for i in range(num_rows)
+        ]
         
         # Insert
         insert_sql = f"""
@@ -11819,12 +12585,7 @@ async def pipes_management_page():
             logger.error(f"Error loading schemas/stages: {e}")
     
     html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Snowpipe Management - FLUX Data Forge</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        {get_base_styles()}
+    {get_page_head('Snowpipe Management')}
         <style>
             .pipe-card {{
                 background: rgba(30, 41, 59, 0.8);
@@ -11950,9 +12711,7 @@ async def pipes_management_page():
     </head>
     <body>
         <div class="container">
-            {get_header_html()}
-            {get_status_bar_html()}
-            {get_tabs_html('pipes')}
+            {get_page_chrome('pipes')}
             
             <div class="panel">
                 <div class="panel-title">
@@ -12012,7 +12771,7 @@ async def pipes_management_page():
                             
                             <div class="form-group">
                                 <label>File Pattern (optional)</label>
-                                <input type="text" name="file_pattern" id="file_pattern" placeholder=".*ami_stream.*\\.json">
+                                <input type="text" name="file_pattern" id="file_pattern" placeholder=".*ami_stream.*\\.json(\\.gz)?">
                             </div>
                             
                             <div class="form-group">
@@ -12265,4 +13024,14 @@ async def pipes_management_page():
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8080  
\ No newline at end of file
+    # Streaming jobs, the Snowflake session and the dependency cache all live in
+    # process memory, so /api/streaming/stop and /status only see jobs started by
+    # the same worker. Keep WEB_CONCURRENCY at 1 unless jobs are not used.
+    # uvloop and httptools ship in requirements.txt; "auto" picks them up and
+    # falls back to asyncio/h11 where they are not installed (e.g. Windows).
+    web_concurrency = int(os.getenv("WEB_CONCURRENCY", "1"))
+    server_options = {'host': "0.0.0.0", 'port': 8080, 'loop': "auto", 'http': "auto"}
+    if web_concurrency > 1:
+        uvicorn.run("fastapi_app:app", workers=web_concurrency, **server_options)
+    else:
+        uvicorn.run(app, **server_options)
@@ -12,6 +12,59 @@ import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'spcs_app'))
 
 
+class FakeResult:
+    """Lazy query result; the answer (or error) comes on collect(), as with Snowpark"""
+
+    def __init__(self, answer):
+        self.answer = answer
+
+    def collect(self):
+        return self.answer()
+
+
+class FakeCursor:
+    """Connector cursor; later statements of a multi-statement request run on nextset()"""
+
+    def __init__(self, session):
+        self.session = session
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, num_statements=1):
+        self.session.executed.append((sql, num_statements))
+        first, *self.pending = sql.split(';\n')
+        self.session.rows(first)
+        return self
+
+    def nextset(self):
+        if not self.pending:
+            return None
+        self.session.rows(self.pending.pop(0))
+        return self
+
+
+class FakeSession:
+    """Snowpark Session stand-in that records queries and answers them with rows(query)"""
+
+    def __init__(self, rows=lambda query: []):
+        self.rows = rows
+        self.queries = []
+        self.executed = []  # (sql, num_statements) sent through connection.cursor()
+        self.connection = self
+
+    def sql(self, query):
+        self.queries.append(query)
+        return FakeResult(lambda: self.rows(query))
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
 class TestSnowpipeStreamingImpl:
     """Tests for snowpipe_streaming_impl.py"""
     
@@ -72,6 +125,809 @@ class TestSnowpipeStreamingImpl:
         assert STREAMING_INFO['requires_pipe'] == True
 
 
+class TestConfig:
+    """Tests for config.py"""
+    
+    def test_table_path_helpers(self):
+        """Test fully qualified table path generation"""
+        from config import DB, get_table_path, get_production_table, get_applications_table
+        
+        assert get_table_path("DEV", "T1") == f"{DB}.DEV.T1"
+        assert get_production_table("AMI_STREAMING_DATA") == f"{DB}.PRODUCTION.AMI_STREAMING_DATA"
+        assert get_applications_table("FLUX_GENERATION_HISTORY") == f"{DB}.APPLICATIONS.FLUX_GENERATION_HISTORY"
+        assert get_production_table("T1") is get_production_table("T1")
+        assert get_table_path("PRODUCTION", "STREAMING_JOBS") is get_production_table("STREAMING_JOBS")
+    
+    def test_database_context_override(self):
+        """Test per-context database override"""
+        from config import DB, get_table_path, get_production_table, set_database, reset_database
+        
+        token = set_database("TENANT_DB")
+        try:
+            assert get_table_path("DEV", "T1") == "TENANT_DB.DEV.T1"
+            assert get_production_table("T1") == "TENANT_DB.PRODUCTION.T1"
+        finally:
+            reset_database(token)
+        
+        assert get_production_table("T1") == f"{DB}.PRODUCTION.T1"
+
+    def test_qualify_production_object(self):
+        """Test non-table object paths follow the context database without being cached"""
+        from config import DB, qualify_production_object, set_database, reset_database, _qualify
+
+        assert qualify_production_object("FF_JSON") == f"{DB}.PRODUCTION.FF_JSON"
+        token = set_database("TENANT_DB")
+        try:
+            before = _qualify.cache_info().currsize
+            assert qualify_production_object("MY_TASK") == "TENANT_DB.PRODUCTION.MY_TASK"
+            assert _qualify.cache_info().currsize == before
+        finally:
+            reset_database(token)
+
+    def test_config_snapshot_reads_environment(self, monkeypatch):
+        """Test config snapshot picks up SNOWFLAKE_DATABASE after invalidation"""
+        from config import get_config, get_production_table, invalidate_table_path_cache
+        
+        monkeypatch.setenv("SNOWFLAKE_DATABASE", "TEST_DB")
+        invalidate_table_path_cache()
+        try:
+            assert get_config().db == "TEST_DB"
+            assert get_production_table("T1") == "TEST_DB.PRODUCTION.T1"
+            with pytest.raises(TypeError):
+                get_config().known_tables[("PRODUCTION", "T1")] = "OTHER_DB.PRODUCTION.T1"
+        finally:
+            monkeypatch.undo()
+            invalidate_table_path_cache()
+
+
+class TestFastapiApp:
+    """Tests for fastapi_app.py helpers and endpoints"""
+    
+    def test_micro_batcher_flushes_on_size_and_lag(self):
+        """Test MicroBatcher flushes by row cap, byte size and lag"""
+        import time
+        from fastapi_app import MicroBatcher
+        
+        batcher = MicroBatcher(max_bytes=10_000, max_lag=60, max_rows=5, row_bytes=100)
+        assert not batcher.should_flush()
+        
+        batcher.add([{}] * 3)
+        assert not batcher.should_flush()
+        batcher.add([{}] * 4)
+        assert batcher.should_flush()
+        assert len(batcher.drain()) == 5
+        assert len(batcher.rows) == 2
+        
+        batcher = MicroBatcher(max_bytes=250, max_lag=60, row_bytes=100)
+        batcher.add([{}] * 3)
+        assert batcher.should_flush()
+        
+        batcher = MicroBatcher(max_bytes=10_000, max_lag=0.01, row_bytes=100)
+        batcher.add([{}])
+        time.sleep(0.02)
+        assert batcher.should_flush()
+        assert len(batcher.drain()) == 1
+        assert batcher.deadline is None
+    
+    def test_micro_batcher_adapts_lag_to_insert_latency(self):
+        """Test MicroBatcher shrinks its lag window on slow inserts and recovers"""
+        from fastapi_app import MicroBatcher
+        
+        batcher = MicroBatcher(max_lag=1.0)
+        for _ in range(10):
+            batcher.record_flush(5.0)
+        assert batcher.max_lag == batcher.lag_floor
+        
+        for _ in range(30):
+            batcher.record_flush(0.05)
+        assert batcher.max_lag == 1.0
+
+    def test_upload_queue_bounds_in_flight_uploads(self):
+        """Test uploads run in the background and are reported back in submission order"""
+        import threading
+        import fastapi_app
+
+        release = threading.Event()
+        queue = fastapi_app.UploadQueue(max_in_flight=2)
+
+        def upload(name):
+            release.wait(5)
+            if name == 'bad':
+                raise RuntimeError('denied')
+
+        queue.submit('a', upload, 'a')
+        queue.submit('bad', upload, 'bad')
+        assert list(queue.completed()) == []  # within the bound, nothing has finished yet
+
+        release.set()
+        queue.submit('c', upload, 'c')
+        results = list(queue.completed(wait=True))
+        assert [context for context, _ in results] == ['a', 'bad', 'c']
+        assert results[0][1] is None and isinstance(results[1][1], RuntimeError)
+        assert not queue.in_flight
+
+    def test_upload_queue_runs_inline_without_the_pool(self, monkeypatch):
+        """Test an inline upload skips the shared pool and reports back in order"""
+        import threading
+        import fastapi_app
+
+        class ClosedPool:
+            def submit(self, *args):
+                raise RuntimeError('cannot schedule new futures after interpreter shutdown')
+
+        monkeypatch.setattr(fastapi_app, '_upload_executor', ClosedPool())
+        queue = fastapi_app.UploadQueue()
+        caller = threading.current_thread()
+        ran_on = []
+        queue.run('ok', lambda: ran_on.append(threading.current_thread()))
+        queue.run('bad', lambda: 1 / 0)
+        results = list(queue.completed(wait=True))
+        assert ran_on == [caller]
+        assert [context for context, _ in results] == ['ok', 'bad']
+        assert results[0][1] is None and isinstance(results[1][1], ZeroDivisionError)
+
+    def test_ndjson_file_buffer_coalesces_batches(self, monkeypatch):
+        """Test NDJSON batches coalesce until the file is large or old enough"""
+        import fastapi_app
+
+        clock = [100.0]
+        monkeypatch.setattr(fastapi_app.time, 'monotonic', lambda: clock[0])
+        buf = fastapi_app.NdjsonFileBuffer(target_bytes=64, max_age=30)
+        assert not buf.should_flush()
+
+        buf.add([{'a': 1}, {'a': 2}])
+        buf.add([{'a': 3}])
+        assert not buf.should_flush()
+        clock[0] += 30
+        assert buf.should_flush()
+        assert buf.drain() == (b'{"a":1}\n{"a":2}\n{"a":3}\n', 3, 2)
+        assert not buf.should_flush()
+
+        buf.add([{'x': 'x' * 64}])
+        assert buf.should_flush()
+
+    def test_batch_pacer_absorbs_work_and_resets_on_overrun(self):
+        """Test BatchPacer keeps a fixed schedule and drops an unrecoverable backlog"""
+        import time
+        from fastapi_app import BatchPacer
+
+        pacer = BatchPacer(0.1)
+        started = time.monotonic()
+        for _ in range(3):
+            time.sleep(0.05)  # work inside the interval doesn't add to it
+            assert pacer.wait() == 0.0
+        assert time.monotonic() - started < 0.4
+
+        pacer = BatchPacer(0.01, max_catchup=2)
+        time.sleep(0.05)
+        assert pacer.wait() > 0.02
+        assert pacer.next_tick <= time.monotonic()
+
+    def test_streaming_job_lifecycle_helpers(self, monkeypatch):
+        """Test workers register, stop and fail jobs through the shared helpers"""
+        import fastapi_app
+
+        jobs = {'j1': {'status': 'STARTING', 'stats': {}}}
+        monkeypatch.setattr(fastapi_app, 'active_streaming_jobs', jobs)
+
+        stats = {'errors': 0}
+        fastapi_app._mark_job_running('j1', stats)
+        assert jobs['j1']['status'] == 'RUNNING' and jobs['j1']['stats'] is stats
+        assert not fastapi_app._job_should_stop('j1', 'test')
+
+        jobs['j1']['status'] = 'STOPPING'
+        assert fastapi_app._job_should_stop('j1', 'test')
+        assert jobs['j1']['status'] == 'STOPPED'
+        assert fastapi_app._job_should_stop('missing', 'test')
+
+        fastapi_app._fail_job('j1')
+        assert jobs['j1']['status'] == 'FAILED' and stats['errors'] == 1
+
+    def test_stop_during_startup_wakes_and_sticks(self, monkeypatch):
+        """Test a stop requested while STARTING survives startup and wakes the pacer"""
+        import threading
+        import time
+        import fastapi_app
+
+        jobs = {'j1': {'status': 'STARTING', 'stats': {}, 'stop_event': threading.Event()}}
+        monkeypatch.setattr(fastapi_app, 'active_streaming_jobs', jobs)
+
+        pacer = fastapi_app.BatchPacer(30, stop_event=fastapi_app._job_stop_event('j1'))
+        fastapi_app._request_job_stop(jobs['j1'])
+        fastapi_app._mark_job_running('j1', {})
+        assert jobs['j1']['status'] == 'STOPPING'
+
+        started = time.monotonic()
+        pacer.next_tick = started + 30
+        pacer.wait()
+        assert time.monotonic() - started < 1
+        assert fastapi_app._job_stop_event('missing').is_set()
+
+    def test_group_commit_writer_coalesces_waiting_writes(self):
+        """Test writes queued behind an in-flight insert go out as one insert"""
+        import threading
+        import time
+        from fastapi_app import GroupCommitWriter
+
+        writer = GroupCommitWriter()
+        inserts = []
+        first_started = threading.Event()
+        release_first = threading.Event()
+
+        def insert(rows):
+            inserts.append(list(rows))
+            if len(inserts) == 1:
+                first_started.set()
+                release_first.wait(5)
+
+        first = threading.Thread(target=writer.write, args=(['a'], insert))
+        first.start()
+        first_started.wait(5)
+        waiters = [threading.Thread(target=writer.write, args=([row], insert)) for row in ('b', 'c')]
+        for t in waiters:
+            t.start()
+        deadline = time.monotonic() + 5
+        while len(writer._pending) < 2 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release_first.set()
+        for t in [first] + waiters:
+            t.join(5)
+
+        assert inserts[0] == ['a']
+        assert sorted(inserts[1]) == ['b', 'c']
+        assert len(inserts) == 2
+
+        def failing(rows):
+            raise RuntimeError('boom')
+
+        with pytest.raises(RuntimeError):
+            writer.write(['d'], failing)
+
+    def test_get_valid_session_skips_probe_when_fresh(self, monkeypatch):
+        """Test get_valid_session only runs SELECT 1 when the session is due a check"""
+        import fastapi_app
+
+        session = FakeSession()
+        monkeypatch.setattr(fastapi_app, 'snowflake_session', session)
+        monkeypatch.setattr(fastapi_app, '_token_mtime', fastapi_app._get_token_mtime())
+        monkeypatch.setattr(fastapi_app, '_session_checked_at', float('-inf'))
+
+        assert fastapi_app.get_valid_session() is session
+        assert fastapi_app.get_valid_session() is session
+        assert len(session.queries) == 1
+
+        fastapi_app._mark_session_suspect()
+        assert fastapi_app.get_valid_session() is session
+        assert len(session.queries) == 2
+
+    def test_get_s3_client_reuses_and_refreshes(self, monkeypatch):
+        """Test S3 clients are shared and re-assumed shortly before credentials expire"""
+        from datetime import datetime, timedelta, timezone
+        import fastapi_app
+
+        expirations = iter([
+            datetime.now(timezone.utc) + timedelta(minutes=2),
+            datetime.now(timezone.utc) + timedelta(hours=1),
+        ])
+        built = []
+
+        class FakeSTS:
+            def assume_role(self, **kwargs):
+                return {'Credentials': {'AccessKeyId': 'A', 'SecretAccessKey': 'S',
+                                        'SessionToken': 'T', 'Expiration': next(expirations)}}
+
+        def fake_client(service_name, **kwargs):
+            if service_name == 'sts':
+                return FakeSTS()
+            built.append(object())
+            return built[-1]
+
+        monkeypatch.setattr(fastapi_app, '_boto_client', fake_client)
+        monkeypatch.setattr(fastapi_app, '_s3_clients', {})
+
+        plain = fastapi_app.get_s3_client('us-west-2', 'key', 'secret')
+        assert fastapi_app.get_s3_client('us-west-2', 'key', 'secret') is plain
+
+        expiring = fastapi_app.get_s3_client('us-west-2', 'key', 'secret', 'arn:role')
+        refreshed = fastapi_app.get_s3_client('us-west-2', 'key', 'secret', 'arn:role')
+        assert refreshed is not expiring
+        assert fastapi_app.get_s3_client('us-west-2', 'key', 'secret', 'arn:role') is refreshed
+        assert len(built) == 3
+        assert not any('secret' in key for key in fastapi_app._s3_clients)
+
+    def test_get_s3_client_builds_outside_the_shared_lock(self, monkeypatch):
+        """Test a slow AssumeRole only blocks callers of the same credentials, and expired clients are dropped"""
+        import threading
+        from datetime import datetime, timedelta, timezone
+        import fastapi_app
+
+        in_sts, release = threading.Event(), threading.Event()
+
+        class SlowSTS:
+            def assume_role(self, **kwargs):
+                in_sts.set()
+                release.wait(5)
+                return {'Credentials': {'AccessKeyId': 'A', 'SecretAccessKey': 'S', 'SessionToken': 'T',
+                                        'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)}}
+
+        monkeypatch.setattr(fastapi_app, '_boto_client',
+                            lambda service_name, **kwargs: SlowSTS() if service_name == 'sts' else object())
+        monkeypatch.setattr(fastapi_app, '_s3_clients', {})
+        monkeypatch.setattr(fastapi_app, '_s3_client_locks', {})
+
+        stale_key = fastapi_app._s3_client_key('us-east-1', 'old', 'secret', 'arn:old')
+        fastapi_app._s3_clients[stale_key] = (object(), datetime.now(timezone.utc) - timedelta(minutes=1))
+
+        role_thread = threading.Thread(target=fastapi_app.get_s3_client, args=('us-west-2', 'key', 'secret', 'arn:role'))
+        role_thread.start()
+        assert in_sts.wait(5)
+        fastapi_app.get_s3_client('us-west-2', 'other', 'secret')  # not held up by the pending AssumeRole
+        release.set()
+        role_thread.join(5)
+
+        assert len(fastapi_app._s3_clients) == 2
+        assert stale_key not in fastapi_app._s3_clients
+
+    def test_boto_clients_share_a_dedicated_session(self, monkeypatch):
+        """Test boto3 clients are built from one private Session, not boto3's default session"""
+        pytest.importorskip('boto3')
+        from concurrent.futures import ThreadPoolExecutor
+        import boto3
+        import fastapi_app
+
+        monkeypatch.setattr(fastapi_app, '_boto_session', None)
+        monkeypatch.setattr(boto3, 'DEFAULT_SESSION', None)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            clients = list(pool.map(lambda _: fastapi_app._boto_client('s3', region_name='us-west-2'), range(4)))
+        assert isinstance(fastapi_app._boto_session, boto3.session.Session)
+        assert boto3.DEFAULT_SESSION is None
+        assert all(client.meta.config.max_pool_connections == 64 for client in clients)
+
+    def test_upload_json_gz_uses_multipart_for_large_bodies(self, monkeypatch):
+        """Test small S3 bodies use put_object and large ones a multipart upload"""
+        import fastapi_app
+
+        class FakeS3:
+            def __init__(self):
+                self.calls = []
+
+            def put_object(self, **kwargs):
+                self.calls.append(('put_object', kwargs['Key'], len(kwargs['Body'])))
+
+            def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+                self.calls.append(('upload_fileobj', key, len(fileobj.read())))
+                assert ExtraArgs['ContentEncoding'] == 'gzip'
+                assert Config.multipart_threshold == fastapi_app.S3_MULTIPART_THRESHOLD_BYTES
+
+        monkeypatch.setattr(fastapi_app, 'S3_MULTIPART_THRESHOLD_BYTES', 1024)
+        monkeypatch.setattr(fastapi_app, '_s3_transfer_config', None)
+        s3 = FakeS3()
+        fastapi_app.upload_json_gz(s3, 'bucket', 'small.json.gz', b'x' * 10)
+        fastapi_app.upload_json_gz(s3, 'bucket', 'large.json.gz', b'x' * 4096)
+        assert s3.calls == [('put_object', 'small.json.gz', 10), ('upload_fileobj', 'large.json.gz', 4096)]
+
+    def test_dependency_cache_publishes_snapshots(self):
+        """Test dependency cache updates replace the snapshot instead of mutating it"""
+        import fastapi_app
+
+        before = fastapi_app.dependency_cache
+        with pytest.raises(TypeError):
+            before['pipes'] = []
+
+        fastapi_app._publish_dependencies(pipes=[{'name': 'P1'}])
+        try:
+            after = fastapi_app.dependency_cache
+            assert after is not before
+            assert after['pipes'] == [{'name': 'P1'}]
+            assert after['tables'] is before['tables']
+            assert before['pipes'] is None
+        finally:
+            fastapi_app.dependency_cache = before
+
+    def test_format_number(self):
+        """Test compact number formatting at each scale"""
+        from fastapi_app import format_number
+
+        assert format_number(999) == '999'
+        assert format_number(12.7) == '12'
+        assert format_number(1_000) == '1.0K'
+        assert format_number(2_500_000) == '2.5M'
+        assert format_number(3_000_000_000) == '3.0B'
+        cached = format_number.cache_info().currsize
+        with pytest.raises(ValueError):
+            format_number(float('nan'))
+        assert format_number.cache_info().currsize == cached
+
+    def test_base_styles_are_minified(self):
+        """Test the shared stylesheet ships without comments or indentation"""
+        from fastapi_app import _minify_css, _BASE_CSS_BYTES
+
+        assert _minify_css('/* x */\n  .a {\n    color: red;\n  }\n  .b > .c { margin: 0 auto; }') == \
+            '.a{color: red;}.b > .c{margin: 0 auto;}'
+        assert b'/*' not in _BASE_CSS_BYTES and b'\n' not in _BASE_CSS_BYTES
+        assert _BASE_CSS_BYTES.startswith(b':root{')
+
+    def test_base_css_is_served_from_versioned_url(self):
+        """Test pages link the hashed stylesheet URL and it is served gzipped and immutable"""
+        import asyncio
+        import gzip
+        import pytest
+        from fastapi import HTTPException, Request
+        from fastapi_app import get_base_css, get_base_styles, BASE_CSS_URL, _BASE_CSS_BYTES, _BASE_CSS_VERSION
+
+        styles = get_base_styles()
+        assert f'href="{BASE_CSS_URL}"' in styles and '<style>' not in styles
+        assert 'fonts.googleapis.com' in styles
+
+        def fetch(version, encoding):
+            request = Request({'type': 'http', 'headers': [(b'accept-encoding', encoding)]})
+            return asyncio.run(get_base_css(version, request))
+
+        resp = fetch(_BASE_CSS_VERSION, b'gzip, br')
+        assert resp.headers['content-encoding'] == 'gzip'
+        assert 'immutable' in resp.headers['cache-control']
+        assert gzip.decompress(resp.body) == _BASE_CSS_BYTES
+
+        resp = fetch(_BASE_CSS_VERSION, b'identity')
+        assert resp.body == _BASE_CSS_BYTES and 'content-encoding' not in resp.headers
+        with pytest.raises(HTTPException):
+            fetch('0000000000', b'gzip')
+
+    def test_cache_status_body_is_reused_per_snapshot(self, monkeypatch):
+        """Test /api/cache/status only re-serializes when a new snapshot is published"""
+        import asyncio
+        import orjson
+        import fastapi_app
+
+        monkeypatch.setattr(fastapi_app, 'dependency_cache', fastapi_app.dependency_cache)
+        first = asyncio.run(fastapi_app.get_cache_status())
+        assert asyncio.run(fastapi_app.get_cache_status()).body is first.body
+
+        fastapi_app._publish_dependencies(pipes=[{'name': 'P1'}], stages={'internal': [{}], 'external': []})
+        status = orjson.loads(asyncio.run(fastapi_app.get_cache_status()).body)
+        assert status['pipes_count'] == 1
+        assert status['stages_count'] == {'internal': 1, 'external': 0}
+
+    def test_page_chassis_is_rendered_once(self):
+        """Test page head and chrome are built once per title/tab"""
+        from fastapi_app import get_page_head, get_page_chrome, get_base_styles
+
+        head = get_page_head('History')
+        assert '<title>History - FLUX Data Forge</title>' in head
+        assert head.rstrip().endswith(get_base_styles().strip())
+        assert get_page_head('History') is head
+
+        chrome = get_page_chrome('history')
+        assert 'href="/history" class="tab active"' in chrome
+        assert get_page_chrome('history') is chrome
+
+    def test_generate_page_render_is_cached(self):
+        """Test the generate page is rendered once per parameter set and day"""
+        import asyncio
+        from datetime import date
+        from fastapi_app import generate_page, render_generate_page
+
+        page = asyncio.run(generate_page(template='Quick Demo'))
+        assert b'<title>Generate - FLUX Data Forge</title>' in page.body
+        assert asyncio.run(generate_page(template='Quick Demo')).body is page.body
+        assert asyncio.run(generate_page(template='SE Demo')).body is not page.body
+
+        key = ('Quick Demo', 'batch', 'Demo (1K)', 'snowflake_streaming', 'TEXAS_GULF_COAST', 1000, 10, 1)
+        assert b'value="2019-12-25"' in render_generate_page(*key, date(2020, 1, 1))
+
+    def test_dependency_refresh_ahead_only_when_read(self, monkeypatch):
+        """Test the refresh-ahead loop re-runs the preload only after cache reads"""
+        import asyncio
+        import fastapi_app
+
+        started = []
+        monkeypatch.setattr(fastapi_app, 'DEPENDENCY_REFRESH_SECONDS', 0.01)
+        monkeypatch.setattr(fastapi_app, '_dependency_reads', 0)
+        monkeypatch.setattr(fastapi_app, '_start_dependency_preload', lambda: started.append(1))
+
+        async def run():
+            task = asyncio.create_task(fastapi_app.refresh_dependencies_ahead())
+            await asyncio.sleep(0.03)
+            assert started == []
+            fastapi_app.read_dependency('pipes')
+            await asyncio.sleep(0.03)
+            task.cancel()
+
+        asyncio.run(run())
+        assert started == [1]
+
+    def test_generate_synthetic_meters(self):
+        """Test synthetic meter fleet shape and segment mix"""
+        from fastapi_app import generate_synthetic_meters
+        
+        meters = generate_synthetic_meters(5000)
+        assert len(meters) == 5000
+        assert meters[12]['meter_id'] == 'MTR-SYN-000012'
+        assert meters[12]['transformer_id'] == 'XFMR-SYN-00001'
+        assert all(29.2604 <= m['latitude'] <= 30.2604 for m in meters)
+        
+        residential = sum(m['customer_segment'] == 'RESIDENTIAL' for m in meters)
+        assert 0.6 < residential / len(meters) < 0.8
+        
+        assert {m['customer_segment'] for m in generate_synthetic_meters(50, 'INDUSTRIAL')} == {'INDUSTRIAL'}
+
+        northeast = generate_synthetic_meters(5000, service_area='NORTHEAST_CORRIDOR')
+        commercial = sum(m['customer_segment'] == 'COMMERCIAL' for m in northeast)
+        assert 0.3 < commercial / len(northeast) < 0.46
+        assert all(40.2128 <= m['latitude'] <= 41.2128 for m in northeast)
+
+    def test_meter_fleet_is_columnar(self):
+        """Test synthetic and production-row fleets build the same columnar layout"""
+        from fastapi_app import MeterFleet
+
+        fleet = MeterFleet.synthetic(100, 'TEXAS_GULF_COAST')
+        assert len(fleet) == 100
+        assert fleet.meter_ids[12] == 'MTR-TEX-000012'
+        assert fleet.segment_code.dtype.name == 'int8'
+        assert list(fleet.segment_labels[fleet.segment_code[:3]]) == ['COMMERCIAL', 'INDUSTRIAL', 'RESIDENTIAL']
+        assert not fleet.production_matched
+
+        rows = [
+            {'METER_ID': 'M1', 'TRANSFORMER_ID': 'T1', 'CIRCUIT_ID': 'C1', 'SUBSTATION_ID': None,
+             'CUSTOMER_SEGMENT': 'INDUSTRIAL', 'LATITUDE': 29.5, 'LONGITUDE': None},
+        ]
+        prod = MeterFleet.from_rows(rows)
+        assert prod.production_matched
+        assert not prod.coords_complete
+        assert prod.segment_multiplier[prod.segment_code[0]] == 15
+        assert len(MeterFleet.from_rows([]).sample(5)) == 0
+
+        from fastapi_app import _synthetic_fleet
+        shared = _synthetic_fleet(100, 'TEXAS_GULF_COAST')
+        assert _synthetic_fleet(100, 'TEXAS_GULF_COAST') is shared
+        assert _synthetic_fleet(100, 'NORTHEAST_CORRIDOR') is not shared
+        with pytest.raises(ValueError):
+            shared.latitude[0] = 0.0
+
+    def test_production_fleet_is_sampled_once(self, monkeypatch):
+        """Test production fleets use SAMPLE and are reused until the TTL expires"""
+        import fastapi_app
+
+        session = FakeSession(lambda query: [
+            {'METER_ID': 'M1', 'TRANSFORMER_ID': 'T1', 'CIRCUIT_ID': 'C1', 'SUBSTATION_ID': 'S1',
+             'CUSTOMER_SEGMENT': 'RESIDENTIAL', 'LATITUDE': 29.5, 'LONGITUDE': -95.1}])
+        queries = session.queries
+        monkeypatch.setattr(fastapi_app, 'get_valid_session', lambda: session)
+        monkeypatch.setattr(fastapi_app, '_production_fleets', {})
+
+        fleet = fastapi_app.load_meter_fleet('METER_INFRASTRUCTURE', 10, 'TEXAS_GULF_COAST')
+        assert fleet.production_matched
+        assert fastapi_app.load_meter_fleet('METER_INFRASTRUCTURE', 10, 'TEXAS_GULF_COAST') is fleet
+        assert len(queries) == 1
+        assert 'SAMPLE (10 ROWS)' in queries[0]
+        assert 'ORDER BY RANDOM()' not in queries[0]
+        assert fastapi_app.sampled_source('DB.S.T', 5, "WHERE SEG = 'X'", 'm') == \
+            "(SELECT * FROM DB.S.T WHERE SEG = 'X') m SAMPLE (5 ROWS)"
+
+        monkeypatch.setattr(fastapi_app, 'PRODUCTION_FLEET_TTL_SECONDS', 0)
+        assert fastapi_app.load_meter_fleet('METER_INFRASTRUCTURE', 10, 'TEXAS_GULF_COAST') is not fleet
+        assert len(queries) == 2
+
+    def test_production_fleet_cache_is_bounded(self, monkeypatch):
+        """Test per-meter-count fleets are evicted least recently used first and expired ones dropped"""
+        import fastapi_app
+
+        monkeypatch.setattr(fastapi_app, '_production_fleets', {})
+        monkeypatch.setattr(fastapi_app, 'PRODUCTION_FLEET_CACHE_MAX', 2)
+        fleets = {meters: fastapi_app.MeterFleet.synthetic(meters, 'TEXAS_GULF_COAST') for meters in (1, 2, 3)}
+
+        fastapi_app._store_production_fleet(('T', 1), fleets[1])
+        fastapi_app._store_production_fleet(('T', 2), fleets[2])
+        assert fastapi_app._cached_production_fleet(('T', 1)) is fleets[1]
+        fastapi_app._store_production_fleet(('T', 3), fleets[3])
+        assert list(fastapi_app._production_fleets) == [('T', 1), ('T', 3)]
+
+        monkeypatch.setattr(fastapi_app, 'PRODUCTION_FLEET_TTL_SECONDS', 0)
+        fastapi_app._store_production_fleet(('T', 2), fleets[2])
+        assert list(fastapi_app._production_fleets) == [('T', 2)]
+
+    def test_external_stage_target_is_cached(self, monkeypatch):
+        """Test DESC STAGE / SHOW PIPES results are parsed once and reused per stage"""
+        import fastapi_app
+
+        def rows(query):
+            if query.startswith('DESC STAGE'):
+                return [{'property': 'URL', 'property_value': '["s3://bucket/raw/ami/"]'}]
+            return [{'name': 'AMI_PIPE', 'definition': 'COPY INTO T FROM @RAW_STAGE'}]
+
+        session = FakeSession(rows)
+        queries = session.queries
+        monkeypatch.setattr(fastapi_app, 'get_valid_session', lambda: session)
+        monkeypatch.setattr(fastapi_app, '_external_stages', {})
+
+        target = fastapi_app.describe_external_stage('RAW_STAGE')
+        bucket, prefix, pipes = target
+        assert (bucket, prefix) == ('bucket', 'raw/ami/')
+        assert pipes == tuple(f"{schema}.AMI_PIPE" for schema in fastapi_app.PIPE_SCHEMAS)
+        issued = len(queries)
+        assert fastapi_app.describe_external_stage('RAW_STAGE') is target
+        assert len(queries) == issued
+
+    def test_refresh_pipes_batches_statements(self):
+        """Test several pipes are refreshed in one multi-statement request"""
+        import fastapi_app
+
+        single = FakeSession()
+        fastapi_app.refresh_pipes(single, ('DB.S.P1',))
+        assert single.queries == ['ALTER PIPE DB.S.P1 REFRESH']
+
+        batched = FakeSession()
+        assert fastapi_app.refresh_pipes(batched, ('DB.S.P1', 'DB.S.P2')) == {}
+        assert batched.executed == [('ALTER PIPE DB.S.P1 REFRESH;\nALTER PIPE DB.S.P2 REFRESH', 2)]
+        assert batched.queries == []
+
+    def test_pipe_misses_gzip_files(self):
+        """Test pipes whose PATTERN stops at .json are flagged, since stage files are now .json.gz"""
+        from fastapi_app import pipe_misses_gzip_files
+
+        copy = "COPY INTO T FROM @S PATTERN = '{}' FILE_FORMAT = (TYPE = 'JSON')"
+        assert pipe_misses_gzip_files(copy.format(r'.*ami_stream.*\\.json'))
+        assert pipe_misses_gzip_files(copy.format(r'.*\.json'))
+        assert not pipe_misses_gzip_files(copy.format(r'.*ami_stream.*\\.json(\\.gz)?'))
+        assert not pipe_misses_gzip_files("COPY INTO T FROM @S FILE_FORMAT = (TYPE = 'JSON')")
+        assert not pipe_misses_gzip_files(None)
+
+    def test_refresh_pipes_falls_back_per_pipe(self):
+        """Test a failing statement, even a later one, only fails its own pipe"""
+        import fastapi_app
+
+        def rows(query):
+            if 'P2' in query:
+                raise RuntimeError('Pipe does not exist')
+            return []
+
+        session = FakeSession(rows)
+        failed = fastapi_app.refresh_pipes(session, ('DB.S.P1', 'DB.S.P2', 'DB.S.P3'))
+        assert list(failed) == ['DB.S.P2']
+        assert len(session.executed) == 1
+        assert session.queries == [f'ALTER PIPE DB.S.{p} REFRESH' for p in ('P1', 'P2', 'P3')]
+
+        def expired(query):
+            raise RuntimeError('Authentication token has expired')
+
+        with pytest.raises(RuntimeError):
+            fastapi_app.refresh_pipes(FakeSession(expired), ('DB.S.P1', 'DB.S.P2'))
+
+    def test_load_stages_lists_app_schemas(self):
+        """Test stages are listed per app schema and split into internal and external"""
+        import fastapi_app
+
+        def rows(query):
+            schema = query.rsplit('.', 1)[-1]
+            return [
+                {'name': 'RAW', 'database_name': 'DB', 'schema_name': schema, 'type': 'INTERNAL', 'url': ''},
+                {'name': 'EXT', 'database_name': 'DB', 'schema_name': schema, 'type': 'EXTERNAL',
+                 'url': 's3://bucket/raw/'},
+            ]
+
+        session = FakeSession(rows)
+        queries = session.queries
+        stages = fastapi_app.load_stages(session)
+        assert sorted(queries) == sorted(f"SHOW STAGES IN SCHEMA {path}" for path in fastapi_app.PIPE_SCHEMAS)
+        assert len(stages['internal']) == len(stages['external']) == len(fastapi_app.PIPE_SCHEMAS)
+        assert {stage['cloud_provider'] for stage in stages['external']} == {'AWS S3'}
+        assert stages['internal'] == sorted(stages['internal'], key=lambda x: x['full_name'])
+
+    def test_preload_dependencies_publishes_every_key(self, monkeypatch):
+        """Test the concurrent preload still publishes pipes, stages, tables and the refresh time"""
+        import threading
+        import fastapi_app
+
+        monkeypatch.setattr(fastapi_app, 'get_valid_session', FakeSession)
+        monkeypatch.setattr(fastapi_app, 'dependency_cache', fastapi_app.dependency_cache)
+        fastapi_app._publish_dependencies(pipes=None, stages=None, tables=None, last_refresh=None)
+
+        # Run on its own thread, as at startup - the preload lowers its thread's priority
+        preload = threading.Thread(target=fastapi_app.preload_dependencies_background)
+        preload.start()
+        preload.join(10)
+        snapshot = fastapi_app.dependency_cache
+        assert snapshot['pipes'] == [] and snapshot['tables'] == []
+        assert snapshot['stages'] == {'internal': [], 'external': []}
+        assert snapshot['last_refresh'] is not None
+
+    def test_generate_ami_readings(self):
+        """Test batched reading generation keeps per-row shape and ranges"""
+        from fastapi_app import AMI_READING_COLUMNS, MeterFleet, generate_ami_readings
+
+        fleet = MeterFleet.synthetic(200, 'TEXAS_GULF_COAST')
+        idx = fleet.sample(500)
+        readings = generate_ami_readings(fleet, idx, 'TEXAS_GULF_COAST', 'UNIFORM')
+        assert len(readings) == 500
+        assert tuple(readings[0]) == AMI_READING_COLUMNS
+        assert generate_ami_readings(fleet, idx[:0], 'TEXAS_GULF_COAST', 'UNIFORM') == []
+
+        for i, r in zip(idx, readings):
+            assert r['METER_ID'] == fleet.meter_ids[i]
+            assert r['CUSTOMER_SEGMENT'] == fleet.segment_labels[fleet.segment_code[i]]
+            assert 118 <= r['VOLTAGE'] <= 122
+            assert 0.92 <= r['POWER_FACTOR'] <= 0.99
+            assert r['DATA_QUALITY'] in ('VALID', 'OUTAGE', 'ANOMALY')
+            assert r['IS_OUTAGE'] == (r['DATA_QUALITY'] == 'OUTAGE')
+            assert type(r['USAGE_KWH']) is float
+            assert r['PRODUCTION_MATCHED'] is False
+
+        industrial = [r['USAGE_KWH'] for r in readings if r['CUSTOMER_SEGMENT'] == 'INDUSTRIAL']
+        assert all(u >= 0.3 * 15 for u in industrial)
+
+        prod = MeterFleet.from_rows([
+            {'METER_ID': 'M1', 'TRANSFORMER_ID': 'T1', 'CIRCUIT_ID': 'C1', 'SUBSTATION_ID': 'S1',
+             'CUSTOMER_SEGMENT': 'COMMERCIAL', 'LATITUDE': None, 'LONGITUDE': -95.0},
+        ])
+        (r,) = generate_ami_readings(prod, prod.sample(1), 'TEXAS_GULF_COAST', 'UNIFORM')
+        assert r['LATITUDE'] is None and r['LONGITUDE'] == -95.0
+
+        from fastapi_app import generate_ami_columns
+        _, cols = generate_ami_columns(fleet, idx)
+        assert all(len(values) == 500 for values in cols.values())
+        assert cols['METER_ID'] == fleet.meter_ids[idx].tolist()
+
+    def test_generate_raw_ami_records(self):
+        """Test raw JSON records keep the nested head-end shape and share batch constants"""
+        from datetime import datetime
+        import orjson
+        from fastapi_app import MeterFleet, generate_raw_ami_records
+
+        fleet = MeterFleet.synthetic(50, 'TEXAS_GULF_COAST')
+        idx = fleet.sample(20)
+        emitted = datetime(2024, 1, 1, 12, 0, 0)
+        records = generate_raw_ami_records(fleet, idx, 'TEXAS_GULF_COAST', 'UNIFORM', 'BATCH_1', emitted)
+        assert len(records) == 20
+        assert set(records[0]) == {'header', 'meter', 'reading', 'quality', 'metadata'}
+        assert records[0]['header'] is records[-1]['header']
+        assert records[0]['header']['batch_id'] == 'BATCH_1'
+        assert [r['meter']['meter_id'] for r in records] == fleet.meter_ids[idx].tolist()
+        assert records[0]['meter']['service_area'] == 'TEXAS_GULF_COAST'
+        assert records[0]['quality']['production_matched'] is False
+        assert records[0]['meter'] is fleet.meter_records('TEXAS_GULF_COAST')[idx[0]]
+
+        decoded = orjson.loads(orjson.dumps(records[0]))
+        assert decoded['header']['emission_timestamp'] == '2024-01-01T12:00:00'
+        assert set(decoded['meter']['geo']) == {'latitude', 'longitude'}
+
+    def test_write_ami_parquet(self):
+        """Test stage Parquet batches are flat columns with the batch constants"""
+        import io
+        pq = pytest.importorskip('pyarrow.parquet')
+        from fastapi_app import MeterFleet, generate_ami_columns, write_ami_parquet
+
+        fleet = MeterFleet.synthetic(50, 'TEXAS_GULF_COAST')
+        reading_time, cols = generate_ami_columns(fleet, fleet.sample(20))
+        buf = io.BytesIO()
+        write_ami_parquet(buf, reading_time, cols, {'batch_id': 'BATCH_1', 'production_matched': False})
+        buf.seek(0)
+        table = pq.read_table(buf)
+        assert table.num_rows == 20
+        assert table.column('meter_id').to_pylist() == cols['METER_ID']
+        assert set(table.column('batch_id').to_pylist()) == {'BATCH_1'}
+        assert table.column('reading_timestamp')[0].as_py() == reading_time
+
+    def test_logo_etag(self):
+        """Test logo is served with an ETag and revalidates to 304"""
+        import asyncio
+        from starlette.requests import Request
+        from fastapi_app import get_logo
+        
+        def request(headers=()):
+            return Request({'type': 'http', 'method': 'GET', 'path': '/logo.png', 'headers': list(headers)})
+        
+        first = asyncio.run(get_logo(request()))
+        assert first.status_code == 200
+        assert first.media_type == 'image/png'
+        assert first.body.startswith(b'\x89PNG')
+        
+        etag = first.headers['etag']
+        second = asyncio.run(get_logo(request([(b'if-none-match', etag.encode())])))
+        assert second.status_code == 304
+        assert second.body == b''
+        assert asyncio.run(get_logo(request())) is first
+
+
 class TestConfigurationFiles:
     """Tests for configuration file integrity"""
     